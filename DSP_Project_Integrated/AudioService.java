@@ -19,6 +19,9 @@ import android.os.Build;
 import android.os.IBinder;
 import android.util.Log;
 import androidx.core.app.NotificationCompat;
+import java.nio.ByteBuffer;
+import java.nio.ByteOrder;
+import java.nio.ShortBuffer;
 
 /**
 
@@ -43,12 +46,19 @@ import androidx.core.app.NotificationCompat;
   private Thread recordingThread;
   private volatile boolean isRecording = false;
   
+  // Capture buffer shared with the callback; PCM bytes are read into it
+  // directly and the short view is used for level metering
+  private final byte[] pcmBuffer = new byte[BUFFER_SIZE * 2];
+  private final ShortBuffer pcmShorts =
+  ByteBuffer.wrap(pcmBuffer).order(ByteOrder.LITTLE_ENDIAN).asShortBuffer();
+  
   // Binder for activity communication
   private final IBinder binder = new AudioServiceBinder();
   
   // Audio data callback interface
   public interface AudioDataCallback {
-  void onAudioData(short[] audioData, int length);
+  // offset and length are in bytes of little-endian 16-bit PCM
+  void onAudioData(byte[] pcm, int offset, int length, int sampleRate);
   void onRMSLevel(float rmsLevel);
   void onPeakLevel(float peakLevel);
   }
@@ -252,21 +262,22 @@ import androidx.core.app.NotificationCompat;
   - Main recording loop - processes audio data in real-time
     */
     private void recordingLoop() {
-    short[] audioBuffer = new short[BUFFER_SIZE];
-    
     while (isRecording && audioRecord != null) {
     try {
-    int bytesRead = audioRecord.read(audioBuffer, 0, BUFFER_SIZE);
+    int bytesRead = audioRecord.read(pcmBuffer, 0, pcmBuffer.length);
     
     ```
          if (bytesRead > 0) {
+             int samplesRead = bytesRead / 2;
+             
              // Calculate RMS and peak levels
-             float rms = calculateRMS(audioBuffer, bytesRead);
-             float peak = calculatePeak(audioBuffer, bytesRead);
+             float rms = calculateRMS(pcmShorts, samplesRead);
+             float peak = calculatePeak(pcmShorts, samplesRead);
              
-             // Send data to callback if registered
+             // Send data to callback if registered; the whole block
+             // crosses JNI as one byte[] copy instead of per-sample shorts
              if (audioDataCallback != null) {
-                 audioDataCallback.onAudioData(audioBuffer, bytesRead);
+                 audioDataCallback.onAudioData(pcmBuffer, 0, bytesRead, SAMPLE_RATE);
                  audioDataCallback.onRMSLevel(rms);
                  audioDataCallback.onPeakLevel(peak);
              }
@@ -279,9 +290,6 @@ import androidx.core.app.NotificationCompat;
              break;
          }
          
-         // Small sleep to prevent CPU overload
-         Thread.sleep(1);
-         
      } catch (Exception e) {
          Log.e(TAG, "Error in recording loop", e);
          break;
@@ -296,10 +304,11 @@ import androidx.core.app.NotificationCompat;
   /**
   - Calculate RMS level for audio data
     */
-    private float calculateRMS(short[] audioData, int length) {
+    private float calculateRMS(ShortBuffer audioData, int length) {
     long sum = 0;
     for (int i = 0; i < length; i++) {
-    sum += audioData[i] * audioData[i];
+    int sample = audioData.get(i);
+    sum += sample * sample;
     }
     return (float) Math.sqrt((double) sum / length) / 32768.0f;
     }
@@ -307,10 +316,10 @@ import androidx.core.app.NotificationCompat;
   /**
   - Calculate peak level for audio data
     */
-    private float calculatePeak(short[] audioData, int length) {
+    private float calculatePeak(ShortBuffer audioData, int length) {
     int maxValue = 0;
     for (int i = 0; i < length; i++) {
-    int absValue = Math.abs(audioData[i]);
+    int absValue = Math.abs(audioData.get(i));
     if (absValue > maxValue) {
     maxValue = absValue;
     }
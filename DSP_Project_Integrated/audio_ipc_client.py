@@ -1,27 +1,39 @@
 #!/usr/bin/env python3
 import socket, json, sys
-def send_cmd(obj, host="127.0.0.1", port=52000):
+import dsp_protocol
+
+def send_cmd(obj, host="127.0.0.1", port=52000, binary=False):
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    payload = json.dumps(obj).encode('utf-8')
+    if binary:
+        payload = dsp_protocol.encode(obj)
+    else:
+        payload = json.dumps(obj).encode('utf-8')
     s.sendto(payload, (host, port))
     # try to read ack
     s.settimeout(2.0)
     try:
-        data, addr = s.recvfrom(1024)
-        print("Ack:", data.decode())
+        data, addr = s.recvfrom(dsp_protocol.MAX_PAYLOAD + dsp_protocol.HEADER.size)
+        if dsp_protocol.is_binary(data):
+            print("Ack:", dsp_protocol.decode(data))
+        else:
+            print("Ack:", data.decode())
     except Exception as e:
         print("No ack:", e)
     s.close()
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: audio_ipc_client.py cmd_json_string")
+    args = sys.argv[1:]
+    binary = "--binary" in args
+    if binary:
+        args.remove("--binary")
+    if len(args) < 1:
+        print("Usage: audio_ipc_client.py [--binary] cmd_json_string")
         print('Example: python audio_ipc_client.py \'{"cmd":"eq","band":5,"value":2.5}\'')
         sys.exit(1)
-    raw = sys.argv[1]
+    raw = args[0]
     try:
         obj = json.loads(raw)
     except:
         print("Invalid JSON")
         sys.exit(1)
-    send_cmd(obj)
+    send_cmd(obj, binary=binary)
@@ -5,13 +5,27 @@ Background service for continuous audio processing
 Integrates with Android AudioService.java
 “””
 
+import os
 import time
+import json
 import threading
 import numpy as np
-from collections import deque
 from kivy.logger import Logger
 from kivy.utils import platform
 
+from dsp_analysis_process import AnalysisProcess
+from dsp_control_server import ControlServer, UDS_NAME
+from dsp_convolver import load_impulse_response
+from dsp_crossover import CrossoverEngine
+from dsp_offline import build_pipeline, render
+from dsp_presets import PresetStore, compile_preset
+from dsp_ringbuffer import RingBuffer
+from dsp_rta import RealTimeAnalyzer
+from dsp_spectrum_ring import SpectrumRingWriter
+from dsp_stats import DSPStats, StatsLog
+from dsp_stft import STFTAnalyzer
+from dsp_worker import DSPWorker
+
 if platform == ‘android’:
 from jnius import autoclass, PythonJavaClass, java_method
 from android.broadcast import BroadcastReceiver
@@ -26,13 +40,20 @@ __javainterfaces__ = ['org/dspproject/caraudiodsp/AudioService$AudioDataCallback
 def __init__(self, python_service):
     super().__init__()
     self.python_service = python_service
+    self.samples = np.zeros(4096, dtype=np.float32)
 
-@java_method('([SIF)V')
-def onAudioData(self, audio_data, length, sample_rate):
+@java_method('([BIII)V')
+def onAudioData(self, pcm, offset, length, sample_rate):
     """Receive audio data from Java service"""
     if self.python_service:
-        # Convert Java short array to numpy array
-        np_data = np.array(audio_data[:length], dtype=np.float32) / 32768.0
+        # pcm arrives as a single bulk byte[] copy; view it as int16 and
+        # normalize into the reusable float buffer
+        count = length // 2
+        if count > len(self.samples):
+            self.samples = np.zeros(count, dtype=np.float32)
+        pcm16 = np.frombuffer(pcm, dtype='<i2', count=count, offset=offset)
+        np_data = self.samples[:count]
+        np.multiply(pcm16, 1.0 / 32768.0, out=np_data, casting='unsafe')
         self.python_service.process_audio_data(np_data, sample_rate)
 
 @java_method('(F)V')
@@ -65,24 +86,57 @@ def __init__(self):
     
     # Channel settings
     self.channels = {
-        'front_left': {'gain': 0, 'volume': 0.5, 'mute': False},
-        'front_right': {'gain': 0, 'volume': 0.5, 'mute': False},
-        'rear_left': {'gain': 0, 'volume': 0.45, 'mute': False},
-        'rear_right': {'gain': 0, 'volume': 0.45, 'mute': False},
-        'subwoofer': {'gain': 6, 'volume': 0.6, 'mute': False},
-        'center': {'gain': 0, 'volume': 0.5, 'mute': False}
+        'front_left': {'gain': 0, 'volume': 0.5, 'mute': False, 'highpass': 80, 'lowpass': 20000},
+        'front_right': {'gain': 0, 'volume': 0.5, 'mute': False, 'highpass': 80, 'lowpass': 20000},
+        'rear_left': {'gain': 0, 'volume': 0.45, 'mute': False, 'highpass': 80, 'lowpass': 20000},
+        'rear_right': {'gain': 0, 'volume': 0.45, 'mute': False, 'highpass': 80, 'lowpass': 20000},
+        'subwoofer': {'gain': 6, 'volume': 0.6, 'mute': False, 'highpass': 0, 'lowpass': 80},
+        'center': {'gain': 0, 'volume': 0.5, 'mute': False, 'highpass': 80, 'lowpass': 20000}
     }
+    for settings in self.channels.values():
+        settings.update(delay=0.0, phase=False, bypass=False)
+    
+    # Six-channel crossover / time alignment fed by the pipeline output
+    self.crossover = CrossoverEngine(self.sample_rate, self.buffer_size)
+    for channel, settings in self.channels.items():
+        self.crossover.set_channel(channel, **settings)
     
     # Processing settings
     self.limiter_enabled = True
     self.compressor_enabled = True
     self.bass_boost = 0  # dB
+    self.output_gain_db = 0.0
+    self.delay_ms = 0.0
+    
+    # Processing chain; stages run in place on one preallocated block. The
+    # offline renderer builds the same chain, so both come from build_pipeline
+    self.pipeline = build_pipeline(self._chain_settings(), self.sample_rate, self.buffer_size)
+    self.pipeline.add_sink(self.crossover)
+    self.equalizer = self.pipeline.stage('eq').equalizer
+    
+    # Dynamics (state persists between blocks)
+    self.compressor = self.pipeline.stage('compressor').compressor
+    self.limiter = self.pipeline.stage('limiter').compressor
+    self.processed_audio = None
+    self._helpers = None  # separate chain for the apply_* helpers
+    
+    # Always-on hot-path counters and per-stage timing histograms
+    self.stats = DSPStats()
+    self.pipeline.stats = self.stats
     
     # Analysis data
     self.fft_data = np.zeros(512)
+    self.analyzer = STFTAnalyzer(512, 256, max_block=self.buffer_size)
     self.freq_bands = np.zeros(31)
-    self.rms_history = deque(maxlen=100)
-    self.peak_history = deque(maxlen=100)
+    self.rta = RealTimeAnalyzer(self.sample_rate, max_block=self.buffer_size)
+    self.rms_history = RingBuffer(100)
+    self.peak_history = RingBuffer(100)
+    self.spectrum_ring = None  # SpectrumRingWriter while a UI is tailing spectra
+    self.analysis_process = None  # AnalysisProcess in 'process' analysis mode
+    self._analysis_pending = None  # next AnalysisProcess, or False for inline
+    self._analysis_lock = threading.Lock()
+    self._presets = None  # PresetStore, opened on first use
+    self._preset_irs = (None, None)
     
     Logger.info("DSP: DSP Processor initialized")
 
@@ -92,155 +146,101 @@ def process_audio_data(self, audio_data, sample_rate):
         if len(audio_data) == 0:
             return
         
+        if self._analysis_pending is not None:
+            self._switch_analysis()
+        
         # Update sample rate if different
         if sample_rate != self.sample_rate:
             self.sample_rate = sample_rate
+            self.pipeline.set_sample_rate(sample_rate)
+            self.crossover.set_sample_rate(sample_rate)
+            self.rta.set_sample_rate(sample_rate)
+            if self.analysis_process is not None:
+                self.analysis_process.set_sample_rate(sample_rate)
         
-        # Apply EQ processing (simplified)
-        processed_audio = self.apply_eq(audio_data)
-        
-        # Apply dynamic processing
-        if self.compressor_enabled:
-            processed_audio = self.apply_compression(processed_audio)
-        
-        if self.limiter_enabled:
-            processed_audio = self.apply_limiting(processed_audio)
-        
-        # Apply bass boost
-        if self.bass_boost > 0:
-            processed_audio = self.apply_bass_boost(processed_audio)
+        # Run the stage chain; output also goes to any registered sinks
+        self._sync_stages()
+        self.processed_audio = self.pipeline.process(audio_data)
         
         # Frequency analysis for display
+        started = time.perf_counter()
         self.analyze_frequency_content(audio_data)
+        self.stats.record('analysis', time.perf_counter() - started)
         
     except Exception as e:
+        self.stats.count('errors')
+        self.stats.count('dropped')
         Logger.error(f"DSP: Audio processing error: {e}")
 
+def _sync_stages(self):
+    """Mirror the processing settings onto the pipeline stages"""
+    self.pipeline.stage('gain').gain_db = self.output_gain_db
+    self.pipeline.stage('compressor').bypass = not self.compressor_enabled
+    self.pipeline.stage('limiter').bypass = not self.limiter_enabled
+    bass_boost = self.pipeline.stage('bass_boost')
+    bass_boost.boost_db = self.bass_boost
+    bass_boost.bypass = self.bass_boost <= 0
+    self.pipeline.stage('delay').delay_ms = self.delay_ms
+
+def _run_stage(self, name, audio_data):
+    """Run a single stage on a copy of audio_data
+    
+    The stages come from a separate chain, so these one-off calls never
+    advance the live EQ, envelope or delay-line state.
+    """
+    if self._helpers is None:
+        self._helpers = build_pipeline({}, self.sample_rate, self.buffer_size)
+    self._helpers.set_sample_rate(self.sample_rate)
+    self._helpers.stage('eq').equalizer.set_gains(self.eq_gains)
+    self._helpers.stage('bass_boost').boost_db = self.bass_boost
+    
+    stage = self._helpers.stage(name)
+    block = np.array(audio_data, dtype=np.float32)
+    for start in range(0, len(block), self.buffer_size):
+        stage.process(block[start:start + self.buffer_size])
+    return block
+
 def apply_eq(self, audio_data):
-    """Apply 31-band EQ (simplified implementation)"""
-    try:
-        # For real-time processing, we'd use proper IIR/FIR filters
-        # This is a simplified approach for demonstration
-        
-        if np.all(self.eq_gains == 0):
-            return audio_data  # No EQ applied
-        
-        # FFT-based EQ (not optimal for real-time, but functional)
-        if len(audio_data) >= 512:
-            fft = np.fft.fft(audio_data[:512])
-            freqs = np.fft.fftfreq(512, 1/self.sample_rate)
-            
-            # Apply EQ gains to frequency bins
-            for i, freq in enumerate(self.eq_freqs):
-                if i < len(self.eq_gains) and self.eq_gains[i] != 0:
-                    # Find frequency bin
-                    freq_bin = np.argmin(np.abs(freqs - freq))
-                    if freq_bin < len(fft):
-                        gain_linear = 10 ** (self.eq_gains[i] / 20.0)
-                        fft[freq_bin] *= gain_linear
-            
-            # Convert back to time domain
-            processed = np.real(np.fft.ifft(fft))
-            
-            # Replace beginning of audio data
-            result = audio_data.copy()
-            result[:len(processed)] = processed
-            return result
-        
-        return audio_data
-        
-    except Exception as e:
-        Logger.error(f"DSP: EQ processing error: {e}")
-        return audio_data
+    """Apply 31-band EQ (peaking biquad cascade, state kept between blocks)"""
+    return self._run_stage('eq', audio_data)
 
 def apply_compression(self, audio_data):
-    """Apply dynamic range compression"""
-    try:
-        # Simple compression algorithm
-        threshold = 0.7
-        ratio = 4.0
-        attack_time = 0.003  # 3ms
-        release_time = 0.1   # 100ms
-        
-        # Calculate envelope
-        envelope = np.abs(audio_data)
-        
-        # Apply compression where signal exceeds threshold
-        compressed = audio_data.copy()
-        over_threshold = envelope > threshold
-        
-        if np.any(over_threshold):
-            # Compress signal above threshold
-            excess = envelope[over_threshold] - threshold
-            compressed_excess = excess / ratio
-            
-            # Apply compression maintaining signal polarity
-            sign = np.sign(compressed[over_threshold])
-            compressed[over_threshold] = sign * (threshold + compressed_excess)
-        
-        return compressed
-        
-    except Exception as e:
-        Logger.error(f"DSP: Compression error: {e}")
-        return audio_data
+    """Apply dynamic range compression (soft knee, 3 ms attack / 100 ms release)"""
+    return self._run_stage('compressor', audio_data)
 
 def apply_limiting(self, audio_data):
-    """Apply peak limiting"""
-    try:
-        limit = 0.95
-        return np.clip(audio_data, -limit, limit)
-    except Exception as e:
-        Logger.error(f"DSP: Limiting error: {e}")
-        return audio_data
+    """Apply lookahead peak limiting"""
+    return self._run_stage('limiter', audio_data)
 
 def apply_bass_boost(self, audio_data):
     """Apply bass boost (simplified)"""
-    try:
-        if self.bass_boost <= 0:
-            return audio_data
-        
-        # Simple high-pass -> low-pass difference for bass boost
-        # In a real implementation, you'd use proper filter design
-        boost_gain = 10 ** (self.bass_boost / 20.0)
-        
-        # Very basic bass emphasis (not optimal)
-        return audio_data * (1.0 + 0.1 * boost_gain)
-        
-    except Exception as e:
-        Logger.error(f"DSP: Bass boost error: {e}")
-        return audio_data
+    return self._run_stage('bass_boost', audio_data)
 
 def analyze_frequency_content(self, audio_data):
     """Analyze frequency content for display"""
     try:
-        if len(audio_data) >= 512:
-            # Windowed FFT
-            windowed = audio_data[:512] * np.hanning(512)
-            fft = np.abs(np.fft.fft(windowed))
-            self.fft_data = fft[:256]  # First half
-            
-            # Calculate 31-band levels
-            freqs = np.fft.fftfreq(512, 1/self.sample_rate)[:256]
-            
-            for i, freq in enumerate(self.eq_freqs[:-1]):
-                if i < 30:  # Avoid index out of range
-                    start_freq = freq
-                    end_freq = self.eq_freqs[i + 1]
-                    
-                    # Find frequency bin range
-                    start_bin = np.argmin(np.abs(freqs - start_freq))
-                    end_bin = np.argmin(np.abs(freqs - end_freq))
-                    
-                    if start_bin < end_bin and end_bin < len(fft):
-                        # Average magnitude in this band
-                        band_magnitude = np.mean(fft[start_bin:end_bin])
-                        
-                        # Convert to dB
-                        if band_magnitude > 0:
-                            self.freq_bands[i] = 20 * np.log10(band_magnitude + 1e-10)
-                        else:
-                            self.freq_bands[i] = -60
-            
+        analysis_process = self.analysis_process
+        if analysis_process is not None:
+            # Hand the samples over; results lag by up to one worker poll
+            analysis_process.write(audio_data)
+            if analysis_process.results():
+                self.fft_data = analysis_process.latest.spectrum
+                self.freq_bands[:] = analysis_process.latest.levels_db
+            if self.spectrum_ring is not None:
+                # Worker results arrive once per block; the ring gets every
+                # hop from the (cheap) display STFT here instead
+                self.analyzer.analyze(audio_data, self._publish_spectrum)
+            return
+        
+        # Streaming STFT over every sample (frames carry across blocks);
+        # each hop's frame goes to the ring, not just one per block
+        publish = self._publish_spectrum if self.spectrum_ring is not None else None
+        self.fft_data = self.analyzer.analyze(audio_data, publish)
+        
+        # 31-band levels from the multi-resolution RTA (dBFS)
+        self.rta.process(audio_data)
+        self.freq_bands[:] = self.rta.levels_db
+        
     except Exception as e:
         Logger.error(f"DSP: Frequency analysis error: {e}")
 
@@ -248,11 +248,204 @@ def set_eq_band(self, band_index, gain_db):
     """Set EQ band gain"""
     if 0 <= band_index < len(self.eq_gains):
         self.eq_gains[band_index] = np.clip(gain_db, -12, 12)
+        self.equalizer.set_gain(band_index, self.eq_gains[band_index])
 
 def set_channel_setting(self, channel, parameter, value):
     """Set channel parameter"""
     if channel in self.channels and parameter in self.channels[channel]:
         self.channels[channel][parameter] = value
+        self.crossover.set_channel(channel, **{parameter: value})
+
+def set_output_gain(self, gain_db):
+    """Set master gain"""
+    self.output_gain_db = float(np.clip(gain_db, -12, 12))
+
+def set_delay(self, delay_ms):
+    """Set global output delay (whole chain, before the crossover)"""
+    max_delay_ms = self.pipeline.stage('delay').max_delay_ms
+    self.delay_ms = float(np.clip(float(delay_ms), 0.0, max_delay_ms))
+
+def load_preset_file(self, path):
+    """Apply a JSON preset with 'eq' gains, optional 'channels' settings and 'ir' / 'channel_ir' paths
+    
+    Bands and channel settings the file leaves out keep their current values.
+    The filters are designed here and crossfaded in like a stored preset.
+    """
+    with open(path, 'r') as f:
+        preset = json.load(f)
+    
+    settings = dict(preset)
+    eq = [float(g) for g in self.eq_gains]
+    eq[:len(preset.get('eq', []))] = preset.get('eq', [])[:len(eq)]
+    settings['eq'] = eq
+    settings['channels'] = {channel: dict(values) for channel, values in self.channels.items()}
+    for channel, values in preset.get('channels', {}).items():
+        if channel in settings['channels']:
+            settings['channels'][channel].update(values)
+    
+    # Room-correction IRs are relative to the preset file
+    self.apply_preset(compile_preset(os.path.basename(path), settings, self.sample_rate,
+                                     self.crossover.max_delay_ms),
+                      base=os.path.dirname(path))
+    Logger.info(f"DSP: Loaded preset {path}")
+
+@property
+def presets(self):
+    """Indexed preset library shared with the UIs"""
+    if self._presets is None:
+        self._presets = PresetStore(sample_rate=self.sample_rate)
+    return self._presets
+
+def load_preset(self, name):
+    """Switch to a stored preset; EQ and crossover crossfade to the new settings"""
+    self.presets.set_sample_rate(self.sample_rate)
+    self.apply_preset(self.presets.load(name))
+    Logger.info(f"DSP: Switched to preset {name}")
+
+def apply_preset(self, preset, base=None):
+    """Install a CompiledPreset; filter tables are built here, off the audio thread
+    
+    The EQ, crossover and FIR only pick up the new filters at their next
+    block, crossfading from the old ones. IR paths are relative to base
+    (default: the preset store).
+    """
+    self.eq_gains[:] = preset.eq_gains
+    system, tables = preset.eq_program(self.buffer_size)
+    self.equalizer.load_compiled(preset.eq_gains, system, tables)
+    
+    channels = preset.channels
+    for channel, settings in channels.items():
+        if channel in self.channels:
+            self.channels[channel].update(settings)
+    self.crossover.set_program(channels, preset.crossover_program(), self.buffer_size)
+    
+    if 'gain' in preset.settings:
+        self.set_output_gain(preset.settings['gain'])
+    
+    # IR files are only re-read when the preset points at different ones
+    base = self.presets.directory if base is None else base
+    irs = tuple(os.path.join(base, preset.settings[key]) if preset.settings.get(key) else None
+                for key in ('ir', 'channel_ir'))
+    if irs != self._preset_irs:
+        self._preset_irs = irs
+        if irs[0]:
+            self.load_room_correction(irs[0])
+        if irs[1]:
+            self.load_room_correction(irs[1], per_channel=True)
+
+def save_preset(self, name, tags=()):
+    """Store the current EQ, channel and gain settings as a named preset"""
+    settings = {
+        'eq': [float(g) for g in self.eq_gains],
+        'channels': {channel: dict(values) for channel, values in self.channels.items()},
+        'gain': self.output_gain_db,
+    }
+    for key, path in zip(('ir', 'channel_ir'), self._preset_irs):
+        if path:
+            settings[key] = path
+    return self.presets.save(name, settings, tags)
+
+def load_room_correction(self, path, per_channel=False):
+    """Load a WAV/NPY correction IR into the main FIR stage, or one IR per speaker channel"""
+    ir, rate = load_impulse_response(path)
+    if rate is not None and rate != self.sample_rate:
+        Logger.warning(f"DSP: IR {path} is {rate} Hz but audio runs at {self.sample_rate} Hz")
+    if per_channel:
+        self.crossover.set_correction(ir)
+    else:
+        self.pipeline.stage('fir').load(ir[0])
+    Logger.info(f"DSP: Loaded {ir.shape[1]}-tap correction IR {path}")
+
+def _chain_settings(self):
+    """Current chain settings in build_pipeline's preset-dict form"""
+    return {
+        'eq': list(self.eq_gains),
+        'gain': self.output_gain_db,
+        'compressor': self.compressor_enabled,
+        'limiter': self.limiter_enabled,
+        'bass_boost': self.bass_boost,
+        'delay': self.delay_ms,
+    }
+
+def render_file(self, source, dest, block_size=4096):
+    """Render a WAV/NPY file offline with the current settings; live state is untouched"""
+    pipeline = build_pipeline(self._chain_settings(), self.sample_rate, block_size)
+    ir = self.pipeline.stage('fir').impulse_response
+    if ir is not None:
+        pipeline.stage('fir').load(ir)
+    return render(source, dest, pipeline, block_size=block_size)
+
+def _publish_spectrum(self, magnitudes):
+    """Write STFT frames into the spectrum ring, stamped one hop apart ending now"""
+    spectrum_ring = self.spectrum_ring
+    if spectrum_ring is None:
+        return
+    now = time.time()
+    period = self.analyzer.hop / float(self.sample_rate)
+    last = len(magnitudes) - 1
+    for index, magnitude in enumerate(magnitudes):
+        spectrum_ring.write(magnitude, now - (last - index) * period)
+
+def start_spectrum_output(self, path):
+    """Publish every STFT hop's spectrum into a shared ring file at path"""
+    self.stop_spectrum_output()
+    self.spectrum_ring = SpectrumRingWriter(path, self.analyzer.bins,
+                                            rate=self.sample_rate / float(self.analyzer.hop))
+    Logger.info(f"DSP: Spectrum ring at {path}")
+
+def stop_spectrum_output(self):
+    spectrum_ring, self.spectrum_ring = self.spectrum_ring, None
+    if spectrum_ring is not None:
+        spectrum_ring.close()
+
+def set_analysis_mode(self, mode):
+    """'inline' analyses on the DSP thread, 'process' in a separate worker process
+    
+    The worker process is started here; the DSP thread switches over (and
+    closes the outgoing process) before its next block, never while a block
+    is using the shared memory.
+    """
+    if mode not in ('inline', 'process'):
+        raise ValueError(f"unknown analysis mode {mode!r}")
+    if mode == self.analysis_mode:
+        return
+    pending = False
+    if mode == 'process':
+        pending = AnalysisProcess(self.sample_rate, self.analyzer.fft_size, self.buffer_size)
+    with self._analysis_lock:
+        previous, self._analysis_pending = self._analysis_pending, pending
+    if previous:
+        # Replaced before the DSP thread ever used it
+        previous.close()
+
+def _switch_analysis(self):
+    """Apply a pending analysis mode change (DSP thread, between blocks)"""
+    with self._analysis_lock:
+        pending, self._analysis_pending = self._analysis_pending, None
+    if pending is None:
+        return
+    outgoing, self.analysis_process = self.analysis_process, pending or None
+    if outgoing is not None:
+        outgoing.close()
+    if pending:
+        Logger.info("DSP: Analysis moved to a worker process")
+    else:
+        self.analyzer.reset()
+        self.rta.reset()
+        Logger.info("DSP: Analysis back on the DSP thread")
+
+def close_analysis(self):
+    """Stop any analysis process now; only once no block is being processed"""
+    self.set_analysis_mode('inline')
+    self._switch_analysis()
+
+@property
+def analysis_mode(self):
+    """The requested mode, which the DSP thread applies before its next block"""
+    pending = self._analysis_pending
+    if pending is not None:
+        return 'process' if pending else 'inline'
+    return 'inline' if self.analysis_process is None else 'process'
 
 def get_frequency_bands(self):
     """Get current frequency band levels"""
@@ -269,6 +462,11 @@ def __init__(self):
     self.java_interface = None
     self.is_running = False
     
+    # On Android the Java service owns the UDS name, so only UDP is served here
+    self.control_server = ControlServer(
+        self, uds_name=None if platform == 'android' else UDS_NAME
+    )
+    
     # Current levels
     self.current_rms = 0.0
     self.current_peak = 0.0
@@ -276,6 +474,14 @@ def __init__(self):
     # Statistics
     self.samples_processed = 0
     self.start_time = time.time()
+    self.stats = self.dsp_processor.stats
+    self.stats_log = None  # StatsLog while exporting to a rolling binary log
+    
+    # Processing runs here, off the JNI callback (Java recordingLoop) thread;
+    # the callback only copies each block into the queue
+    self.worker = DSPWorker(self._process_block, capacity=8,
+                            max_block=self.dsp_processor.buffer_size,
+                            overflow='drop_oldest', stats=self.stats)
     
     Logger.info("DSP: Python Audio Service initialized")
 
@@ -299,6 +505,8 @@ def start_service(self):
             # Bind to service to get reference
             # This would require additional ServiceConnection implementation
             
+            self.control_server.start()
+            self.worker.start()
             self.is_running = True
             Logger.info("DSP: Audio service started")
             return True
@@ -309,12 +517,18 @@ def start_service(self):
     else:
         # Simulation mode for non-Android platforms
         self.is_running = True
+        self.control_server.start()
+        self.worker.start()
         self._start_simulation()
         return True
 
 def stop_service(self):
     """Stop the audio service"""
     self.is_running = False
+    self.control_server.stop()
+    self.worker.stop()
+    self.stop_stats_log()
+    self.dsp_processor.close_analysis()
     
     if platform == 'android' and self.java_service:
         try:
@@ -332,10 +546,18 @@ def stop_service(self):
     Logger.info("DSP: Audio service stopped")
 
 def process_audio_data(self, audio_data, sample_rate):
-    """Process audio data from Java service"""
+    """Queue audio data from the Java service for the DSP worker (capture thread)"""
     if self.is_running:
-        self.dsp_processor.process_audio_data(audio_data, sample_rate)
-        self.samples_processed += len(audio_data)
+        self.stats.arrival(len(audio_data), sample_rate)
+        self.worker.submit(audio_data, sample_rate)
+        self.stats.mark_thread('audio')
+
+def _process_block(self, audio_data, sample_rate):
+    """Run one queued block through the DSP chain (worker thread)"""
+    started = time.perf_counter()
+    self.dsp_processor.process_audio_data(audio_data, sample_rate)
+    self.stats.block_done(time.perf_counter() - started, len(audio_data), sample_rate)
+    self.samples_processed += len(audio_data)
 
 def update_rms_level(self, rms_level):
     """Update RMS level"""
@@ -378,8 +600,35 @@ def get_status(self):
         'samples_processed': self.samples_processed,
         'current_rms': self.current_rms,
         'current_peak': self.current_peak,
-        'sample_rate': self.dsp_processor.sample_rate
+        'sample_rate': self.dsp_processor.sample_rate,
+        'compressor_gr_db': self.dsp_processor.compressor.gain_reduction_db,
+        'limiter_gr_db': self.dsp_processor.limiter.gain_reduction_db,
+        'blocks': self.stats.counter('blocks'),
+        'overruns': self.stats.counter('overruns'),
+        'underruns': self.stats.counter('underruns'),
+        'dropped': self.stats.counter('dropped'),
+        'queue_depth': self.stats.queue_depth,
+        'analysis_mode': self.dsp_processor.analysis_mode
     }
+
+def get_stats(self, reset=False):
+    """Full hot-path statistics (counters, histograms, thread CPU)"""
+    stats = self.stats.snapshot()
+    if reset:
+        self.stats.reset()
+    return stats
+
+def start_stats_log(self, path, interval=1.0, capacity=3600):
+    """Export statistics to a rolling binary log (one record per interval)"""
+    self.stop_stats_log()
+    self.stats_log = StatsLog(path, self.stats, interval, capacity)
+    self.stats_log.start()
+    Logger.info(f"DSP: Logging statistics to {path}")
+
+def stop_stats_log(self):
+    stats_log, self.stats_log = self.stats_log, None
+    if stats_log is not None:
+        stats_log.close()
 ```
 
 # Global service instance
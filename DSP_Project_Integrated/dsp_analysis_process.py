@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Out-of-process analysis for Car DSP
+Runs the display STFT, the RTA (with its averaging and peak hold) and a
+long-FFT measurement spectrum in a separate process, so heavy analysis does
+not compete with the UI and capture threads for the GIL
+
+Audio goes in and results come back through multiprocessing.shared_memory;
+nothing is pickled per block.
+
+Sample ring (one shared memory block):
+    written      u64  samples written so far (published after the data)
+    sample_rate  u32
+    running      u32  0 asks the worker to exit
+    reset        u32  bumped to clear averages and the measurement
+    (padding to HEADER_SIZE, then float32 samples[capacity])
+
+Results (one shared memory block, seqlock: odd sequence = being written):
+    sequence     u64
+    analysed     u64  samples consumed by the worker
+    dropped      u64  samples skipped because the ring lapped the worker
+    measured     u64  frames in the measurement average
+    (padding to HEADER_SIZE, then float64 spectrum[bins], levels[bands],
+     peaks[bands], measurement[measurement_bins])
+"""
+
+import multiprocessing
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+HEADER_SIZE = 64
+RING_SECONDS = 2.0
+MEASUREMENT_FFT = 16384
+POLL_INTERVAL = 0.01     # worker wake-up period; writers never signal it
+
+
+def _ring_views(buffer, capacity):
+    header = np.ndarray(4, dtype=np.uint64, buffer=buffer)
+    control = np.ndarray(3, dtype=np.uint32, buffer=buffer, offset=8)
+    samples = np.ndarray(capacity, dtype=np.float32, buffer=buffer, offset=HEADER_SIZE)
+    return header, control, samples
+
+
+def _result_views(buffer, bins, bands, measurement_bins):
+    header = np.ndarray(4, dtype=np.uint64, buffer=buffer)
+    sizes = (bins, bands, bands, measurement_bins)
+    arrays = []
+    offset = HEADER_SIZE
+    for size in sizes:
+        arrays.append(np.ndarray(size, dtype=np.float64, buffer=buffer, offset=offset))
+        offset += 8 * size
+    return header, arrays
+
+
+def _result_size(bins, bands, measurement_bins):
+    return HEADER_SIZE + 8 * (bins + 2 * bands + measurement_bins)
+
+
+class AnalysisResults:
+    """Consistent copy of the worker's latest results"""
+
+    def __init__(self, bins, bands, measurement_bins):
+        self.sequence = 0
+        self.analysed = 0
+        self.dropped = 0
+        self.measured = 0
+        self.spectrum = np.zeros(bins)
+        self.levels_db = np.zeros(bands)
+        self.peaks_db = np.zeros(bands)
+        self.measurement = np.zeros(measurement_bins)
+
+
+class AnalysisProcess:
+    """Parent-side handle: feeds the sample ring and reads back results
+
+    write() is only a copy into shared memory and a counter store, so it is
+    cheap enough for the audio thread; the worker polls for new samples.
+    results() copies the newest complete result set into preallocated arrays
+    and returns False while nothing new has been published. The worker is
+    started with the 'spawn' method so it does not inherit the UI process's
+    threads.
+    """
+
+    def __init__(self, sample_rate=44100, fft_size=512, max_block=4096,
+                 ring_seconds=RING_SECONDS, measurement_fft=MEASUREMENT_FFT):
+        from dsp_bands import fractional_octave_centres
+
+        self.sample_rate = sample_rate
+        self.fft_size = fft_size
+        self.max_block = max_block
+        self.measurement_fft = measurement_fft
+        self.capacity = int(ring_seconds * 96000)
+        self.bins = fft_size // 2 + 1
+        self.bands = len(fractional_octave_centres(3))
+        self.measurement_bins = measurement_fft // 2 + 1
+
+        self._ring = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + 4 * self.capacity)
+        self._results = shared_memory.SharedMemory(
+            create=True, size=_result_size(self.bins, self.bands, self.measurement_bins))
+        self._ring_header, self._control, self._samples = _ring_views(self._ring.buf, self.capacity)
+        self._result_header, self._result_arrays = _result_views(
+            self._results.buf, self.bins, self.bands, self.measurement_bins)
+        self._ring_header[:] = 0
+        self._result_header[:] = 0
+        self._control[:] = (sample_rate, 1, 0)
+
+        self.latest = AnalysisResults(self.bins, self.bands, self.measurement_bins)
+        self._written = 0
+        context = multiprocessing.get_context('spawn')
+        self._process = context.Process(
+            target=_analysis_main, name='dsp-analysis',
+            args=(self._ring.name, self._results.name, self.capacity, fft_size, max_block,
+                  measurement_fft),
+            daemon=True)
+        self._process.start()
+
+    @property
+    def alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def set_sample_rate(self, sample_rate):
+        self.sample_rate = sample_rate
+        self._control[0] = sample_rate
+
+    def reset(self):
+        """Clear RTA averages, peak hold and the measurement average"""
+        self._control[2] += 1
+
+    def write(self, block):
+        """Append samples to the ring (audio thread)"""
+        samples = self._samples
+        if samples is None:
+            return
+        block = block[-self.capacity:]
+        count = len(block)
+        start = self._written % self.capacity
+        first = min(count, self.capacity - start)
+        samples[start:start + first] = block[:first]
+        if first < count:
+            samples[:count - first] = block[first:]
+        self._written += count
+        self._ring_header[0] = self._written
+
+    def results(self):
+        """Refresh ``latest`` from shared memory; True if it changed"""
+        header = self._result_header
+        if header is None:
+            return False
+        latest = self.latest
+        for _ in range(4):
+            sequence = int(header[0])
+            if sequence & 1 or sequence == latest.sequence:
+                return False
+            spectrum, levels, peaks, measurement = self._result_arrays
+            latest.spectrum[:] = spectrum
+            latest.levels_db[:] = levels
+            latest.peaks_db[:] = peaks
+            latest.measurement[:] = measurement
+            latest.analysed, latest.dropped, latest.measured = (int(v) for v in header[1:4])
+            if int(header[0]) == sequence:
+                latest.sequence = sequence
+                return True
+        return False
+
+    def close(self):
+        """Stop the worker and free the shared memory"""
+        if self._process is None:
+            return
+        self._control[1] = 0
+        self._process.join(2.0)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._process = None
+        # Views must go before the blocks can be closed
+        self._ring_header = self._control = self._samples = None
+        self._result_header = self._result_arrays = None
+        for block in (self._ring, self._results):
+            block.close()
+            block.unlink()
+
+
+def _analysis_main(ring_name, results_name, capacity, fft_size, max_block, measurement_fft):
+    """Worker process entry point"""
+    # Spawned children share the parent's resource tracker, and the parent
+    # unlinks both blocks in close()
+    ring = shared_memory.SharedMemory(name=ring_name)
+    results = shared_memory.SharedMemory(name=results_name)
+    try:
+        _analysis_loop(ring.buf, results.buf, capacity, fft_size, max_block, measurement_fft)
+    finally:
+        # The loop's array views are gone once it returns, so closing is safe
+        ring.close()
+        results.close()
+
+
+def _analysis_loop(ring_buffer, results_buffer, capacity, fft_size, max_block, measurement_fft):
+    """Tail the sample ring and publish results until asked to stop"""
+    from dsp_rta import RealTimeAnalyzer
+    from dsp_stft import STFTAnalyzer
+
+    ring_header, control, samples = _ring_views(ring_buffer, capacity)
+    sample_rate = int(control[0])
+    display = STFTAnalyzer(fft_size, fft_size // 2, max_block=max_block)
+    measurement = STFTAnalyzer(measurement_fft, measurement_fft // 2, max_block=max_block)
+    rta = RealTimeAnalyzer(sample_rate, max_block=max_block)
+    header, (spectrum, levels, peaks, average) = _result_views(
+        results_buffer, display.bins, len(rta.centres), measurement.bins)
+
+    measured_power = np.zeros(measurement.bins)
+    measured = 0
+    position = int(ring_header[0])
+    resets = int(control[2])
+    analysed = dropped = 0
+    parent = multiprocessing.parent_process()
+    block = np.zeros(max_block, dtype=np.float32)
+
+    def measure(magnitudes):
+        # Every completed long frame enters the average on its own
+        nonlocal measured_power, measured
+        measured_power += np.einsum('ij,ij->j', magnitudes, magnitudes)
+        measured += len(magnitudes)
+
+    while control[1]:
+        time.sleep(POLL_INTERVAL)
+        if parent is not None and not parent.is_alive():
+            break
+
+        if int(control[0]) != sample_rate:
+            sample_rate = int(control[0])
+            rta.set_sample_rate(sample_rate)
+            display.reset()
+            measurement.reset()
+            measured_power[:] = 0.0
+            measured = 0
+        if int(control[2]) != resets:
+            resets = int(control[2])
+            rta.reset()
+            measured_power[:] = 0.0
+            measured = 0
+
+        written = int(ring_header[0])
+        # The writer stores samples before publishing the count, so up to a
+        # block past written may already be in flight; stay that far clear
+        oldest = written - capacity + max_block
+        if position < oldest:
+            # Lapped: skip to the oldest samples the writer is not touching
+            dropped += oldest - position
+            position = oldest
+        if written == position:
+            continue
+
+        while position < written:
+            count = min(max_block, written - position)
+            start = position % capacity
+            first = min(count, capacity - start)
+            block[:first] = samples[start:start + first]
+            block[first:count] = samples[:count - first]
+            if position < int(ring_header[0]) - capacity + max_block:
+                # Overwritten while copying: drop it, the next poll skips ahead
+                break
+            chunk = block[:count]
+            display.analyze(chunk)
+            rta.process(chunk)
+            measurement.analyze(chunk, measure)
+            position += count
+            analysed += count
+
+        # Publish: odd sequence while the arrays are being written
+        header[0] += 1
+        spectrum[:] = display.spectrum
+        levels[:] = rta.levels_db
+        peaks[:] = rta.peaks_db
+        if measured:
+            np.sqrt(measured_power / measured, out=average)
+        header[1] = analysed
+        header[2] = dropped
+        header[3] = measured
+        header[0] += 1
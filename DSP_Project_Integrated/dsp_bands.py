@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Spectrum band aggregation for Car DSP
+Cached CSR-style bin-to-band tables per (sample_rate, fft_size)
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from dsp_eq import ISO_31_BANDS
+
+
+def fractional_octave_centres(bands_per_octave=3, f_min=20.0, f_max=20000.0):
+    """Centre frequencies for 1/N-octave bands between f_min and f_max"""
+    if bands_per_octave == 3:
+        return ISO_31_BANDS[(ISO_31_BANDS >= f_min) & (ISO_31_BANDS <= f_max)].copy()
+
+    # Base-2 series anchored on 1 kHz
+    k_min = int(np.ceil(bands_per_octave * np.log2(f_min / 1000.0)))
+    k_max = int(np.floor(bands_per_octave * np.log2(f_max / 1000.0)))
+    return 1000.0 * 2.0 ** (np.arange(k_min, k_max + 1) / bands_per_octave)
+
+
+class BandMap:
+    """Sparse bin-to-band averaging matrix for one FFT geometry"""
+
+    def __init__(self, sample_rate, fft_size, centres):
+        self.sample_rate = sample_rate
+        self.fft_size = fft_size
+        self.centres = np.asarray(centres, dtype=np.float64)
+
+        # Only the half spectrum below Nyquist is used, matching fft[:fft_size // 2]
+        n_bins = fft_size // 2
+        bin_freqs = np.arange(n_bins) * (sample_rate / fft_size)
+
+        # Band edges sit geometrically halfway between neighbouring centres
+        edges = np.empty(len(self.centres) + 1)
+        edges[1:-1] = np.sqrt(self.centres[:-1] * self.centres[1:])
+        edges[0] = self.centres[0] ** 2 / edges[1]
+        edges[-1] = self.centres[-1] ** 2 / edges[-2]
+
+        starts = np.searchsorted(bin_freqs, edges[:-1], side='left')
+        ends = np.searchsorted(bin_freqs, edges[1:], side='left')
+
+        # Bands narrower than one bin borrow the bin nearest their centre;
+        # bands above Nyquist get a single zero-weight entry
+        nearest = np.clip(np.rint(self.centres * fft_size / sample_rate).astype(np.intp), 0, n_bins - 1)
+        empty = ends <= starts
+        starts = np.where(empty, nearest, starts)
+        ends = np.where(empty, nearest + 1, ends)
+        above = self.centres >= sample_rate / 2
+
+        counts = ends - starts
+        self.indptr = np.concatenate(([0], np.cumsum(counts)))
+        self.indices = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        self.weights = np.repeat(np.where(above, 0.0, 1.0 / counts), counts)
+        self.n_bins = n_bins
+
+    def __len__(self):
+        return len(self.centres)
+
+    def apply(self, spectrum):
+        """Mean magnitude per band as one sparse matrix-vector product"""
+        return np.add.reduceat(spectrum[self.indices] * self.weights, self.indptr[:-1])
+
+    def dense(self):
+        """Equivalent dense (bands x bins) matrix, for inspection"""
+        matrix = np.zeros((len(self), self.n_bins))
+        rows = np.repeat(np.arange(len(self)), np.diff(self.indptr))
+        matrix[rows, self.indices] = self.weights
+        return matrix
+
+
+@lru_cache(maxsize=16)
+def get_band_map(sample_rate, fft_size, bands_per_octave=3):
+    """Shared BandMap for an FFT geometry, built once and cached"""
+    centres = fractional_octave_centres(bands_per_octave)
+    return BandMap(sample_rate, fft_size, centres)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Real-time benchmark for Car DSP
+Feeds synthetic or recorded signals through each processing stage and the
+full chain at several sample rates and block sizes, and reports real-time
+factor, per-block latency percentiles and per-block allocations as JSON
+
+Usage: dsp_benchmark.py [--output results.json] [--baseline previous.json]
+                        [--rates 44100 48000] [--blocks 256 4096] [--input take.wav]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from dsp_crossover import CrossoverEngine
+from dsp_dynamics import Compressor, Limiter
+from dsp_eq import GraphicEQ
+from dsp_offline import build_pipeline, open_source
+from dsp_rta import RealTimeAnalyzer
+
+SAMPLE_RATES = (44100, 48000, 96000)
+BLOCK_SIZES = (64, 128, 256, 512, 1024, 2048, 4096, 8192)
+SIGNALS = ('sine', 'pink', 'sweep')
+DURATION = 2.0          # seconds of audio per run
+WARMUP_BLOCKS = 4       # untimed blocks so table builds are not counted
+ALLOC_BLOCKS = 16       # blocks traced for allocations (tracing skews timing)
+IR_TAPS = 4096
+
+# The V-shape curve from the EQ tab, so every band filter is active
+V_SHAPE = [-2, -1, 0, 2, 4, 6, 4, 2, 0, -1, -2, -3, -4, -4, -4,
+           -4, -4, -3, -2, -1, 0, 1, 2, 3, 4, 5, 6, 4, 2, 0, -2]
+
+
+def generate_signal(name, sample_rate, seconds=DURATION, seed=0):
+    """Deterministic float32 test signal around -12 dBFS"""
+    n = int(sample_rate * seconds)
+    t = np.arange(n) / float(sample_rate)
+    if name == 'sine':
+        signal = np.sin(2 * np.pi * 1000.0 * t)
+    elif name == 'sweep':
+        # Exponential 20 Hz - 20 kHz sweep
+        rate = np.log(20000.0 / 20.0) / seconds
+        signal = np.sin(2 * np.pi * 20.0 * (np.exp(rate * t) - 1) / rate)
+    elif name == 'pink':
+        # Shape white noise by 1/sqrt(f) in the frequency domain
+        spectrum = np.fft.rfft(np.random.default_rng(seed).standard_normal(n))
+        freqs = np.fft.rfftfreq(n, 1.0 / sample_rate)
+        spectrum[1:] /= np.sqrt(freqs[1:])
+        spectrum[0] = 0.0
+        signal = np.fft.irfft(spectrum, n)
+        signal /= np.max(np.abs(signal))
+    else:
+        raise ValueError(f"unknown signal {name!r}")
+    return (0.25 * signal).astype(np.float32)
+
+
+def load_signal(path, sample_rate=None, seconds=None):
+    """Recorded signal (WAV or .npy) as one float32 mono array and its rate"""
+    blocks, rate, frames = open_source(path, sample_rate)
+    if seconds is not None:
+        frames = min(frames, int(rate * seconds))
+    signal = np.zeros(frames, dtype=np.float32)
+    position = 0
+    for block in blocks:
+        count = min(len(block), frames - position)
+        signal[position:position + count] = block[:count]
+        position += count
+        if position >= frames:
+            break
+    return signal[:position], rate
+
+
+def test_impulse_response(sample_rate, taps=IR_TAPS, seed=1):
+    """Exponentially decaying noise, a stand-in for a measured room IR"""
+    decay = np.exp(-np.arange(taps) / (0.01 * sample_rate))
+    ir = np.random.default_rng(seed).standard_normal(taps) * decay
+    return ir / np.sqrt(np.sum(ir ** 2))
+
+
+def _eq(sample_rate, block_size):
+    equalizer = GraphicEQ(sample_rate=sample_rate)
+    equalizer.set_gains(V_SHAPE)
+    return lambda block: equalizer.process(block, out=block)
+
+
+def _compressor(sample_rate, block_size):
+    compressor = Compressor(threshold_db=-20.0, ratio=4.0, sample_rate=sample_rate,
+                            max_block=block_size)
+    return compressor.process
+
+
+def _limiter(sample_rate, block_size):
+    limiter = Limiter(ceiling_db=-6.0, sample_rate=sample_rate, max_block=block_size)
+    return limiter.process
+
+
+def _fir(sample_rate, block_size):
+    pipeline = build_pipeline({}, sample_rate, block_size)
+    fir = pipeline.stage('fir')
+    fir.load(test_impulse_response(sample_rate))
+    return fir.process
+
+
+def _crossover(sample_rate, block_size):
+    crossover = CrossoverEngine(sample_rate, max_block=block_size)
+    crossover.set_channel('front_left', highpass=80.0, delay=1.5)
+    crossover.set_channel('front_right', highpass=80.0)
+    crossover.set_channel('subwoofer', lowpass=80.0, delay=3.0)
+    return crossover.process
+
+
+def _rta(sample_rate, block_size):
+    # What the UI's get_frequency_bands reads from
+    return RealTimeAnalyzer(sample_rate, max_block=block_size).process
+
+
+def _chain(sample_rate, block_size):
+    # DSPProcessor's chain: EQ, FIR, gain, dynamics and bass boost, with the
+    # crossover as a sink and the RTA analysing the input
+    pipeline = build_pipeline({'eq': V_SHAPE, 'gain': -3.0, 'bass_boost': 3.0},
+                              sample_rate, block_size)
+    pipeline.stage('fir').load(test_impulse_response(sample_rate))
+    pipeline.add_sink(CrossoverEngine(sample_rate, max_block=block_size))
+    rta = RealTimeAnalyzer(sample_rate, max_block=block_size)
+
+    def process(block):
+        rta.process(block)
+        pipeline.process(block)
+    return process
+
+
+TARGETS = {
+    'eq': _eq,
+    'compressor': _compressor,
+    'limiter': _limiter,
+    'fir': _fir,
+    'crossover': _crossover,
+    'rta': _rta,
+    'chain': _chain,
+}
+
+
+def measure(process, signal, sample_rate, block_size, warmup=WARMUP_BLOCKS,
+            alloc_blocks=ALLOC_BLOCKS):
+    """Time process() over signal in blocks; returns a stats dict
+
+    Every block is copied into one preallocated buffer first, since stages
+    work in place. Allocations are measured in a separate, shorter traced
+    pass: the bytes a block allocates above what was live before it.
+    """
+    count = len(signal) // block_size
+    if count == 0:
+        raise ValueError(f"signal shorter than one {block_size}-frame block")
+    block = np.zeros(block_size, dtype=np.float32)
+    times = np.zeros(count, dtype=np.int64)
+
+    for i in range(min(warmup, count)):
+        block[:] = signal[i * block_size:(i + 1) * block_size]
+        process(block)
+
+    clock = time.perf_counter_ns
+    for i in range(count):
+        block[:] = signal[i * block_size:(i + 1) * block_size]
+        started = clock()
+        process(block)
+        times[i] = clock() - started
+
+    traced = min(alloc_blocks, count)
+    allocated = np.zeros(traced, dtype=np.int64)
+    tracemalloc.start()
+    try:
+        for i in range(traced):
+            block[:] = signal[i * block_size:(i + 1) * block_size]
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            process(block)
+            _, peak = tracemalloc.get_traced_memory()
+            allocated[i] = peak - before
+    finally:
+        tracemalloc.stop()
+
+    latency_ms = times / 1e6
+    deadline_ms = 1000.0 * block_size / sample_rate
+    elapsed = times.sum() / 1e9
+    duration = count * block_size / float(sample_rate)
+    return {
+        'blocks': count,
+        'duration': duration,
+        'elapsed': elapsed,
+        'realtime_factor': elapsed / duration,
+        'deadline_ms': deadline_ms,
+        'p50_ms': float(np.percentile(latency_ms, 50)),
+        'p99_ms': float(np.percentile(latency_ms, 99)),
+        'max_ms': float(latency_ms.max()),
+        'missed_deadlines': int(np.count_nonzero(latency_ms > deadline_ms)),
+        'alloc_bytes_per_block': float(allocated.mean()),
+        'alloc_blocks': int(np.count_nonzero(allocated)),
+    }
+
+
+def run(targets=None, sample_rates=SAMPLE_RATES, block_sizes=BLOCK_SIZES,
+        signal='pink', seconds=DURATION, recording=None, log=None):
+    """Benchmark every target x sample rate x block size; returns result rows
+
+    ``recording`` (a WAV or .npy path) replaces the synthetic signal; its own
+    rate is used for WAV input. Failures are recorded per row rather than
+    aborting the run, so one broken stage does not hide the others.
+    """
+    targets = list(targets or TARGETS)
+    if recording is not None:
+        _, rate, _ = open_source(recording)
+        if str(recording).lower().endswith('.wav'):
+            sample_rates = (rate,)
+
+    results = []
+    for sample_rate in sample_rates:
+        if recording is not None:
+            source, _ = load_signal(recording, sample_rate, seconds)
+            signal_name = str(recording)
+        else:
+            source = generate_signal(signal, sample_rate, seconds)
+            signal_name = signal
+        for block_size in block_sizes:
+            for target in targets:
+                row = {'target': target, 'sample_rate': sample_rate,
+                       'block_size': block_size, 'signal': signal_name}
+                try:
+                    process = TARGETS[target](sample_rate, block_size)
+                    row.update(measure(process, source, sample_rate, block_size))
+                except Exception as e:
+                    row['error'] = f"{type(e).__name__}: {e}"
+                results.append(row)
+                if log is not None:
+                    log(format_row(row))
+    return results
+
+
+def environment():
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+    }
+
+
+def save_results(path, results):
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+
+
+def load_results(path):
+    with open(path, 'r') as f:
+        return json.load(f)['results']
+
+
+def compare(baseline, results, tolerance=0.2, metrics=('realtime_factor', 'p99_ms')):
+    """Rows whose metrics grew by more than tolerance (a fraction) against baseline"""
+    key = lambda row: (row['target'], row['sample_rate'], row['block_size'])
+    previous = {key(row): row for row in baseline if 'error' not in row}
+    regressions = []
+    for row in results:
+        before = previous.get(key(row))
+        if before is None:
+            continue
+        if 'error' in row:
+            regressions.append((row, 'error', None, None))
+            continue
+        for metric in metrics:
+            if row[metric] > before[metric] * (1.0 + tolerance):
+                regressions.append((row, metric, before[metric], row[metric]))
+    return regressions
+
+
+def format_row(row):
+    label = f"{row['target']:<10} {row['sample_rate']:>6} Hz {row['block_size']:>5}"
+    if 'error' in row:
+        return f"{label}  ERROR {row['error']}"
+    return (f"{label}  RTF {row['realtime_factor']:.3f}  p50 {row['p50_ms']:.3f}ms  "
+            f"p99 {row['p99_ms']:.3f}ms  max {row['max_ms']:.3f}ms  "
+            f"alloc {row['alloc_bytes_per_block'] / 1024:.1f}KiB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Car DSP chain against real time")
+    parser.add_argument('--targets', nargs='+', choices=sorted(TARGETS), help="stages to run (default all)")
+    parser.add_argument('--rates', nargs='+', type=int, default=SAMPLE_RATES, help="sample rates")
+    parser.add_argument('--blocks', nargs='+', type=int, default=BLOCK_SIZES, help="block sizes")
+    parser.add_argument('--signal', choices=SIGNALS, default='pink', help="synthetic test signal")
+    parser.add_argument('--input', help="recorded WAV or .npy to use instead of a synthetic signal")
+    parser.add_argument('--seconds', type=float, default=DURATION, help="audio per run")
+    parser.add_argument('--output', help="write results as JSON")
+    parser.add_argument('--baseline', help="earlier JSON results to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown vs baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args.targets, args.rates, args.blocks, args.signal, args.seconds,
+                  args.input, log=print)
+    if args.output:
+        save_results(args.output, results)
+
+    failed = [row for row in results if 'error' in row or row['realtime_factor'] >= 1.0]
+    if args.baseline:
+        regressions = compare(load_results(args.baseline), results, args.tolerance)
+        for row, metric, before, after in regressions:
+            if metric == 'error':
+                print(f"REGRESSION {format_row(row)}")
+            else:
+                print(f"REGRESSION {row['target']} {row['sample_rate']} Hz {row['block_size']}: "
+                      f"{metric} {before:.3f} -> {after:.3f}")
+        failed += [row for row, _, _, _ in regressions]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
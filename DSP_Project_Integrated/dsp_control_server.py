@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Control server for Car DSP
+asyncio UDS + UDP listener that applies control commands to the DSPProcessor
+Desktop stand-in for the Java LocalServerSocket in AudioService
+"""
+
+import asyncio
+import codecs
+import json
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from kivy.logger import Logger
+
+import dsp_protocol
+
+UDS_NAME = "@dsp_service_socket"  # same name the Java LocalServerSocket uses
+UDP_PORT = 52000                  # audio_ipc_client default
+
+# File I/O, filter design, IR partitioning or process start-up: these run on
+# the server's work thread so the event loop keeps answering other clients
+BLOCKING_COMMANDS = frozenset({
+    'load_preset_file', 'preset', 'preset_list', 'preset_save',
+    'spectrum_start', 'analysis_mode', 'stats_log',
+})
+
+
+def _incomplete(error, text):
+    """True if a JSONDecodeError only means the object has not fully arrived"""
+    # Strings cannot hold raw newlines, so an open one is still arriving
+    return error.pos >= len(text) or error.msg.startswith('Unterminated string')
+
+
+def _socket_address(name):
+    # "@name" is the Linux abstract namespace, spelled "\0name" in Python
+    return "\0" + name[1:] if name.startswith("@") else name
+
+
+class _UDPControl(asyncio.DatagramProtocol):
+    """One datagram in, one ack datagram out, handled in arrival order"""
+
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self._queue = None
+        self._consumer = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        # A single consumer, so a blocking command holds later datagrams back
+        # instead of being overtaken (and then overwriting them)
+        self._queue = asyncio.Queue()
+        self._consumer = asyncio.ensure_future(self._drain())
+
+    def connection_lost(self, exc):
+        if self._consumer is not None:
+            self._consumer.cancel()
+            self._consumer = None
+
+    def datagram_received(self, data, addr):
+        self._queue.put_nowait((data, addr))
+
+    async def _drain(self):
+        while True:
+            data, addr = await self._queue.get()
+            ack = await self.server.handle_message_async(data)
+            if not self.transport.is_closing():
+                self.transport.sendto(ack, addr)
+
+
+class ControlServer:
+    """Accepts JSON or binary-framed commands and applies them to an audio service"""
+
+    def __init__(self, audio_service, uds_name=UDS_NAME, udp_port=UDP_PORT,
+                 host="127.0.0.1"):
+        self.audio_service = audio_service
+        self.uds_name = uds_name
+        self.udp_port = udp_port
+        self.host = host
+
+        self.handlers = {
+            'eq': self._cmd_eq,
+            'eq_curve': self._cmd_eq_curve,
+            'gain': self._cmd_gain,
+            'delay': self._cmd_delay,
+            'input': self._cmd_input,
+            'select_channel': self._cmd_select_channel,
+            'channel': self._cmd_channel,
+            'load_preset_file': self._cmd_load_preset_file,
+            'preset': self._cmd_preset,
+            'preset_list': self._cmd_preset_list,
+            'preset_save': self._cmd_preset_save,
+            'spectrum_start': self._cmd_spectrum_start,
+            'spectrum_stop': self._cmd_spectrum_stop,
+            'analysis_mode': self._cmd_analysis_mode,
+            'batch': self._cmd_batch,
+            'status': self._cmd_status,
+            'stats': self._cmd_stats,
+            'stats_log': self._cmd_stats_log,
+        }
+
+        self.blocking = set(BLOCKING_COMMANDS)
+
+        self.clients = 0
+        self.commands_handled = 0
+        self.errors = 0
+
+        self._loop = None
+        self._executor = None
+        self._thread = None
+        self._started = threading.Event()
+        self._servers = []
+
+    def register(self, cmd, handler, blocking=False):
+        """Add or replace the handler for a command name
+
+        Handlers that block (disk, filter design, ...) should pass
+        blocking=True so they run on the work thread.
+        """
+        self.handlers[cmd] = handler
+        if blocking:
+            self.blocking.add(cmd)
+        else:
+            self.blocking.discard(cmd)
+
+    # -- command handling (runs on the server loop, blocking commands on the work thread) --
+
+    def handle_command(self, obj):
+        """Apply one command dict; returns the ack dict"""
+        if not isinstance(obj, dict):
+            self.errors += 1
+            return {'ok': False, 'error': 'not a command object'}
+        handler = self.handlers.get(obj.get('cmd'))
+        if handler is None:
+            self.errors += 1
+            return {'ok': False, 'error': 'unknown command'}
+        try:
+            detail = handler(obj)
+        except Exception as e:
+            self.errors += 1
+            Logger.error(f"DSP: Control command {obj.get('cmd')} failed: {e}")
+            return {'ok': False, 'error': str(e)}
+        self.commands_handled += 1
+        return dict(detail or {}, ok=True)
+
+    def is_blocking(self, obj):
+        """True if obj (or any command in a batch) must not run on the event loop"""
+        if not isinstance(obj, dict):
+            return False
+        if obj.get('cmd') == 'batch':
+            return any(map(self.is_blocking, obj.get('cmds', ())))
+        return obj.get('cmd') in self.blocking
+
+    async def dispatch(self, obj):
+        """handle_command, moved to the work thread for blocking commands
+
+        Commands from one connection are awaited in turn, so they still
+        apply in the order they were sent.
+        """
+        if self._executor is not None and self.is_blocking(obj):
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, self.handle_command, obj)
+        return self.handle_command(obj)
+
+    def _decode_message(self, data):
+        if dsp_protocol.is_binary(data):
+            return dsp_protocol.decode(data)
+        try:
+            return json.loads(data.decode('utf-8'))
+        except ValueError:
+            raise ValueError('parse')
+
+    def _encode_reply(self, data, ack):
+        if dsp_protocol.is_binary(data):
+            return self._encode_ack(ack)
+        return json.dumps(ack).encode('utf-8')
+
+    def handle_message(self, data):
+        """Decode a complete message (frame or JSON text) and return the encoded ack"""
+        try:
+            ack = self.handle_command(self._decode_message(data))
+        except ValueError as e:
+            self.errors += 1
+            ack = {'ok': False, 'error': str(e)}
+        return self._encode_reply(data, ack)
+
+    async def handle_message_async(self, data):
+        """handle_message for the event loop; blocking commands go to the work thread"""
+        try:
+            obj = self._decode_message(data)
+        except ValueError as e:
+            self.errors += 1
+            ack = {'ok': False, 'error': str(e)}
+        else:
+            ack = await self.dispatch(obj)
+        return self._encode_reply(data, ack)
+
+    @staticmethod
+    def _encode_ack(ack):
+        detail = {k: v for k, v in ack.items() if k != 'ok'}
+        return dsp_protocol.encode_ack(ack['ok'], detail or None)
+
+    def _cmd_eq(self, obj):
+        self.audio_service.dsp_processor.set_eq_band(int(obj['band']), float(obj['value']))
+
+    def _cmd_eq_curve(self, obj):
+        for band, value in enumerate(obj['values']):
+            self.audio_service.dsp_processor.set_eq_band(band, float(value))
+
+    def _cmd_gain(self, obj):
+        self.audio_service.dsp_processor.set_output_gain(float(obj['value']))
+
+    def _cmd_delay(self, obj):
+        self.audio_service.dsp_processor.set_delay(float(obj['value']))
+
+    def _cmd_input(self, obj):
+        # Capture (and its audio source) belongs to the Java service
+        raise ValueError("input source is chosen by the capture service")
+
+    def _cmd_select_channel(self, obj):
+        raise ValueError("no channel selection here; address channels with 'channel'")
+
+    def _cmd_channel(self, obj):
+        self.audio_service.dsp_processor.set_channel_setting(
+            obj['channel'], obj['param'], obj['value'])
+
+    def _cmd_load_preset_file(self, obj):
+        self.audio_service.dsp_processor.load_preset_file(obj['path'])
+
+    def _cmd_preset(self, obj):
+        self.audio_service.dsp_processor.load_preset(obj['name'])
+
+    def _cmd_preset_list(self, obj):
+        return {'presets': self.audio_service.dsp_processor.presets.names(obj.get('tag'))}
+
+    def _cmd_preset_save(self, obj):
+        self.audio_service.dsp_processor.save_preset(obj['name'], obj.get('tags', ()))
+
+    def _cmd_spectrum_start(self, obj):
+        self.audio_service.dsp_processor.start_spectrum_output(obj['path'])
+
+    def _cmd_spectrum_stop(self, obj):
+        self.audio_service.dsp_processor.stop_spectrum_output()
+
+    def _cmd_analysis_mode(self, obj):
+        self.audio_service.dsp_processor.set_analysis_mode(obj['mode'])
+
+    def _cmd_batch(self, obj):
+        failed = [ack for ack in map(self.handle_command, obj['cmds']) if not ack['ok']]
+        if failed:
+            raise ValueError(f"{len(failed)} of {len(obj['cmds'])} batched commands failed")
+
+    def _cmd_status(self, obj):
+        return self.audio_service.get_status()
+
+    def _cmd_stats(self, obj):
+        self.audio_service.stats.mark_thread('control')
+        return self.audio_service.get_stats(reset=obj.get('reset', False))
+
+    def _cmd_stats_log(self, obj):
+        # A path starts the rolling log, no path stops it
+        if obj.get('path'):
+            self.audio_service.start_stats_log(obj['path'], obj.get('interval', 1.0),
+                                               obj.get('capacity', 3600))
+        else:
+            self.audio_service.stop_stats_log()
+
+    # -- transports --
+
+    async def _handle_stream(self, reader, writer):
+        self.clients += 1
+        try:
+            first = await reader.read(4096)
+            if dsp_protocol.is_binary(first):
+                await self._serve_binary(first, reader, writer)
+            else:
+                await self._serve_json(first, reader, writer)
+        except (ConnectionError, dsp_protocol.ProtocolError) as e:
+            Logger.warning(f"DSP: Control client dropped: {e}")
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def _serve_binary(self, data, reader, writer):
+        frames = dsp_protocol.FrameReader()
+        while data:
+            for opcode, payload in frames.feed(data):
+                try:
+                    obj = dsp_protocol.decode_payload(opcode, payload)
+                except ValueError as e:
+                    self.errors += 1
+                    ack = {'ok': False, 'error': str(e)}
+                else:
+                    ack = await self.dispatch(obj)
+                writer.write(self._encode_ack(ack))
+            await writer.drain()
+            data = await reader.read(4096)
+
+    async def _serve_json(self, data, reader, writer):
+        # Messages may or may not be newline terminated, so parse objects
+        # straight off the buffer instead of splitting on lines. The
+        # incremental decoder keeps characters split across reads intact.
+        decoder = json.JSONDecoder()
+        utf8 = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        text = ''
+        while data:
+            text += utf8.decode(data)
+            while True:
+                text = text.lstrip()
+                if not text:
+                    break
+                try:
+                    obj, end = decoder.raw_decode(text)
+                except json.JSONDecodeError as e:
+                    if _incomplete(e, text) and len(text) < dsp_protocol.MAX_PAYLOAD:
+                        break
+                    # Garbage: nack it and resume after the line it is on
+                    self.errors += 1
+                    writer.write(json.dumps({'ok': False, 'error': 'parse'}).encode('utf-8') + b'\n')
+                    newline = text.find('\n', e.pos)
+                    text = text[newline + 1:] if newline >= 0 else ''
+                    continue
+                text = text[end:]
+                ack = await self.dispatch(obj)
+                writer.write(json.dumps(ack).encode('utf-8') + b'\n')
+            await writer.drain()
+            data = await reader.read(4096)
+
+    async def _open(self):
+        if self.uds_name:
+            address = _socket_address(self.uds_name)
+            if not address.startswith("\0") and os.path.exists(address):
+                os.unlink(address)
+            self._servers.append(await asyncio.start_unix_server(self._handle_stream, address))
+            Logger.info(f"DSP: Control server listening on {self.uds_name}")
+        if self.udp_port is not None:
+            transport, _ = await self._loop.create_datagram_endpoint(
+                lambda: _UDPControl(self), local_addr=(self.host, self.udp_port),
+                family=socket.AF_INET)
+            self._servers.append(transport)
+            Logger.info(f"DSP: Control server listening on udp {self.host}:{self.udp_port}")
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._open())
+        except OSError as e:
+            Logger.error(f"DSP: Control server failed to start: {e}")
+        finally:
+            self._started.set()
+        self._loop.run_forever()
+        for server in self._servers:
+            server.close()
+        self._servers = []
+        # Unwind the UDP consumer and any open connections before closing
+        pending = asyncio.all_tasks(self._loop)
+        for task in pending:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self._loop.close()
+
+    def start(self):
+        """Start serving on a background event loop thread"""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="DSP-Control-Work")
+        self._started.clear()
+        self._thread = threading.Thread(target=self._run, name="DSP-Control-Server", daemon=True)
+        self._thread.start()
+        self._started.wait(2.0)
+
+    def stop(self):
+        """Stop serving and close every listener"""
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(2.0)
+        self._thread = None
+        self._executor.shutdown(wait=False)
+        self._executor = None
+        if self.uds_name and not self.uds_name.startswith("@"):
+            try:
+                os.unlink(self.uds_name)
+            except OSError:
+                pass
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Partitioned FFT convolution for Car DSP
+Room-correction FIR filters from measured impulse responses (WAV / NPY)
+"""
+
+import os
+import wave
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+PARTITION_SIZE = 512
+MAX_TAPS = 65536
+
+
+def decode_pcm(raw, width, channels):
+    """Little-endian 16/24/32-bit PCM bytes as (frames x channels) float64 in [-1, 1)"""
+    if width == 3:
+        # Sign-extend packed 24-bit little endian into int32
+        packed = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        samples = (packed[:, 0].astype(np.int32) | (packed[:, 1].astype(np.int32) << 8)
+                   | (packed[:, 2].astype(np.int8).astype(np.int32) << 16))
+        scale = 2.0 ** 23
+    elif width in (2, 4):
+        samples = np.frombuffer(raw, dtype=f'<i{width}')
+        scale = 2.0 ** (8 * width - 1)
+    else:
+        raise ValueError(f"unsupported PCM sample width {width}")
+    return samples.reshape(-1, channels) / scale
+
+
+def load_impulse_response(path):
+    """Read an IR file as (channels x taps) float64 plus its sample rate
+
+    WAV files may be 16/24/32-bit PCM; .npy files hold a 1-D or
+    (channels x taps) array and carry no sample rate (None).
+    """
+    if os.path.splitext(path)[1].lower() == '.npy':
+        ir = np.atleast_2d(np.load(path, mmap_mode='r')).astype(np.float64)
+        return ir, None
+
+    with wave.open(path, 'rb') as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+    return decode_pcm(raw, width, channels).T, rate
+
+
+class PartitionedConvolver:
+    """Uniformly partitioned overlap-save convolution, one IR per channel
+
+    The IR is split into partition_size blocks whose spectra are computed
+    once; each hop of input adds one spectrum to a frequency-domain delay
+    line as deep as the IR. Latency is one partition and memory grows
+    linearly with IR length (max_taps only bounds what may be loaded).
+    After a swap to a longer IR, only the shorter IR's history exists, so
+    the new tail fills in over one IR length while it fades in.
+    Replacing the IR crossfades from the old filter to the new one.
+    """
+
+    def __init__(self, impulse_response, partition_size=PARTITION_SIZE, max_block=4096,
+                 max_taps=MAX_TAPS, crossfade=4096):
+        ir = np.asarray(impulse_response, dtype=np.float64)
+        self.mono = ir.ndim == 1
+        ir = np.atleast_2d(ir)
+        self.channels = ir.shape[0]
+        self.partition_size = partition_size
+        self.fft_size = 2 * partition_size
+        self.bins = partition_size + 1
+        self.max_block = max_block
+        self.max_partitions = -(-max_taps // partition_size)
+        self.latency = partition_size
+        # Fades run a whole number of hops
+        self.crossfade_hops = max(1, -(-crossfade // partition_size))
+
+        hop = partition_size
+        self._input = np.zeros((self.channels, self.fft_size + max_block))
+        self._fifo = np.zeros((self.channels, max_block + 2 * hop))
+        self.output = np.zeros((self.channels, max_block), dtype=np.float32)
+        self._ramp = (np.arange(1, hop + 1) / hop)
+
+        self._filters = self._partition(ir)
+        # Delay line as deep as the IR, stored twice so the newest-first
+        # window is one slice; it is resized when an IR of another length
+        # is swapped in
+        self._depth = self._filters.shape[1]
+        self._fdl = self._delay_line(self._depth)
+        self._pending = None
+        self._fading = None
+        self.reset()
+
+    def _delay_line(self, partitions):
+        return np.zeros((self.channels, 2 * partitions, self.bins), dtype=np.complex128)
+
+    def _partition(self, ir):
+        """Frequency-domain partitions, shape (channels x partitions x bins)"""
+        ir = np.atleast_2d(np.asarray(ir, dtype=np.float64))
+        if ir.shape[0] != self.channels:
+            raise ValueError(f"expected {self.channels} IR channels, got {ir.shape[0]}")
+        taps = ir.shape[1]
+        partitions = max(1, -(-taps // self.partition_size))
+        if partitions > self.max_partitions:
+            raise ValueError(f"IR of {taps} taps exceeds {self.max_partitions * self.partition_size}")
+        padded = np.zeros((self.channels, partitions * self.partition_size))
+        padded[:, :taps] = ir
+        blocks = padded.reshape(self.channels, partitions, self.partition_size)
+        return np.fft.rfft(blocks, self.fft_size, axis=2)
+
+    def set_impulse_response(self, impulse_response):
+        """Swap in a new IR; it fades in over the next crossfade samples
+
+        The transform runs on the caller's thread, the swap on the audio thread.
+        A delay line for the new length is allocated here as well; the audio
+        thread only moves history into it.
+        """
+        filters = self._partition(impulse_response)
+        partitions = filters.shape[1]
+        spare = self._delay_line(partitions) if partitions != self._depth else None
+        self._pending = (filters, spare)
+
+    def reset(self):
+        self._input[:] = 0.0
+        self._fill = self.partition_size
+        self._fifo[:] = 0.0
+        self._fifo_fill = self.partition_size
+        self._fdl[:] = 0.0
+        self._position = 0
+
+    def _move_history(self, fdl):
+        """Carry the newest spectra over into a delay line of another depth (audio thread)"""
+        depth = fdl.shape[1] // 2
+        keep = min(depth, self._depth)
+        history = self._fdl[:, self._position:self._position + keep]
+        fdl[:, :keep] = history
+        fdl[:, depth:depth + keep] = history
+        self._fdl, self._depth, self._position = fdl, depth, 0
+
+    def _convolve(self, filters, history):
+        spectrum = np.einsum('cpb,cpb->cb', filters, history[:, :filters.shape[1]])
+        return np.fft.irfft(spectrum, self.fft_size, axis=1)[:, self.partition_size:]
+
+    def _render(self, spectra, dest):
+        hop = self.partition_size
+        for k in range(spectra.shape[1]):
+            if self._pending is not None and self._fading is None:
+                target, spare = self._pending
+                self._pending = None
+                if target.shape[1] > self._depth:
+                    # Grow now: both filters run during the fade
+                    self._move_history(spare if spare is not None
+                                       else self._delay_line(target.shape[1]))
+                    spare = None
+                self._fading = [target, 0, spare]
+
+            depth = self._depth
+            self._position = (self._position - 1) % depth
+            self._fdl[:, self._position] = spectra[:, k]
+            self._fdl[:, self._position + depth] = spectra[:, k]
+            history = self._fdl[:, self._position:self._position + depth]
+
+            out = dest[:, k * hop:(k + 1) * hop]
+            out[:] = self._convolve(self._filters, history)
+            if self._fading is not None:
+                target, step, spare = self._fading
+                fade = (step + self._ramp) / self.crossfade_hops
+                out += fade * (self._convolve(target, history) - out)
+                step += 1
+                if step == self.crossfade_hops:
+                    self._filters = target
+                    self._fading = None
+                    if spare is not None:
+                        # Shrink once the longer filter has faded out
+                        self._move_history(spare)
+                else:
+                    self._fading[1] = step
+
+    def process(self, block):
+        """Filter one block (frames, or channels x frames); same shape out, float32"""
+        block = np.asarray(block)
+        count = block.shape[-1]
+        if count > self.max_block:
+            raise ValueError(f"block of {count} frames exceeds max_block {self.max_block}")
+
+        size, hop = self.fft_size, self.partition_size
+        self._input[:, self._fill:self._fill + count] = block
+        self._fill += count
+        frames = (self._fill - size) // hop + 1 if self._fill >= size else 0
+        if frames:
+            windows = sliding_window_view(self._input[:, :self._fill], size, axis=1)[:, ::hop][:, :frames]
+            spectra = np.fft.rfft(windows, axis=2)
+            done = frames * hop
+            self._render(spectra, self._fifo[:, self._fifo_fill:self._fifo_fill + done])
+            self._fifo_fill += done
+            remaining = self._fill - done
+            self._input[:, :remaining] = self._input[:, done:self._fill]
+            self._fill = remaining
+
+        out = self.output[:, :count]
+        out[:] = self._fifo[:, :count]
+        self._fifo[:, :self._fifo_fill - count] = self._fifo[:, count:self._fifo_fill]
+        self._fifo_fill -= count
+        return out[0] if self.mono else out
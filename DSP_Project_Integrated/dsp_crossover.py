@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Six-channel crossover and time alignment for Car DSP
+Routes mono/stereo input to speaker channels with Linkwitz-Riley filters,
+fractional delay, polarity and level, all channels processed as one block
+"""
+
+import numpy as np
+
+from dsp_convolver import PartitionedConvolver
+from dsp_eq import block_tables, sos_to_state_space
+
+CHANNELS = ('front_left', 'front_right', 'rear_left', 'rear_right', 'subwoofer', 'center')
+
+# Input mix for each channel as (left, right) weights
+ROUTING = np.array([
+    [1.0, 0.0],
+    [0.0, 1.0],
+    [1.0, 0.0],
+    [0.0, 1.0],
+    [0.5, 0.5],
+    [0.5, 0.5],
+])
+
+DEFAULT_CHANNEL = {
+    'gain': 0.0,        # dB
+    'volume': 1.0,      # 0..1
+    'highpass': 0.0,    # Hz, 0 = off
+    'lowpass': 0.0,     # Hz, 0 = off
+    'delay': 0.0,       # ms
+    'phase': False,     # polarity inverted
+    'mute': False,
+    'bypass': False,
+}
+
+BUTTERWORTH_Q = 1 / np.sqrt(2)
+_IDENTITY = np.array([1.0, 0.0, 0.0, 0.0, 0.0])
+
+
+def butterworth_section(kind, freq, sample_rate, q=BUTTERWORTH_Q):
+    """Second-order 'lowpass' or 'highpass' biquad as b0, b1, b2, a1, a2"""
+    w0 = 2 * np.pi * freq / sample_rate
+    cos_w0 = np.cos(w0)
+    alpha = np.sin(w0) / (2 * q)
+    a0 = 1 + alpha
+    if kind == 'lowpass':
+        b = np.array([(1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2])
+    else:
+        b = np.array([(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2])
+    return np.concatenate((b / a0, [-2 * cos_w0 / a0, (1 - alpha) / a0]))
+
+
+def linkwitz_riley_sos(kind, freq, sample_rate):
+    """LR4 filter as two identical Butterworth sections; identity when off"""
+    if not freq or freq <= 0 or freq >= 0.49 * sample_rate:
+        return np.array([_IDENTITY, _IDENTITY])
+    section = butterworth_section(kind, freq, sample_rate)
+    return np.array([section, section])
+
+
+def compile_channels(settings, channels, sample_rate, max_delay_ms=20.0):
+    """Filter sections, signed levels and delays (in samples) for every channel
+
+    Returns (sos, gains, delays) with sos shaped (channels, 4, 5): the
+    highpass and lowpass LR4 pairs. Presets store exactly these arrays.
+    """
+    sos = np.empty((len(channels), 4, 5))
+    gains = np.empty(len(channels))
+    delays = np.empty(len(channels))
+    for i, name in enumerate(channels):
+        s = settings[name]
+        if s['bypass']:
+            sos[i] = _IDENTITY
+            gains[i] = 0.0 if s['mute'] else 1.0
+            delays[i] = 0.0
+        else:
+            sos[i, :2] = linkwitz_riley_sos('highpass', s['highpass'], sample_rate)
+            sos[i, 2:] = linkwitz_riley_sos('lowpass', s['lowpass'], sample_rate)
+            level = 10 ** (s['gain'] / 20.0) * s['volume']
+            gains[i] = 0.0 if s['mute'] else (-level if s['phase'] else level)
+            delays[i] = min(max(s['delay'], 0.0), max_delay_ms) * sample_rate / 1000.0
+    return sos, gains, delays
+
+
+class CrossoverProgram:
+    """Ready-to-run crossover: state-space systems, levels and delay taps
+
+    Block tables are cached per block length; prepare() builds them ahead of
+    time so installing the program on the audio thread is only a swap.
+    """
+
+    def __init__(self, sos, gains, delays):
+        self.sos = np.asarray(sos, dtype=np.float64)
+        self.gains = np.asarray(gains, dtype=np.float64)
+        self.delays = np.asarray(delays, dtype=np.float64)
+        self.systems = [sos_to_state_space(sections) for sections in self.sos]
+
+        # Cubic Lagrange fractional delay: integer part offsets the read
+        # position, the 4 taps interpolate the remaining 1..2 samples
+        base = np.maximum(np.floor(self.delays) - 1, 0)
+        frac = self.delays - base
+        self.delay_base = base.astype(np.intp)
+        self.delay_taps = np.stack([
+            -(frac - 1) * (frac - 2) * (frac - 3) / 6,
+            frac * (frac - 2) * (frac - 3) / 2,
+            -frac * (frac - 1) * (frac - 3) / 2,
+            frac * (frac - 1) * (frac - 2) / 6,
+        ], axis=1)
+        self._tables = {}
+        self._taps = {}
+
+    def block_tables(self, length):
+        tables = self._tables.get(length)
+        if tables is None:
+            per_channel = [block_tables(system, length) for system in self.systems]
+            tables = (
+                np.stack([t[0] for t in per_channel]),
+                per_channel[0][1],
+                np.stack([t[2] for t in per_channel]),
+                np.stack([t[3] for t in per_channel]),
+                np.stack([t[4] for t in per_channel]),
+            )
+            self._tables = {length: tables}
+        return tables
+
+    def tap_index(self, history, length):
+        index = self._taps.get((history, length))
+        if index is None:
+            start = history + np.arange(length)[None, :] - self.delay_base[:, None]
+            index = np.stack([start - k for k in range(4)])
+            self._taps = {(history, length): index}
+        return index
+
+    def prepare(self, history, length):
+        """Build the tables for one block length on the caller's thread"""
+        self.block_tables(length)
+        self.tap_index(history, length)
+        return self
+
+
+class CrossoverEngine:
+    """Mono or stereo in, (channels x frames) out"""
+
+    def __init__(self, sample_rate=44100, max_block=4096, max_delay_ms=20.0,
+                 channels=CHANNELS, routing=ROUTING, crossfade=2048):
+        self.channels = tuple(channels)
+        self.routing = np.asarray(routing, dtype=np.float64)
+        self.settings = {name: dict(DEFAULT_CHANNEL) for name in self.channels}
+        self.sample_rate = sample_rate
+        self.max_block = max_block
+        self.max_delay_ms = max_delay_ms
+        self.crossfade = crossfade
+
+        n = len(self.channels)
+        self.output = np.zeros((n, max_block), dtype=np.float32)
+        self._state = np.zeros((n, 8))
+        self._program = None
+        self._pending = None
+        self._fading = None
+        self._dirty = True
+        self._allocate_delay_line()
+        # Optional per-channel room correction after level and delay
+        self.correction = None
+
+    def _allocate_delay_line(self):
+        # Room for the longest delay plus the 4-tap interpolator
+        self._history = int(np.ceil(self.max_delay_ms * self.sample_rate / 1000.0)) + 4
+        self._line = np.zeros((len(self.channels), self._history + self.max_block))
+
+    def set_channel(self, name, **params):
+        """Update one or more settings of a channel; crossfades to the new filters
+
+        The program is designed here, on the caller's thread, like
+        set_program(); before the first block only the settings change.
+        """
+        settings = self.settings[name]
+        for key, value in params.items():
+            if key not in settings:
+                raise KeyError(key)
+            settings[key] = value
+        if self._program is None:
+            self._dirty = True
+            return
+        program = CrossoverProgram(*compile_channels(
+            self.settings, self.channels, self.sample_rate, self.max_delay_ms))
+        self._pending = program.prepare(self._history, self.max_block)
+
+    def set_program(self, settings, program, block_size=None):
+        """Install a precompiled program (e.g. from a preset); crossfades from the current one
+
+        Tables are built here, on the caller's thread, for ``block_size``;
+        the audio thread only swaps the program in.
+        """
+        for name, values in settings.items():
+            self.settings[name].update(values)
+        program.prepare(self._history, block_size or self.max_block)
+        self._pending = program
+
+    def set_sample_rate(self, sample_rate):
+        if sample_rate != self.sample_rate:
+            self.sample_rate = sample_rate
+            self._allocate_delay_line()
+            self._state[:] = 0.0
+            self._pending = None
+            self._fading = None
+            self._dirty = True
+
+    def reset(self):
+        self._state[:] = 0.0
+        self._line[:] = 0.0
+        self._fading = None
+        if self.correction is not None:
+            self.correction.reset()
+
+    def set_correction(self, impulse_responses):
+        """Load (channels x taps) correction IRs; crossfades if already running"""
+        if self.correction is None:
+            self.correction = PartitionedConvolver(impulse_responses, max_block=self.max_block)
+        else:
+            self.correction.set_impulse_response(impulse_responses)
+
+    def _rebuild(self):
+        self._program = CrossoverProgram(*compile_channels(
+            self.settings, self.channels, self.sample_rate, self.max_delay_ms))
+        self._dirty = False
+
+    def _swap(self):
+        program, self._pending = self._pending, None
+        if self._program is not None and self.crossfade:
+            # The outgoing program keeps running on copies of the state
+            self._fading = [self._program, self._state.copy(), self._line.copy(), 0]
+        self._program = program
+        self._dirty = False
+
+    def _mix(self, audio_data):
+        x = np.asarray(audio_data, dtype=np.float64)
+        if x.ndim == 1:
+            # Mono feeds every channel at the routing's total weight
+            return np.outer(self.routing.sum(axis=1), x)
+        return self.routing @ x[:2]
+
+    def _render(self, program, state, line, mixed, frames):
+        """Filter, delay and scale through one program; updates state and line in place"""
+        spectrum, nfft, observe, drive, a_n = program.block_tables(frames)
+
+        # All channels' LR4 high/low-pass cascades in one batched pass
+        filtered = np.fft.irfft(np.fft.rfft(mixed, nfft, axis=1) * spectrum, nfft, axis=1)[:, :frames]
+        filtered += np.einsum('cnm,cm->cn', observe, state)
+        state[:] = np.einsum('cij,cj->ci', a_n, state) + np.einsum('cmn,cn->cm', drive, mixed)
+
+        # Fractional delay line shared by all channels
+        line[:, self._history:self._history + frames] = filtered
+        index = program.tap_index(self._history, frames)
+        delayed = np.einsum('ck,kcn->cn', program.delay_taps,
+                            np.take_along_axis(line[None], index, axis=2))
+        line[:, :self._history] = line[:, frames:frames + self._history]
+        delayed *= program.gains[:, None]
+        return delayed
+
+    def process(self, audio_data):
+        """Route, filter, delay and scale one block; returns a (channels, frames) view"""
+        if self._pending is not None:
+            self._swap()
+        if self._dirty:
+            self._rebuild()
+
+        frames = np.shape(audio_data)[-1]
+        if frames > self.max_block:
+            raise ValueError(f"block of {frames} frames exceeds max_block {self.max_block}")
+
+        mixed = self._mix(audio_data)
+        result = self._render(self._program, self._state, self._line, mixed, frames)
+        if self._fading is not None:
+            program, state, line, position = self._fading
+            previous = self._render(program, state, line, mixed, frames)
+            ramp = np.minimum((position + np.arange(1, frames + 1)) / self.crossfade, 1.0)
+            result = previous + ramp * (result - previous)
+            position += frames
+            self._fading = None if position >= self.crossfade else [program, state, line, position]
+
+        out = self.output[:, :frames]
+        out[:] = result
+        if self.correction is not None:
+            out[:] = self.correction.process(out)
+        return out
+
+    def write(self, block):
+        """Pipeline sink interface"""
+        self.process(block)
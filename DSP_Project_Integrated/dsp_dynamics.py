@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Dynamics processing for Car DSP
+Soft-knee compressor and lookahead limiter with attack/release envelopes
+"""
+
+import numpy as np
+
+CHUNK_SIZE = 32  # samples per envelope step when there is no lookahead
+
+
+def db_to_linear(db):
+    return 10 ** (np.asarray(db) / 20.0)
+
+
+def linear_to_db(value, floor=1e-9):
+    return 20 * np.log10(np.maximum(value, floor))
+
+
+class Compressor:
+    """Feed-forward peak compressor with a stateful attack/release envelope
+
+    The side chain is reduced to one peak per chunk, so the attack/release
+    recursion steps once per chunk rather than once per sample; gains are
+    linearly interpolated back to every sample. With lookahead the audio is
+    delayed by one chunk so gain changes land before the peaks they react to.
+    """
+
+    def __init__(self, threshold_db=-3.0, ratio=4.0, knee_db=6.0, attack_ms=3.0,
+                 release_ms=100.0, makeup_db=0.0, lookahead_ms=0.0,
+                 sample_rate=44100, max_block=4096):
+        self.threshold_db = threshold_db
+        self.ratio = ratio
+        self.knee_db = knee_db
+        self.attack_ms = attack_ms
+        self.release_ms = release_ms
+        self.makeup_db = makeup_db
+        self.lookahead_ms = lookahead_ms
+
+        # Metering, in positive dB of reduction
+        self.gain_reduction_db = 0.0
+        self.max_gain_reduction_db = 0.0
+
+        self.prepare(sample_rate, max_block)
+
+    def prepare(self, sample_rate, max_block):
+        """Size buffers and envelope coefficients for a format"""
+        self.sample_rate = sample_rate
+        self.max_block = max_block
+        self.lookahead = int(round(self.lookahead_ms * sample_rate / 1000.0))
+        self.chunk = self.lookahead or CHUNK_SIZE
+        self._positions = np.arange(max_block, dtype=np.float64)
+        self._line = np.zeros(self.lookahead + max_block, dtype=np.float32)
+        self._gain = np.ones(max_block, dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self._envelope = 0.0      # smoothed gain in dB (<= 0)
+        self._previous_target = 0.0
+        self._line[:] = 0.0
+        self.gain_reduction_db = 0.0
+        self.max_gain_reduction_db = 0.0
+
+    def _coefficient(self, time_ms):
+        if time_ms <= 0:
+            return 0.0
+        return float(np.exp(-self.chunk / (time_ms * self.sample_rate / 1000.0)))
+
+    def gain_computer(self, level_db):
+        """Static curve: gain in dB (<= 0) for side-chain levels in dB"""
+        over = np.asarray(level_db, dtype=np.float64) - self.threshold_db
+        slope = 1.0 / self.ratio - 1.0
+        gain = np.where(over > 0, slope * over, 0.0)
+        if self.knee_db > 0:
+            half = self.knee_db / 2.0
+            knee = slope * (over + half) ** 2 / (2 * self.knee_db)
+            gain = np.where(np.abs(over) <= half, knee, gain)
+        return gain
+
+    def _envelope_knots(self, targets):
+        attack = self._coefficient(self.attack_ms)
+        release = self._coefficient(self.release_ms)
+        envelope = self._envelope
+        knots = np.empty(len(targets))
+        for i, target in enumerate(targets.tolist()):
+            coef = attack if target < envelope else release
+            envelope = target + coef * (envelope - target)
+            knots[i] = envelope
+        return knots
+
+    def process(self, block):
+        """Compress block (float32, 1-D) in place; returns it"""
+        count = len(block)
+        if count == 0:
+            return block
+        if count > self.max_block:
+            raise ValueError(f"block of {count} samples exceeds max_block {self.max_block}")
+
+        starts = np.arange(0, count, self.chunk)
+        ends = np.append(starts[1:], count) - 1
+        peaks = np.maximum.reduceat(np.abs(block), starts)
+        targets = self.gain_computer(linear_to_db(peaks))
+        if self.lookahead:
+            # The delayed chunk is the one before, so honour both
+            shifted = np.concatenate(([self._previous_target], targets[:-1]))
+            self._previous_target = float(targets[-1])
+            targets = np.minimum(targets, shifted)
+
+        knots = self._envelope_knots(targets)
+        start_db = self._envelope
+        self._envelope = float(knots[-1])
+        self.gain_reduction_db = -self._envelope
+        self.max_gain_reduction_db = -float(min(knots.min(), start_db))
+
+        # Per-sample linear gain, ramping between chunk-end knots
+        gain = self._gain[:count]
+        gain[:] = np.interp(self._positions[:count],
+                            np.concatenate(([-1.0], ends)),
+                            db_to_linear(np.concatenate(([start_db], knots)) + self.makeup_db))
+
+        if self.lookahead:
+            line = self._line
+            line[self.lookahead:self.lookahead + count] = block
+            np.multiply(line[:count], gain, out=block)
+            line[:self.lookahead] = line[count:count + self.lookahead]
+        else:
+            block *= gain
+        return block
+
+
+class Limiter(Compressor):
+    """Lookahead brickwall limiter: infinite ratio, instant attack, final clip"""
+
+    def __init__(self, ceiling_db=-0.45, release_ms=50.0, lookahead_ms=1.5,
+                 sample_rate=44100, max_block=4096):
+        super().__init__(threshold_db=ceiling_db, ratio=np.inf, knee_db=0.0,
+                         attack_ms=0.0, release_ms=release_ms,
+                         lookahead_ms=lookahead_ms, sample_rate=sample_rate,
+                         max_block=max_block)
+
+    @property
+    def ceiling(self):
+        return float(db_to_linear(self.threshold_db))
+
+    def process(self, block):
+        super().process(block)
+        # Catches the rare overshoot when chunking and block edges misalign
+        np.clip(block, -self.ceiling, self.ceiling, out=block)
+        return block
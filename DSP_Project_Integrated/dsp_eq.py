@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Streaming graphic EQ for Car DSP
+Peaking-biquad cascade evaluated a whole block at a time
+"""
+
+import numpy as np
+
+# Standard 31-band (1/3 octave) centre frequencies
+ISO_31_BANDS = np.array([20, 25, 31, 40, 50, 63, 80, 100, 125, 160, 200, 250,
+                         315, 400, 500, 630, 800, 1000, 1250, 1600, 2000, 2500,
+                         3150, 4000, 5000, 6300, 8000, 10000, 12500, 16000, 20000],
+                        dtype=np.float64)
+
+# Bandwidth of one third of an octave expressed as a filter Q
+THIRD_OCTAVE_Q = np.sqrt(2 ** (1 / 3)) / (2 ** (1 / 3) - 1)
+
+
+def peaking_coefficients(freqs, gains_db, sample_rate, q=THIRD_OCTAVE_Q):
+    """Return normalized peaking biquads as an (n, 5) array of b0, b1, b2, a1, a2"""
+    freqs = np.asarray(freqs, dtype=np.float64)
+    amp = 10.0 ** (np.asarray(gains_db, dtype=np.float64) / 40.0)
+    w0 = 2 * np.pi * freqs / sample_rate
+    alpha = np.sin(w0) / (2 * q)
+    cos_w0 = np.cos(w0)
+    a0 = 1 + alpha / amp
+
+    sos = np.empty((len(freqs), 5))
+    sos[:, 0] = (1 + alpha * amp) / a0
+    sos[:, 1] = -2 * cos_w0 / a0
+    sos[:, 2] = (1 - alpha * amp) / a0
+    sos[:, 3] = sos[:, 1]
+    sos[:, 4] = (1 - alpha / amp) / a0
+    return sos
+
+
+def sos_to_state_space(sos):
+    """Fold a biquad cascade into a single transposed direct-form II system (A, B, C, D)"""
+    order = 2 * len(sos)
+    a = np.zeros((order, order))
+    b = np.zeros(order)
+    c = np.zeros(order)
+    d = 1.0
+
+    for i, (b0, b1, b2, a1, a2) in enumerate(sos):
+        k = 2 * i
+        drive = np.array([b1 - a1 * b0, b2 - a2 * b0])
+
+        # This section is fed by the output of everything before it
+        a[k:k + 2, :k] = np.outer(drive, c[:k])
+        a[k, k] = -a1
+        a[k, k + 1] = 1.0
+        a[k + 1, k] = -a2
+        b[k:k + 2] = drive * d
+
+        c[:k] *= b0
+        c[k] = 1.0
+        d *= b0
+
+    return a, b, c, d
+
+
+def _krylov_rows(matrix, vector, count, left=False):
+    """Stack A^j v (or v A^j when left=True) for j in range(count) as rows"""
+    rows = np.empty((count, len(vector)))
+    rows[0] = vector
+    step = matrix if left else matrix.T
+    filled = 1
+    while filled < count:
+        take = min(filled, count - filled)
+        rows[filled:filled + take] = rows[:take] @ step
+        step = step @ step
+        filled += take
+    return rows
+
+
+def block_tables(system, length):
+    """Precompute everything needed to run a state-space system over one block
+
+    Returns (spectrum, nfft, observe, drive, a_n): the FFT of the block-length
+    impulse response, the (length, order) map from state to output, the
+    (order, length) map from input to next state and A^length.
+    """
+    a, b, c, d = system
+    drive = _krylov_rows(a, b, length)               # A^j B
+    observe = _krylov_rows(a, c, length, left=True)  # C A^j
+
+    impulse = np.empty(length)
+    impulse[0] = d
+    impulse[1:] = observe[:length - 1] @ b
+
+    nfft = 1 << (2 * length - 1).bit_length()
+    return (
+        np.fft.rfft(impulse, nfft),
+        nfft,
+        observe,
+        np.ascontiguousarray(drive[::-1].T),
+        np.linalg.matrix_power(a, length),
+    )
+
+
+class GraphicEQ:
+    """31-band peaking EQ with filter state carried across blocks"""
+
+    MAX_CACHED_BLOCK_SIZES = 4
+
+    def __init__(self, freqs=ISO_31_BANDS, sample_rate=44100, q=THIRD_OCTAVE_Q,
+                 gain_range=(-12.0, 12.0), crossfade=2048):
+        self.freqs = np.asarray(freqs, dtype=np.float64)
+        self.gains = np.zeros(len(self.freqs))
+        self.sample_rate = sample_rate
+        self.q = q
+        self.gain_range = gain_range
+        self.crossfade = crossfade
+
+        self._system = None
+        self._state = None
+        self._tables = {}
+        self._pending = None
+        self._fading = None
+        self._active = False
+        self._dirty = True
+
+    def set_gain(self, band_index, gain_db):
+        """Set one band gain; coefficients are rebuilt on the next block"""
+        gain_db = float(np.clip(gain_db, *self.gain_range))
+        if self.gains[band_index] != gain_db:
+            self.gains[band_index] = gain_db
+            self._dirty = True
+
+    def set_gains(self, gains_db):
+        """Set every band gain at once"""
+        gains_db = np.clip(np.asarray(gains_db, dtype=np.float64), *self.gain_range)
+        if not np.array_equal(self.gains, gains_db):
+            self.gains[:] = gains_db
+            self._dirty = True
+
+    def compile(self, gains_db):
+        """Peaking sections for a gain curve at the current rate (bands above Nyquist dropped)"""
+        gains_db = np.clip(np.asarray(gains_db, dtype=np.float64), *self.gain_range)
+        active = self.freqs < self.sample_rate / 2
+        return peaking_coefficients(self.freqs[active], gains_db[active], self.sample_rate, self.q)
+
+    def load_compiled(self, gains_db, system, tables=None):
+        """Install a precompiled curve (e.g. from a preset); crossfades from the current one
+
+        ``system`` comes from sos_to_state_space() and ``tables`` is a
+        {block length: block_tables()} cache, both built off the audio
+        thread; the audio thread only swaps them in. The cache is used
+        as-is, so a preset can keep it warm across switches.
+        """
+        self._pending = (np.clip(np.asarray(gains_db, dtype=np.float64), *self.gain_range),
+                         system, {} if tables is None else tables)
+
+    def set_sample_rate(self, sample_rate):
+        """Change the sample rate; filter state is cleared"""
+        if sample_rate != self.sample_rate:
+            self.sample_rate = sample_rate
+            self._state = None
+            self._pending = None
+            self._fading = None
+            self._dirty = True
+
+    def reset(self):
+        """Clear filter memory"""
+        if self._state is not None:
+            self._state[:] = 0.0
+        self._fading = None
+        self._active = False
+
+    @property
+    def is_flat(self):
+        return not np.any(self.gains)
+
+    def _rebuild(self):
+        # Bands at or above Nyquist cannot be realised at this sample rate
+        self._system = sos_to_state_space(self.compile(self.gains))
+
+        order = len(self._system[1])
+        if self._state is None or len(self._state) != order:
+            self._state = np.zeros(order)
+
+        # A fresh cache: the old one may belong to a preset
+        self._tables = {}
+        self._dirty = False
+
+    def _swap(self):
+        gains, system, tables = self._pending
+        self._pending = None
+        if self._system is not None and self._state is not None and self.crossfade:
+            # The outgoing curve keeps running on a copy of the state
+            self._fading = [self._system, self._tables, self._state.copy(), 0]
+        self.gains[:] = gains
+        self._system = system
+        self._tables = tables
+        # Same band layout keeps the state continuous across the swap
+        order = len(system[1])
+        if self._state is None or len(self._state) != order:
+            self._state = np.zeros(order)
+        self._dirty = False
+
+    def _block_tables(self, length, system=None, cache=None):
+        """Impulse response spectrum and state maps for one block length"""
+        cache = self._tables if cache is None else cache
+        tables = cache.get(length)
+        if tables is not None:
+            return tables
+
+        tables = block_tables(self._system if system is None else system, length)
+        if len(cache) >= self.MAX_CACHED_BLOCK_SIZES:
+            cache.pop(next(iter(cache)))
+        cache[length] = tables
+        return tables
+
+    def _run(self, tables, state, x):
+        """Filter x through one system's tables; returns (output, next state)"""
+        spectrum, nfft, observe, drive, a_n = tables
+
+        # Zero-state response by FFT convolution plus the decaying tail of
+        # the previous block, then advance the state across the block
+        y = np.fft.irfft(np.fft.rfft(x, nfft) * spectrum, nfft)[:len(x)]
+        y += observe @ state
+        return y, a_n @ state + drive @ x
+
+    def process(self, audio_data, out=None):
+        """Filter one block; returns a new array of the same dtype unless out is given"""
+        if self._pending is not None:
+            self._swap()
+        if self._dirty:
+            if self.is_flat and self._active and self.crossfade and self._fading is None:
+                # Going flat: fade the old curve's ringing tail into bypass
+                self._fading = [self._system, self._tables, self._state.copy(), 0]
+            self._rebuild()
+
+        if (self.is_flat and self._fading is None) or len(audio_data) == 0:
+            self.reset()
+            if out is None:
+                return audio_data
+            if out is not audio_data:
+                out[:] = audio_data
+            return out
+
+        x = np.asarray(audio_data, dtype=np.float64)
+        if self.is_flat:
+            y = x
+        else:
+            y, self._state = self._run(self._block_tables(len(x)), self._state, x)
+        self._active = not self.is_flat
+        if self._fading is not None:
+            system, cache, state, position = self._fading
+            previous, state = self._run(self._block_tables(len(x), system, cache), state, x)
+            ramp = np.minimum((position + np.arange(1, len(x) + 1)) / self.crossfade, 1.0)
+            y = previous + ramp * (y - previous)
+            position += len(x)
+            self._fading = None if position >= self.crossfade else [system, cache, state, position]
+
+        if out is not None:
+            out[:] = y
+            return out
+        return y.astype(np.asarray(audio_data).dtype, copy=False)
+
+    def response_db(self, freqs):
+        """Magnitude response of the current curve at the given frequencies"""
+        active = self.freqs < self.sample_rate / 2
+        sos = peaking_coefficients(self.freqs[active], self.gains[active],
+                                   self.sample_rate, self.q)
+        z = np.exp(-1j * 2 * np.pi * np.asarray(freqs, dtype=np.float64) / self.sample_rate)
+        response = np.ones(len(z), dtype=np.complex128)
+        for b0, b1, b2, a1, a2 in sos:
+            response *= (b0 + b1 * z + b2 * z * z) / (1 + a1 * z + a2 * z * z)
+        return 20 * np.log10(np.abs(response) + 1e-12)
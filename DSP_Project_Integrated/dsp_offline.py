@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Offline batch rendering for Car DSP
+Streams a WAV file or a (memory-mapped) array through the processing chain
+block by block, so memory use does not depend on the file length
+
+Usage: dsp_offline.py input.wav output.wav [--preset preset.json] [--block 4096]
+"""
+
+import argparse
+import json
+import os
+import time
+import wave
+
+import numpy as np
+
+from dsp_convolver import decode_pcm, load_impulse_response
+from dsp_dynamics import Compressor, Limiter, linear_to_db
+from dsp_eq import GraphicEQ
+from dsp_pipeline import (Pipeline, EQStage, FIRStage, GainStage, CompressorStage,
+                          LimiterStage, BassBoostStage, DelayStage, WavFileSink)
+
+BLOCK_SIZE = 4096
+
+
+def open_source(source, sample_rate=None, block_size=BLOCK_SIZE):
+    """Return (blocks, sample_rate, frames) for a WAV path, .npy path or array
+
+    ``blocks`` is a generator of float32 mono blocks; multichannel input is
+    averaged down to mono like the live capture path. Arrays are sliced
+    lazily, so an np.memmap is never read into memory as a whole; integer
+    arrays are taken as PCM and scaled to [-1, 1) like WAV data.
+    """
+    if isinstance(source, (str, os.PathLike)) and str(source).lower().endswith('.wav'):
+        wav = wave.open(str(source), 'rb')
+        return _wav_blocks(wav, block_size), wav.getframerate(), wav.getnframes()
+
+    if isinstance(source, (str, os.PathLike)):
+        source = np.load(source, mmap_mode='r')
+    data = source if isinstance(source, np.ndarray) else np.asarray(source)
+    return _array_blocks(data, block_size), sample_rate or 44100, data.shape[0]
+
+
+def _wav_blocks(wav, block_size):
+    channels = wav.getnchannels()
+    width = wav.getsampwidth()
+    try:
+        while True:
+            raw = wav.readframes(block_size)
+            if not raw:
+                break
+            yield decode_pcm(raw, width, channels).mean(axis=1).astype(np.float32)
+    finally:
+        wav.close()
+
+
+def _array_blocks(data, block_size):
+    # (frames,) or (frames x channels), matching how WAV data is laid out;
+    # integer PCM is scaled to [-1, 1) like decode_pcm (unsigned is offset binary)
+    offset, scale = 0.0, 1.0
+    if data.dtype.kind in 'iu':
+        info = np.iinfo(data.dtype)
+        offset = (int(info.max) + int(info.min) + 1) / 2.0
+        scale = 2.0 / (float(info.max) - float(info.min) + 1.0)
+    block = np.zeros(block_size, dtype=np.float32)
+    for start in range(0, data.shape[0], block_size):
+        chunk = np.asarray(data[start:start + block_size])
+        out = block[:len(chunk)]
+        if chunk.ndim > 1:
+            np.mean(chunk, axis=1, out=out, dtype=np.float32)
+        else:
+            out[:] = chunk
+        if scale != 1.0:
+            out -= offset
+            out *= scale
+        yield out
+
+
+def build_pipeline(settings=None, sample_rate=44100, block_size=BLOCK_SIZE):
+    """The DSPProcessor chain (which is built here too) configured from a preset dict
+
+    Recognised keys: 'eq' (band gains), 'gain', 'compressor', 'limiter',
+    'bass_boost', 'delay' (ms) and 'ir' (path to a correction IR).
+    """
+    settings = settings or {}
+    equalizer = GraphicEQ(sample_rate=sample_rate)
+    gains = np.zeros(len(equalizer.gains))
+    eq = list(settings.get('eq', []))[:len(gains)]
+    gains[:len(eq)] = eq
+    equalizer.set_gains(gains)
+
+    fir = FIRStage()
+    if settings.get('ir'):
+        ir, _ = load_impulse_response(settings['ir'])
+        fir.prepare(sample_rate, block_size)
+        fir.load(ir[0])
+
+    boost = float(settings.get('bass_boost', 0))
+    return Pipeline([
+        EQStage(equalizer),
+        fir,
+        GainStage(float(settings.get('gain', 0.0))),
+        CompressorStage(Compressor(threshold_db=float(linear_to_db(0.7)), ratio=4.0,
+                                   attack_ms=3.0, release_ms=100.0),
+                        bypass=not settings.get('compressor', True)),
+        LimiterStage(Limiter(ceiling_db=float(linear_to_db(0.95))),
+                     bypass=not settings.get('limiter', True)),
+        BassBoostStage(boost, bypass=boost <= 0),
+        DelayStage(float(settings.get('delay', 0.0))),
+    ], sample_rate, block_size)
+
+
+def _flushed(blocks, silence, block_size):
+    """blocks followed by ``silence`` samples of zeros"""
+    yield from blocks
+    zeros = np.zeros(block_size, dtype=np.float32)
+    for start in range(0, silence, block_size):
+        yield zeros[:min(block_size, silence - start)]
+
+
+def process_blocks(pipeline, blocks):
+    """Generator of processed blocks; each is a view reused by the next one"""
+    for block in blocks:
+        yield pipeline.process(block)
+
+
+def render(source, dest, pipeline=None, settings=None, sample_rate=None, block_size=BLOCK_SIZE):
+    """Render source to dest (.wav as 16-bit PCM, .npy as float32) and return timing stats"""
+    blocks, sample_rate, frames = open_source(source, sample_rate, block_size)
+    if pipeline is None:
+        pipeline = build_pipeline(settings, sample_rate, block_size)
+    else:
+        pipeline.set_sample_rate(sample_rate)
+
+    if str(dest).lower().endswith('.npy'):
+        output = np.lib.format.open_memmap(dest, mode='w+', dtype=np.float32, shape=(frames,))
+        sink = None
+    else:
+        output = None
+        sink = WavFileSink(str(dest), sample_rate)
+
+    # Compensate lookahead and FIR partition latency: trim that much from
+    # the start and flush as much silence through at the end
+    skip = pipeline.latency
+    written = 0
+    started = time.perf_counter()
+    try:
+        for block in process_blocks(pipeline, _flushed(blocks, skip, block_size)):
+            trim = min(skip, len(block))
+            skip -= trim
+            block = block[trim:frames - written + trim]
+            if sink is not None:
+                sink.write(block)
+            else:
+                output[written:written + len(block)] = block
+            written += len(block)
+    finally:
+        if sink is not None:
+            sink.close()
+        else:
+            output.flush()
+            del output
+    elapsed = time.perf_counter() - started
+
+    duration = written / float(sample_rate)
+    return {
+        'frames': written,
+        'duration': duration,
+        'elapsed': elapsed,
+        'realtime_factor': elapsed / duration if duration else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render audio through the Car DSP chain")
+    parser.add_argument('input', help="WAV or .npy input")
+    parser.add_argument('output', help="WAV or .npy output")
+    parser.add_argument('--preset', help="JSON preset (eq, gain, compressor, limiter, bass_boost, delay, ir)")
+    parser.add_argument('--rate', type=int, help="sample rate for .npy input (default 44100)")
+    parser.add_argument('--block', type=int, default=BLOCK_SIZE, help="block size in frames")
+    args = parser.parse_args(argv)
+
+    settings = None
+    if args.preset:
+        with open(args.preset, 'r') as f:
+            settings = json.load(f)
+        if settings.get('ir'):
+            settings['ir'] = os.path.join(os.path.dirname(args.preset), settings['ir'])
+
+    stats = render(args.input, args.output, settings=settings, sample_rate=args.rate,
+                   block_size=args.block)
+    print(f"Rendered {stats['duration']:.1f}s in {stats['elapsed']:.2f}s "
+          f"(RTF {stats['realtime_factor']:.3f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Block-based streaming DSP pipeline for Car DSP
+Ordered, bypassable stages processing in place on a preallocated block
+"""
+
+import time
+import wave
+
+import numpy as np
+
+from dsp_convolver import PartitionedConvolver
+from dsp_dynamics import Compressor, Limiter
+
+
+class Stage:
+    """One processing step; subclasses override process() and keep their own state"""
+
+    name = 'stage'
+
+    def __init__(self, bypass=False):
+        self.bypass = bypass
+        self.sample_rate = 44100
+
+    def prepare(self, sample_rate, max_block):
+        """Called before the first block and whenever the format changes"""
+        self.sample_rate = sample_rate
+
+    def process(self, block):
+        """Transform block (float32, 1-D) in place"""
+        raise NotImplementedError
+
+    def reset(self):
+        """Clear any filter or envelope state"""
+
+    @property
+    def latency(self):
+        """Samples by which the stage delays its input (lookahead, partitioning)"""
+        return 0
+
+
+class EQStage(Stage):
+    """Wraps a GraphicEQ"""
+
+    name = 'eq'
+
+    def __init__(self, equalizer, bypass=False):
+        super().__init__(bypass)
+        self.equalizer = equalizer
+
+    def prepare(self, sample_rate, max_block):
+        super().prepare(sample_rate, max_block)
+        self.equalizer.set_sample_rate(sample_rate)
+
+    def process(self, block):
+        self.equalizer.process(block, out=block)
+
+    def reset(self):
+        self.equalizer.reset()
+
+
+class GainStage(Stage):
+    """Static gain in dB"""
+
+    name = 'gain'
+
+    def __init__(self, gain_db=0.0, bypass=False):
+        super().__init__(bypass)
+        self.gain_db = gain_db
+
+    def process(self, block):
+        if self.gain_db != 0:
+            block *= 10 ** (self.gain_db / 20.0)
+
+
+class CompressorStage(Stage):
+    """Wraps a Compressor"""
+
+    name = 'compressor'
+
+    def __init__(self, compressor=None, bypass=False):
+        super().__init__(bypass)
+        self.compressor = compressor if compressor is not None else Compressor()
+
+    def prepare(self, sample_rate, max_block):
+        super().prepare(sample_rate, max_block)
+        self.compressor.prepare(sample_rate, max_block)
+
+    def process(self, block):
+        self.compressor.process(block)
+
+    def reset(self):
+        self.compressor.reset()
+
+    @property
+    def latency(self):
+        return self.compressor.lookahead
+
+
+class LimiterStage(CompressorStage):
+    """Wraps a lookahead Limiter"""
+
+    name = 'limiter'
+
+    def __init__(self, limiter=None, bypass=False):
+        super().__init__(limiter if limiter is not None else Limiter(), bypass)
+
+
+class FIRStage(Stage):
+    """Room-correction FIR through a PartitionedConvolver; passes audio through until an IR is loaded"""
+
+    name = 'fir'
+
+    def __init__(self, convolver=None, bypass=False):
+        super().__init__(bypass)
+        self.convolver = convolver
+        self.impulse_response = None
+        self.max_block = 4096
+
+    def prepare(self, sample_rate, max_block):
+        super().prepare(sample_rate, max_block)
+        self.max_block = max_block
+
+    def load(self, impulse_response):
+        """Install an IR, crossfading if one is already running"""
+        self.impulse_response = impulse_response
+        if self.convolver is None:
+            self.convolver = PartitionedConvolver(impulse_response, max_block=self.max_block)
+        else:
+            self.convolver.set_impulse_response(impulse_response)
+
+    def process(self, block):
+        if self.convolver is not None:
+            block[:] = self.convolver.process(block)
+
+    def reset(self):
+        if self.convolver is not None:
+            self.convolver.reset()
+
+    @property
+    def latency(self):
+        return self.convolver.latency if self.convolver is not None else 0
+
+
+class BassBoostStage(Stage):
+    """Broadband level lift driven by the bass boost setting (simplified)"""
+
+    name = 'bass_boost'
+
+    def __init__(self, boost_db=0.0, bypass=False):
+        super().__init__(bypass)
+        self.boost_db = boost_db
+
+    def process(self, block):
+        if self.boost_db > 0:
+            block *= 1.0 + 0.1 * 10 ** (self.boost_db / 20.0)
+
+
+class DelayStage(Stage):
+    """Whole-chain output delay in ms, rounded to samples, up to max_delay_ms"""
+
+    name = 'delay'
+
+    def __init__(self, delay_ms=0.0, max_delay_ms=500.0, bypass=False):
+        super().__init__(bypass)
+        self.delay_ms = delay_ms
+        self.max_delay_ms = max_delay_ms
+        self._history = 0
+        self._line = np.zeros(0, dtype=np.float32)
+
+    def prepare(self, sample_rate, max_block):
+        super().prepare(sample_rate, max_block)
+        # The last max_delay_ms of input, then room for one block
+        self._history = int(np.ceil(self.max_delay_ms * sample_rate / 1000.0))
+        self._line = np.zeros(self._history + max_block, dtype=np.float32)
+
+    def process(self, block):
+        history, count = self._history, len(block)
+        delay = int(round(min(max(self.delay_ms, 0.0), self.max_delay_ms)
+                          * self.sample_rate / 1000.0))
+        line = self._line
+        line[history:history + count] = block
+        # History is kept up to date at zero delay too, so raising it never
+        # replays stale audio
+        if delay:
+            block[:] = line[history - delay:history - delay + count]
+        line[:history] = line[count:history + count]
+
+    def reset(self):
+        self._line[:] = 0.0
+
+
+class Pipeline:
+    """Runs stages in order over a preallocated work block and feeds sinks"""
+
+    def __init__(self, stages=(), sample_rate=44100, max_block=4096):
+        self.stages = list(stages)
+        self.sinks = []
+        self.sample_rate = sample_rate
+        self.max_block = max_block
+        self._work = np.zeros(max_block, dtype=np.float32)
+        self._output = np.zeros(0, dtype=np.float32)
+        # Optional DSPStats; when set, every stage's time is recorded by name
+        self.stats = None
+        self._prepare()
+
+    def _prepare(self):
+        for stage in self.stages:
+            stage.prepare(self.sample_rate, self.max_block)
+
+    def stage(self, name):
+        """Look up a stage by name"""
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(name)
+
+    def insert(self, index, stage):
+        """Add a stage at a position in the chain"""
+        stage.prepare(self.sample_rate, self.max_block)
+        self.stages.insert(index, stage)
+
+    def append(self, stage):
+        self.insert(len(self.stages), stage)
+
+    def remove(self, name):
+        self.stages.remove(self.stage(name))
+
+    def add_sink(self, sink):
+        """Register a callable (or object with write()) that receives each output block"""
+        self.sinks.append(sink)
+
+    def set_sample_rate(self, sample_rate):
+        if sample_rate != self.sample_rate:
+            self.sample_rate = sample_rate
+            self._prepare()
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    @property
+    def latency(self):
+        """Processing latency of the active stages in samples (the output delay setting excluded)"""
+        return sum(stage.latency for stage in self.stages if not stage.bypass)
+
+    def process(self, audio_data):
+        """Process any length of input in max_block chunks
+
+        Returns all of the output as a reused view, valid until the next
+        call. Input longer than max_block is gathered into an output buffer
+        that only grows when a longer input arrives.
+        """
+        count = len(audio_data)
+        if count > self.max_block and len(self._output) < count:
+            self._output = np.zeros(count, dtype=np.float32)
+        out = self._work[:0]
+        for start in range(0, count, self.max_block):
+            chunk = audio_data[start:start + self.max_block]
+            out = self._work[:len(chunk)]
+            out[:] = chunk
+            stats = self.stats
+            for stage in self.stages:
+                if stage.bypass:
+                    continue
+                if stats is None:
+                    stage.process(out)
+                else:
+                    started = time.perf_counter()
+                    stage.process(out)
+                    stats.record(stage.name, time.perf_counter() - started)
+            for sink in self.sinks:
+                write = getattr(sink, 'write', sink)
+                write(out)
+            if count > self.max_block:
+                self._output[start:start + len(out)] = out
+        return self._output[:count] if count > self.max_block else out
+
+
+class WavFileSink:
+    """Streams float blocks to a 16-bit PCM WAV file"""
+
+    def __init__(self, path, sample_rate=44100, channels=1):
+        self.path = path
+        self._wav = wave.open(path, 'wb')
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(sample_rate)
+        self._pcm = np.zeros(0, dtype=np.int16)
+
+    def write(self, block):
+        if len(self._pcm) < block.size:
+            self._pcm = np.zeros(block.size, dtype=np.int16)
+        pcm = self._pcm[:block.size]
+        np.multiply(np.clip(block, -1.0, 1.0).reshape(-1), 32767, out=pcm, casting='unsafe')
+        self._wav.writeframes(pcm.tobytes())
+
+    def close(self):
+        self._wav.close()
+
+
+class AudioTrackSink:
+    """Plays float blocks through an Android AudioTrack (16-bit, streaming mode)"""
+
+    def __init__(self, sample_rate=44100, max_block=4096):
+        from jnius import autoclass
+        AudioTrack = autoclass('android.media.AudioTrack')
+        AudioFormat = autoclass('android.media.AudioFormat')
+        AudioManager = autoclass('android.media.AudioManager')
+
+        min_size = AudioTrack.getMinBufferSize(
+            sample_rate, AudioFormat.CHANNEL_OUT_MONO, AudioFormat.ENCODING_PCM_16BIT
+        )
+        self.track = AudioTrack(
+            AudioManager.STREAM_MUSIC, sample_rate, AudioFormat.CHANNEL_OUT_MONO,
+            AudioFormat.ENCODING_PCM_16BIT, max(min_size, max_block * 2),
+            AudioTrack.MODE_STREAM
+        )
+        # One bytearray crosses JNI per block as a single byte[] copy
+        self._bytes = bytearray(max_block * 2)
+        self._pcm = np.frombuffer(self._bytes, dtype=np.int16)
+        self._scratch = np.zeros(max_block, dtype=np.float32)
+        self.track.play()
+
+    def write(self, block):
+        count = len(block)
+        pcm = self._pcm[:count]
+        clipped = np.clip(block, -1.0, 1.0, out=self._scratch[:count])
+        np.multiply(clipped, 32767, out=pcm, casting='unsafe')
+        self.track.write(self._bytes, 0, count * 2)
+
+    def close(self):
+        self.track.stop()
+        self.track.release()
@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Preset library for Car DSP
+JSON presets listed in an index file and compiled ahead of time into filter
+sections, levels and delays, so switching is a swap plus a crossfade
+
+Directory layout:
+    index.json            {"presets": {name: {file, tags, mtime, checksum, compiled}}}
+    <slug>.json           source preset: eq, channels, gain, ir, channel_ir, ...
+    <slug>.<rate>.dspc    compiled preset for one sample rate
+
+Compiled file layout (little endian):
+    magic        8 bytes  b'DSPPRE1\\0'
+    version      u16
+    sections     u16
+    sample_rate  u32
+    checksum     20 bytes SHA-1 of the source JSON
+    (padding to HEADER_SIZE, then sections)
+    section:     name 16s, dtype code u8, ndim u8, reserved u16,
+                 shape u32[ndim], data (8-byte aligned)
+"""
+
+import hashlib
+import json
+import os
+import re
+import struct
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from dsp_crossover import CHANNELS, DEFAULT_CHANNEL, CrossoverProgram, compile_channels
+from dsp_eq import ISO_31_BANDS, GraphicEQ, block_tables, sos_to_state_space
+
+INDEX_NAME = 'index.json'
+MAGIC = b'DSPPRE1\0'
+VERSION = 1
+HEADER = struct.Struct('<8sHHI20s')
+HEADER_SIZE = 64
+SECTION = struct.Struct('<16sBBH')
+CACHE_SIZE = 8
+
+# main.py's channel panel: row labels and the volume slider's 0..100 range.
+# Gain is in dB on both sides.
+UI_CHANNELS = dict(zip(('Front Left', 'Front Right', 'Rear Left', 'Rear Right',
+                        'Subwoofer', 'Center'), CHANNELS))
+UI_VOLUME_SCALE = 100.0
+
+_DTYPES = {1: np.dtype('<f8'), 2: np.dtype('<i8'), 3: np.dtype('u1')}
+_CODES = {dtype: code for code, dtype in _DTYPES.items()}
+
+
+def default_preset_dir():
+    """Shared preset directory: the one the frontends already write to on Android"""
+    from kivy.utils import platform
+    if platform == 'android':
+        return '/sdcard/dsp_presets'
+    return os.path.join(os.path.expanduser('~'), 'dsp_presets')
+
+
+def slugify(name):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_') or 'preset'
+
+
+def checksum(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def channel_settings(settings):
+    """Per-channel settings of a preset dict, completed with the crossover defaults"""
+    channels = {}
+    for name in CHANNELS:
+        values = dict(DEFAULT_CHANNEL)
+        values.update(settings.get('channels', {}).get(name, {}))
+        channels[name] = values
+    return channels
+
+
+def channels_from_ui(panel):
+    """Preset 'channels' from main.py's panel values ({label: {param: value}})"""
+    channels = {}
+    for label, values in panel.items():
+        values = dict(values)
+        if 'volume' in values:
+            values['volume'] = values['volume'] / UI_VOLUME_SCALE
+        channels[UI_CHANNELS.get(label, label)] = values
+    return channels
+
+
+def channels_to_ui(channels):
+    """Inverse of channels_from_ui, for loading a preset into main.py's panel"""
+    labels = {name: label for label, name in UI_CHANNELS.items()}
+    panel = {}
+    for name, values in channels.items():
+        values = dict(values)
+        if 'volume' in values:
+            values['volume'] = values['volume'] * UI_VOLUME_SCALE
+        panel[labels.get(name, name)] = values
+    return panel
+
+
+class CompiledPreset:
+    """A preset ready to install: EQ sections, crossover arrays and the source settings
+
+    The state-space systems and block tables are built on first use and
+    kept, so a cached preset switches without any filter design.
+    """
+
+    def __init__(self, name, sample_rate, settings, eq_gains, eq_sos,
+                 crossover_sos, crossover_gains, crossover_delays, checksum=''):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.settings = settings
+        self.checksum = checksum
+        self.eq_gains = eq_gains
+        self.eq_sos = eq_sos
+        self.crossover_sos = crossover_sos
+        self.crossover_gains = crossover_gains
+        self.crossover_delays = crossover_delays
+        self._eq_system = None
+        self._eq_tables = {}
+        self._crossover = None
+
+    @property
+    def channels(self):
+        return channel_settings(self.settings)
+
+    def eq_program(self, block_size=None):
+        """(system, tables) for GraphicEQ.load_compiled"""
+        if self._eq_system is None:
+            self._eq_system = sos_to_state_space(self.eq_sos)
+        if block_size and block_size not in self._eq_tables:
+            self._eq_tables[block_size] = block_tables(self._eq_system, block_size)
+        return self._eq_system, self._eq_tables
+
+    def crossover_program(self):
+        if self._crossover is None:
+            self._crossover = CrossoverProgram(self.crossover_sos, self.crossover_gains,
+                                               self.crossover_delays)
+        return self._crossover
+
+    def sections(self):
+        return {
+            'source': np.frombuffer(json.dumps(self.settings).encode('utf-8'), dtype=np.uint8),
+            'eq_gains': self.eq_gains,
+            'eq_sos': self.eq_sos,
+            'xo_sos': self.crossover_sos,
+            'xo_gains': self.crossover_gains,
+            'xo_delays': self.crossover_delays,
+        }
+
+
+def compile_preset(name, settings, sample_rate, max_delay_ms=20.0, source_checksum=''):
+    """Design every filter of a preset dict for one sample rate"""
+    equalizer = GraphicEQ(ISO_31_BANDS, sample_rate)
+    gains = np.zeros(len(ISO_31_BANDS))
+    eq = list(settings.get('eq', []))[:len(gains)]
+    gains[:len(eq)] = eq
+    gains = np.clip(gains, *equalizer.gain_range)
+
+    sos, levels, delays = compile_channels(channel_settings(settings), CHANNELS,
+                                           sample_rate, max_delay_ms)
+    return CompiledPreset(name, sample_rate, settings, gains, equalizer.compile(gains),
+                          sos, levels, delays, source_checksum)
+
+
+def write_compiled(path, preset):
+    """Write a CompiledPreset in the binary layout above"""
+    sections = preset.sections()
+    parts = [HEADER.pack(MAGIC, VERSION, len(sections), preset.sample_rate,
+                         bytes.fromhex(preset.checksum or '0' * 40)).ljust(HEADER_SIZE, b'\0')]
+    for name, array in sections.items():
+        array = np.ascontiguousarray(array, dtype=_DTYPES[_CODES.get(array.dtype, 1)])
+        header = SECTION.pack(name.encode('ascii'), _CODES[array.dtype], array.ndim, 0)
+        header += struct.pack(f'<{array.ndim}I', *array.shape)
+        parts.append(header.ljust(-(-len(header) // 8) * 8, b'\0'))
+        data = array.tobytes()
+        parts.append(data.ljust(-(-len(data) // 8) * 8, b'\0'))
+
+    # Write then rename, so readers never see half a file
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(b''.join(parts))
+    os.replace(temp, path)
+
+
+def read_compiled(path, name=None):
+    """Load a compiled preset; arrays are views into one read of the file"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, count, sample_rate, digest = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a compiled preset")
+    if version != VERSION:
+        raise ValueError(f"unsupported compiled preset version {version}")
+
+    sections = {}
+    offset = HEADER_SIZE
+    for _ in range(count):
+        raw_name, code, ndim, _ = SECTION.unpack_from(data, offset)
+        shape = struct.unpack_from(f'<{ndim}I', data, offset + SECTION.size)
+        offset += -(-(SECTION.size + 4 * ndim) // 8) * 8
+        dtype = _DTYPES[code]
+        size = int(np.prod(shape)) if ndim else 1
+        sections[raw_name.rstrip(b'\0').decode('ascii')] = np.frombuffer(
+            data, dtype=dtype, count=size, offset=offset).reshape(shape)
+        offset += -(-(size * dtype.itemsize) // 8) * 8
+
+    settings = json.loads(sections['source'].tobytes().decode('utf-8'))
+    return CompiledPreset(name, sample_rate, settings, sections['eq_gains'], sections['eq_sos'],
+                          sections['xo_sos'], sections['xo_gains'], sections['xo_delays'],
+                          digest.hex())
+
+
+class PresetStore:
+    """Indexed preset directory with compiled files and an LRU cache of compiled presets
+
+    names() and info() answer from the index without listing the directory.
+    load() returns a CompiledPreset from the cache, from its compiled file
+    when the checksum still matches the source, or compiles (and saves) it.
+    The index is re-read when another process (e.g. the UI) has rewritten it.
+    """
+
+    def __init__(self, directory=None, sample_rate=44100, cache_size=CACHE_SIZE,
+                 max_delay_ms=20.0):
+        self.directory = directory or default_preset_dir()
+        self.sample_rate = sample_rate
+        self.cache_size = cache_size
+        self.max_delay_ms = max_delay_ms
+        self.index = {}
+        self._index_mtime = None
+        self._cache = OrderedDict()
+        os.makedirs(self.directory, exist_ok=True)
+        self._read_index()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, INDEX_NAME)
+
+    def _read_index(self):
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            if self._index_mtime is None and not self.index:
+                # First use of a directory written by older builds
+                self.rescan()
+            return
+        if mtime == self._index_mtime:
+            return
+        with open(self.index_path, 'r') as f:
+            self.index = json.load(f).get('presets', {})
+        self._index_mtime = mtime
+
+    def _write_index(self):
+        temp = self.index_path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump({'version': VERSION, 'presets': self.index}, f, indent=2, sort_keys=True)
+        os.replace(temp, self.index_path)
+        self._index_mtime = os.stat(self.index_path).st_mtime_ns
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def names(self, tag=None):
+        """Preset names, optionally only those carrying tag"""
+        self._read_index()
+        return sorted(name for name, entry in self.index.items()
+                      if tag is None or tag in entry.get('tags', []))
+
+    def info(self, name):
+        self._read_index()
+        return self.index[name]
+
+    def save(self, name, settings, tags=()):
+        """Store a preset dict under name, compile it and update the index"""
+        self._read_index()
+        entry = self.index.get(name, {})
+        filename = entry.get('file') or slugify(name) + '.json'
+        source = json.dumps(settings, indent=2, sort_keys=True).encode('utf-8')
+        with open(self._path(filename), 'wb') as f:
+            f.write(source)
+        self._remove_compiled(entry)
+        self.index[name] = {
+            'file': filename,
+            'tags': sorted(set(tags) | set(entry.get('tags', []))) if tags else entry.get('tags', []),
+            'mtime': os.stat(self._path(filename)).st_mtime,
+            'checksum': checksum(source),
+            'compiled': {},
+        }
+        self._cache.pop(name, None)
+        self._compile(name, self.index[name], source)
+        self._write_index()
+        return self.index[name]
+
+    def delete(self, name):
+        self._read_index()
+        entry = self.index.pop(name)
+        self._remove_compiled(entry)
+        try:
+            os.remove(self._path(entry['file']))
+        except FileNotFoundError:
+            pass
+        self._cache.pop(name, None)
+        self._write_index()
+
+    def _remove_compiled(self, entry):
+        for filename in entry.get('compiled', {}).values():
+            try:
+                os.remove(self._path(filename))
+            except FileNotFoundError:
+                pass
+
+    def rescan(self):
+        """Index .json files added or edited outside the store (one directory listing)"""
+        known = {entry['file']: name for name, entry in self.index.items()}
+        present = set()
+        for filename in sorted(os.listdir(self.directory)):
+            if not filename.endswith('.json') or filename == INDEX_NAME:
+                continue
+            present.add(filename)
+            mtime = os.stat(self._path(filename)).st_mtime
+            name = known.get(filename, filename[:-5])
+            entry = self.index.get(name)
+            if entry is not None and entry['mtime'] == mtime:
+                continue
+            with open(self._path(filename), 'rb') as f:
+                source = f.read()
+            if entry is not None and entry['checksum'] == checksum(source):
+                entry['mtime'] = mtime
+                continue
+            if entry is not None:
+                self._remove_compiled(entry)
+            self.index[name] = {'file': filename, 'tags': (entry or {}).get('tags', []),
+                                'mtime': mtime, 'checksum': checksum(source), 'compiled': {}}
+            self._cache.pop(name, None)
+        for name in [n for n, e in self.index.items() if e['file'] not in present]:
+            self._remove_compiled(self.index.pop(name))
+            self._cache.pop(name, None)
+        self._write_index()
+
+    def set_sample_rate(self, sample_rate):
+        """Compiled presets are per rate; the cache only holds the current one"""
+        if sample_rate != self.sample_rate:
+            self.sample_rate = sample_rate
+            self._cache.clear()
+
+    def _compile(self, name, entry, source):
+        settings = json.loads(source.decode('utf-8'))
+        preset = compile_preset(name, settings, self.sample_rate, self.max_delay_ms,
+                                entry['checksum'])
+        filename = f"{os.path.splitext(entry['file'])[0]}.{self.sample_rate}.dspc"
+        write_compiled(self._path(filename), preset)
+        entry.setdefault('compiled', {})[str(self.sample_rate)] = filename
+        return preset
+
+    def load(self, name):
+        """CompiledPreset for name at the store's sample rate"""
+        preset = self._cache.get(name)
+        self._read_index()
+        entry = self.index[name]
+        if preset is not None and preset.checksum == entry['checksum']:
+            self._cache.move_to_end(name)
+            return preset
+
+        preset = None
+        filename = entry.get('compiled', {}).get(str(self.sample_rate))
+        if filename and os.path.exists(self._path(filename)):
+            preset = read_compiled(self._path(filename), name)
+            if preset.checksum != entry['checksum'] or preset.sample_rate != self.sample_rate:
+                preset = None
+        if preset is None:
+            with open(self._path(entry['file']), 'rb') as f:
+                source = f.read()
+            if checksum(source) != entry['checksum']:
+                # Edited behind the index's back
+                entry['checksum'] = checksum(source)
+                entry['mtime'] = os.stat(self._path(entry['file'])).st_mtime
+            preset = self._compile(name, entry, source)
+            self._write_index()
+
+        self._cache[name] = preset
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return preset
+
+    def preload(self, names=None):
+        """Warm the cache (compiled files and filter systems) ahead of switching"""
+        started = time.perf_counter()
+        for name in (names or self.names())[:self.cache_size]:
+            self.load(name).eq_program()
+        return time.perf_counter() - started
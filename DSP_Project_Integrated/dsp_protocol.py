@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Binary control protocol for Car DSP
+Length-prefixed frames shared by the Python clients and the Java UDS server
+
+Frame layout (network byte order):
+    magic   2 bytes  b'DS'
+    version u8       PROTOCOL_VERSION
+    opcode  u8       one of the OP_* constants
+    length  u32      payload size in bytes
+    payload length bytes
+"""
+
+import json
+import struct
+
+MAGIC = b'DS'
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct('!2sBBI')
+MAX_PAYLOAD = 64 * 1024
+
+OP_EQ_BAND = 0x01          # !Hf   band, gain dB
+OP_EQ_CURVE = 0x02         # !B + n*f   gains for bands 0..n-1
+OP_GAIN = 0x03             # !f
+OP_DELAY = 0x04            # !f    milliseconds
+OP_INPUT = 0x05            # utf-8 mode name
+OP_SELECT_CHANNEL = 0x06   # utf-8 channel name
+OP_LOAD_PRESET_FILE = 0x07  # utf-8 path
+OP_SPECTRUM_START = 0x08   # utf-8 path
+OP_SPECTRUM_STOP = 0x09    # empty
+OP_BATCH = 0x0A            # concatenated frames
+OP_JSON = 0x7E             # utf-8 JSON object, for commands without an opcode
+OP_ACK = 0x7F              # !B ok flag + optional utf-8 JSON detail
+
+_FLOAT = struct.Struct('!f')
+_EQ_BAND = struct.Struct('!Hf')
+
+# Commands whose payload is a single float 'value'
+_FLOAT_OPS = {'gain': OP_GAIN, 'delay': OP_DELAY}
+# Commands whose payload is a single string field
+_TEXT_OPS = {
+    'input': (OP_INPUT, 'mode'),
+    'select_channel': (OP_SELECT_CHANNEL, 'channel'),
+    'load_preset_file': (OP_LOAD_PRESET_FILE, 'path'),
+    'spectrum_start': (OP_SPECTRUM_START, 'path'),
+}
+
+
+class ProtocolError(ValueError):
+    """Malformed or unsupported frame"""
+
+
+def frame(opcode, payload=b''):
+    """Wrap a payload in a frame header"""
+    if len(payload) > MAX_PAYLOAD:
+        raise ProtocolError(f"payload of {len(payload)} bytes exceeds {MAX_PAYLOAD}")
+    return HEADER.pack(MAGIC, PROTOCOL_VERSION, opcode, len(payload)) + payload
+
+
+def encode(obj):
+    """Encode one command dict as a frame; unknown commands travel as OP_JSON"""
+    cmd = obj.get('cmd')
+    if cmd == 'eq':
+        return frame(OP_EQ_BAND, _EQ_BAND.pack(int(obj['band']), float(obj['value'])))
+    if cmd == 'eq_curve':
+        values = [float(v) for v in obj['values']]
+        return frame(OP_EQ_CURVE, struct.pack(f'!B{len(values)}f', len(values), *values))
+    if cmd in _FLOAT_OPS:
+        return frame(_FLOAT_OPS[cmd], _FLOAT.pack(float(obj['value'])))
+    if cmd in _TEXT_OPS:
+        opcode, field = _TEXT_OPS[cmd]
+        return frame(opcode, str(obj[field]).encode('utf-8'))
+    if cmd == 'spectrum_stop':
+        return frame(OP_SPECTRUM_STOP)
+    if cmd == 'batch':
+        return frame(OP_BATCH, b''.join(encode(c) for c in obj['cmds']))
+    return frame(OP_JSON, json.dumps(obj).encode('utf-8'))
+
+
+def encode_ack(ok=True, detail=None):
+    """Encode an acknowledgement frame"""
+    payload = struct.pack('!B', 1 if ok else 0)
+    if detail is not None:
+        payload += json.dumps(detail).encode('utf-8')
+    return frame(OP_ACK, payload)
+
+
+def decode_payload(opcode, payload):
+    """Turn one frame's payload back into the equivalent command dict"""
+    if opcode == OP_EQ_BAND:
+        band, value = _EQ_BAND.unpack(payload)
+        return {'cmd': 'eq', 'band': band, 'value': value}
+    if opcode == OP_EQ_CURVE:
+        count = payload[0]
+        return {'cmd': 'eq_curve', 'values': list(struct.unpack_from(f'!{count}f', payload, 1))}
+    for cmd, op in _FLOAT_OPS.items():
+        if opcode == op:
+            return {'cmd': cmd, 'value': _FLOAT.unpack(payload)[0]}
+    for cmd, (op, field) in _TEXT_OPS.items():
+        if opcode == op:
+            return {'cmd': cmd, field: payload.decode('utf-8')}
+    if opcode == OP_SPECTRUM_STOP:
+        return {'cmd': 'spectrum_stop'}
+    if opcode == OP_BATCH:
+        reader = FrameReader()
+        return {'cmd': 'batch', 'cmds': [decode_payload(op, p) for op, p in reader.feed(payload)]}
+    if opcode == OP_JSON:
+        return json.loads(payload.decode('utf-8'))
+    if opcode == OP_ACK:
+        detail = json.loads(payload[1:].decode('utf-8')) if len(payload) > 1 else {}
+        return dict(detail, ok=bool(payload[0]))
+    raise ProtocolError(f"unknown opcode 0x{opcode:02x}")
+
+
+def decode(data):
+    """Decode a single complete frame"""
+    frames = FrameReader().feed(data)
+    if len(frames) != 1:
+        raise ProtocolError(f"expected one frame, got {len(frames)}")
+    return decode_payload(*frames[0])
+
+
+def is_binary(data):
+    """True when data starts like a binary frame rather than JSON text"""
+    return data[:len(MAGIC)] == MAGIC
+
+
+class FrameReader:
+    """Reassemble frames from a byte stream that may split or merge them"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.pending = []
+
+    def feed(self, data):
+        """Add bytes; return the list of (opcode, payload) frames now complete"""
+        self._buffer += data
+        frames = []
+        while len(self._buffer) >= HEADER.size:
+            magic, version, opcode, length = HEADER.unpack_from(self._buffer)
+            if magic != MAGIC:
+                raise ProtocolError("bad frame magic")
+            if version != PROTOCOL_VERSION:
+                raise ProtocolError(f"unsupported protocol version {version}")
+            if length > MAX_PAYLOAD:
+                raise ProtocolError(f"frame payload of {length} bytes is too large")
+            end = HEADER.size + length
+            if len(self._buffer) < end:
+                break
+            frames.append((opcode, bytes(self._buffer[HEADER.size:end])))
+            del self._buffer[:end]
+        return frames
+
+
+def read_frame(sock, reader):
+    """Block until one whole frame arrives on a stream socket; None on EOF"""
+    while not reader.pending:
+        data = sock.recv(4096)
+        if not data:
+            return None
+        reader.pending.extend(reader.feed(data))
+    return reader.pending.pop(0)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Long-session capture recording for Car DSP
+Appends raw sample blocks to a memory-mapped file that grows in large
+chunks; readers can map the same file and follow it while it is written
+
+File layout (little endian):
+    magic        8 bytes  b'DSPREC1\\0'
+    version      u16
+    sample type  u8       1 = int16, 2 = float32
+    channels     u8
+    sample_rate  u32
+    start_time   f64      unix time of the first block
+    update_time  f64      unix time of the latest block
+    frames       u64      frames committed so far
+    (padding to HEADER_SIZE, then interleaved samples)
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b'DSPREC1\0'
+VERSION = 1
+HEADER = struct.Struct('<8sHBBIddQ')
+HEADER_SIZE = 64
+GROW_BYTES = 16 * 1024 * 1024
+
+_DTYPES = {1: np.dtype('<i2'), 2: np.dtype('<f4')}
+_CODES = {dtype: code for code, dtype in _DTYPES.items()}
+_FRAMES_OFFSET = HEADER.size - 8
+_UPDATE_OFFSET = _FRAMES_OFFSET - 8
+
+
+class Recorder:
+    """Append-only mmap recorder; write() is the pipeline sink interface
+
+    Samples are copied straight into the mapping and the frame count in the
+    header is bumped afterwards, so readers never see partial blocks. The
+    kernel writes pages back in its own time; nothing here calls fsync on
+    the capture thread.
+    """
+
+    def __init__(self, path, sample_rate=44100, channels=1, dtype=np.int16,
+                 grow_bytes=GROW_BYTES):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.dtype = np.dtype(dtype).newbyteorder('<')
+        if self.dtype not in _CODES:
+            raise ValueError(f"unsupported sample type {self.dtype}")
+        self.grow_bytes = grow_bytes
+        self.frames = 0
+        self.start_time = time.time()
+
+        self._file = open(path, 'w+b')
+        self._map = None
+        self._data = None
+        self._scratch = np.zeros(0, dtype=self.dtype)
+        # Only contended when close() races the last write
+        self._lock = threading.Lock()
+        self._resize(HEADER_SIZE + grow_bytes)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, _CODES[self.dtype], channels,
+                         sample_rate, self.start_time, self.start_time, 0)
+
+    @property
+    def duration(self):
+        return self.frames / float(self.sample_rate)
+
+    def _resize(self, size):
+        self._data = None
+        if self._map is not None:
+            self._map.close()
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._data = np.frombuffer(self._map, dtype=self.dtype, offset=HEADER_SIZE)
+
+    def _convert(self, block):
+        block = np.asarray(block).reshape(-1)
+        if block.dtype == self.dtype:
+            return block
+        if len(self._scratch) < len(block):
+            self._scratch = np.zeros(len(block), dtype=self.dtype)
+        out = self._scratch[:len(block)]
+        if self.dtype.kind == 'i' and block.dtype.kind == 'f':
+            np.multiply(np.clip(block, -1.0, 1.0), 32767, out=out, casting='unsafe')
+        elif self.dtype.kind == 'f' and block.dtype.kind == 'i':
+            np.multiply(block, 1.0 / 32768.0, out=out, casting='unsafe')
+        else:
+            out[:] = block
+        return out
+
+    def write(self, block):
+        """Append one block: (frames,), (frames x channels) or interleaved samples
+
+        Blocks arriving after close() are dropped, so the capture thread can
+        race a stop without failing.
+        """
+        with self._lock:
+            if self._map is None:
+                return
+            samples = self._convert(block)
+            start = self.frames * self.channels
+            end = start + len(samples)
+            if end > len(self._data):
+                # Grow by whole chunks so remapping stays rare
+                needed = HEADER_SIZE + end * self.dtype.itemsize
+                chunks = -(-(needed - len(self._map)) // self.grow_bytes)
+                self._resize(len(self._map) + chunks * self.grow_bytes)
+            self._data[start:end] = samples
+            self.frames = end // self.channels
+            struct.pack_into('<d', self._map, _UPDATE_OFFSET, time.time())
+            struct.pack_into('<Q', self._map, _FRAMES_OFFSET, self.frames)
+
+    def flush(self):
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        """Trim the file to the recorded length and release the mapping"""
+        with self._lock:
+            if self._map is None:
+                return
+            self._data = None
+            self._map.flush()
+            self._map.close()
+            self._map = None
+            self._file.truncate(HEADER_SIZE + self.frames * self.channels * self.dtype.itemsize)
+            self._file.close()
+
+
+class RecordingReader:
+    """Read-only view of a recording, safe to use while it is still being written"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = None
+        self._size = 0
+        self._remap()
+        magic, version, code, channels, rate, start, _, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a DSP recording")
+        if version != VERSION:
+            raise ValueError(f"unsupported recording version {version}")
+        self.dtype = _DTYPES[code]
+        self.channels = channels
+        self.sample_rate = rate
+        self.start_time = start
+
+    def _remap(self):
+        size = os.fstat(self._file.fileno()).st_size
+        if size == self._size:
+            return
+        # Blocks already handed out keep the old mapping alive until released
+        self._map = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        self._size = size
+
+    @property
+    def frames(self):
+        """Frames committed by the writer so far"""
+        return struct.unpack_from('<Q', self._map, _FRAMES_OFFSET)[0]
+
+    @property
+    def update_time(self):
+        return struct.unpack_from('<d', self._map, _UPDATE_OFFSET)[0]
+
+    @property
+    def duration(self):
+        return self.frames / float(self.sample_rate)
+
+    def frame_at(self, seconds):
+        """Frame index for a time offset from the start of the recording"""
+        return min(int(seconds * self.sample_rate), self.frames)
+
+    def read(self, start, count):
+        """Up to count committed frames from start, as a read-only view
+
+        Mono recordings return (frames,), others (frames x channels).
+        """
+        frames = self.frames
+        if HEADER_SIZE + frames * self.channels * self.dtype.itemsize > self._size:
+            self._remap()
+        start = max(0, min(start, frames))
+        count = max(0, min(count, frames - start))
+        data = np.frombuffer(self._map, dtype=self.dtype, offset=HEADER_SIZE,
+                             count=(start + count) * self.channels)[start * self.channels:]
+        return data if self.channels == 1 else data.reshape(-1, self.channels)
+
+    def follow(self, start=0, block_size=4096, poll=0.05, idle_timeout=None):
+        """Yield new blocks as the writer commits them
+
+        Stops once no new frames have arrived for idle_timeout seconds
+        (never, if None).
+        """
+        position = start
+        idle_since = time.time()
+        while True:
+            block = self.read(position, block_size)
+            if len(block):
+                position += len(block)
+                idle_since = time.time()
+                yield block
+                continue
+            if idle_timeout is not None and time.time() - idle_since > idle_timeout:
+                return
+            time.sleep(poll)
+
+    def close(self):
+        self._map = None
+        self._file.close()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Preallocated sample history for Car DSP
+Single-producer / single-consumer ring buffer backed by one NumPy array
+"""
+
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-capacity SPSC ring buffer with contiguous reads of the newest samples
+
+    The producer only advances ``total_written`` after the samples are in
+    place, so a consumer that reads the counter first always sees complete
+    data without taking a lock.
+    """
+
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        self._data = np.zeros(self.capacity, dtype=self.dtype)
+        self._scratch = np.empty(self.capacity, dtype=self.dtype)
+        self._written = 0
+
+    def __len__(self):
+        return min(self._written, self.capacity)
+
+    @property
+    def total_written(self):
+        """Samples written since creation, including overwritten ones"""
+        return self._written
+
+    def write(self, block):
+        """Append a block of samples, overwriting the oldest (producer side)"""
+        block = np.asarray(block, dtype=self.dtype).reshape(-1)
+        count = len(block)
+        if count == 0:
+            return
+        if count > self.capacity:
+            self._written += count - self.capacity
+            block = block[-self.capacity:]
+            count = self.capacity
+
+        start = self._written % self.capacity
+        first = min(count, self.capacity - start)
+        self._data[start:start + first] = block[:first]
+        if first < count:
+            self._data[:count - first] = block[first:]
+        self._written += count
+
+    def append(self, value):
+        """Append a single sample"""
+        self._data[self._written % self.capacity] = value
+        self._written += 1
+
+    def latest(self, count=None, out=None):
+        """Newest ``count`` samples in time order (consumer side)
+
+        Returns a view into the buffer when the window does not wrap and a
+        single copy into ``out`` (or an internal scratch array) when it does.
+        Views are only valid until the producer laps them.
+        """
+        written = self._written
+        available = min(written, self.capacity)
+        count = available if count is None else min(int(count), available)
+        if count == 0:
+            return self._data[:0]
+
+        end = written % self.capacity or self.capacity
+        start = end - count
+        if start >= 0 and out is None:
+            return self._data[start:end]
+
+        target = self._scratch[:count] if out is None else out[:count]
+        if start >= 0:
+            target[:] = self._data[start:end]
+        else:
+            target[:-start] = self._data[start:]
+            target[-start:] = self._data[:end]
+        return target
+
+    def clear(self):
+        """Forget all samples without releasing the storage"""
+        self._written = 0
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Real-time analyzer for Car DSP
+1/3-octave RTA with per-region FFT sizes, averaging, peak hold and decay,
+updated incrementally from the capture thread
+"""
+
+import numpy as np
+
+from dsp_bands import fractional_octave_centres, get_band_map
+from dsp_stft import STFTAnalyzer
+
+# (upper edge Hz, FFT size): long transforms resolve the low bands,
+# short ones keep the highs responsive
+RTA_REGIONS = ((160.0, 8192), (1250.0, 2048), (np.inf, 512))
+FLOOR_DB = -120.0
+
+
+class RealTimeAnalyzer:
+    """Fractional-octave band levels in dBFS (a full-scale sine reads -3 dB)
+
+    averaging: 'exponential' (time constant ``average_time``), 'linear'
+    (mean of the last ``linear_count`` updates) or None.
+    pink: band power, so pink noise reads flat; otherwise power per Hz,
+    so white noise reads flat.
+    """
+
+    def __init__(self, sample_rate=44100, max_block=4096, bands_per_octave=3,
+                 regions=RTA_REGIONS, averaging='exponential', average_time=0.3,
+                 linear_count=8, peak_hold=1.5, peak_decay=12.0, decay=0.0, pink=True):
+        self.max_block = max_block
+        self.bands_per_octave = bands_per_octave
+        self.regions = regions
+        self.averaging = averaging
+        self.average_time = average_time
+        self.linear_count = linear_count
+        self.peak_hold = peak_hold          # seconds a new peak is held
+        self.peak_decay = peak_decay        # dB/s fall once the hold expires
+        self.decay = decay                  # dB/s fall limit for levels, 0 = off
+        self.pink = pink
+
+        self.centres = fractional_octave_centres(bands_per_octave)
+        n = len(self.centres)
+        self.levels_db = np.full(n, FLOOR_DB)
+        self.peaks_db = np.full(n, FLOOR_DB)
+        self.sequence = 0
+        self._power = np.zeros(n)
+        self._average = np.zeros(n)
+        self._history = np.zeros((linear_count, n))
+        self._history_sum = np.zeros(n)
+        self._updates = 0
+        self._peak_age = np.zeros(n)
+
+        self.set_sample_rate(sample_rate)
+
+    def set_sample_rate(self, sample_rate):
+        """(Re)build the per-region analysers and band tables"""
+        self.sample_rate = sample_rate
+        self._regions = []
+        lower = 0.0
+        for upper, fft_size in self.regions:
+            bands = np.flatnonzero((self.centres >= lower) & (self.centres < upper))
+            lower = upper
+            if not len(bands):
+                continue
+            analyzer = STFTAnalyzer(fft_size, fft_size // 4, 'hann', self.max_block)
+            band_map = get_band_map(sample_rate, fft_size, self.bands_per_octave)
+            self._regions.append((analyzer, band_map, bands))
+
+        # Mean |X|^2 in a band -> one-sided PSD (per Hz) -> band power
+        self._psd_scale = {}
+        for analyzer, _, _ in self._regions:
+            self._psd_scale[analyzer.fft_size] = 2.0 / (sample_rate * np.sum(analyzer.window ** 2))
+        bandwidth = self.centres * (2 ** (0.5 / self.bands_per_octave) - 2 ** (-0.5 / self.bands_per_octave))
+        self._weight = bandwidth if self.pink else np.ones(len(self.centres))
+        self._weight = np.where(self.centres < sample_rate / 2, self._weight, 0.0)
+        self.reset()
+
+    def reset(self):
+        self.levels_db[:] = FLOOR_DB
+        self.peaks_db[:] = FLOOR_DB
+        self._power[:] = 0.0
+        self._average[:] = 0.0
+        self._history[:] = 0.0
+        self._history_sum[:] = 0.0
+        self._updates = 0
+        self._peak_age[:] = 0.0
+        for analyzer, _, _ in self._regions:
+            analyzer.reset()
+
+    def process(self, audio_data):
+        """Analyse one capture block and update levels_db / peaks_db in place"""
+        if len(audio_data) == 0:
+            return
+        dt = len(audio_data) / float(self.sample_rate)
+
+        power = self._power
+        for analyzer, band_map, bands in self._regions:
+            magnitude = analyzer.analyze(audio_data)
+            band_power = band_map.apply(magnitude * magnitude)
+            power[bands] = band_power[bands] * self._psd_scale[analyzer.fft_size]
+        power *= self._weight
+
+        # Averaging in the power domain
+        if self.averaging == 'exponential':
+            alpha = np.exp(-dt / self.average_time) if self._updates else 0.0
+            self._average *= alpha
+            self._average += (1.0 - alpha) * power
+        elif self.averaging == 'linear':
+            slot = self._updates % self.linear_count
+            self._history_sum += power - self._history[slot]
+            self._history[slot] = power
+            self._average[:] = self._history_sum / min(self._updates + 1, self.linear_count)
+        else:
+            self._average[:] = power
+        self._updates += 1
+
+        level = 10 * np.log10(np.maximum(self._average, 1e-30))
+        np.maximum(level, FLOOR_DB, out=level)
+        if self.decay > 0:
+            np.maximum(level, self.levels_db - self.decay * dt, out=level)
+        self.levels_db[:] = level
+
+        # Peak hold: new maxima reset the hold timer, then fall at peak_decay
+        self._peak_age += dt
+        falling = np.maximum(self._peak_age - self.peak_hold, 0.0)
+        held = self.peaks_db - self.peak_decay * np.minimum(falling, dt)
+        fresh = level >= held
+        self.peaks_db[:] = np.where(fresh, level, held)
+        self._peak_age[fresh] = 0.0
+        self.sequence += 1
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Analysis snapshots for Car DSP
+Triple-buffered hand-off of meter and band levels from the capture thread
+to the UI thread
+"""
+
+import threading
+import time
+
+import numpy as np
+
+
+class AnalysisSnapshot:
+    """One published set of display values; arrays are reused between publishes"""
+
+    __slots__ = ('sequence', 'timestamp', 'rms', 'peak', 'rms_db', 'peak_db', 'bands', 'peaks')
+
+    def __init__(self, n_bands=31):
+        self.sequence = 0
+        self.timestamp = 0.0
+        self.rms = 0.0
+        self.peak = 0.0
+        self.rms_db = -120.0
+        self.peak_db = -120.0
+        self.bands = np.zeros(n_bands)
+        self.peaks = np.zeros(n_bands)
+
+
+class SnapshotBuffer:
+    """Triple buffer: the writer fills a back slot while the reader holds another
+
+    The writer calls begin() to get the slot it may fill and publish() to make
+    it current. latest() hands the reader the newest published slot, which
+    stays untouched until the reader's next latest() call. The lock only
+    guards the index swap, never the copying.
+    """
+
+    def __init__(self, n_bands=31):
+        self._slots = [AnalysisSnapshot(n_bands) for _ in range(3)]
+        self._write = 0
+        self._ready = 1
+        self._read = 2
+        self._fresh = False
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """Slot for the writer to fill (capture thread)"""
+        return self._slots[self._write]
+
+    def publish(self):
+        """Make the filled slot the newest snapshot (capture thread)"""
+        snapshot = self._slots[self._write]
+        self._sequence += 1
+        snapshot.sequence = self._sequence
+        snapshot.timestamp = time.time()
+        with self._lock:
+            self._write, self._ready = self._ready, self._write
+            self._fresh = True
+
+    def latest(self):
+        """Newest published snapshot (UI thread); compare .sequence to skip repeats"""
+        with self._lock:
+            if self._fresh:
+                self._read, self._ready = self._ready, self._read
+                self._fresh = False
+        return self._slots[self._read]
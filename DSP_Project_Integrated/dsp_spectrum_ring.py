@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Shared spectrum ring for Car DSP
+Fixed-size memory-mapped ring of float32 spectrum frames with sequence
+numbers; native_dsp.cpp writes the same layout
+
+File layout (little endian):
+    magic     8 bytes  b'DSPSPEC1'
+    version   u32
+    bins      u32      floats per frame
+    capacity  u32      frame slots in the ring
+    slot_size u32      bytes per slot (8-byte aligned)
+    rate      f64      nominal frames per second
+    sequence  u64      newest committed frame, 0 = none yet
+    (padding to HEADER_SIZE)
+    slots[capacity]:
+        sequence  u64  frame number held by the slot
+        time      f64  unix time of the frame
+        data      f32[bins]
+
+A writer zeroes the sequence of slot (sequence % capacity), fills it, stores
+the slot's new sequence and then the header sequence. Readers copy a slot
+and keep it only if its sequence still matches afterwards.
+"""
+
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b'DSPSPEC1'
+VERSION = 1
+HEADER = struct.Struct('<8sIIIIdQ')
+HEADER_SIZE = 64
+SEQUENCE_OFFSET = HEADER.size - 8
+DEFAULT_CAPACITY = 64
+
+
+def slot_size(bins):
+    return (16 + 4 * bins + 7) // 8 * 8
+
+
+def slot_dtype(bins):
+    return np.dtype({'names': ['sequence', 'time', 'data'],
+                     'formats': ['<u8', '<f8', ('<f4', (bins,))],
+                     'offsets': [0, 8, 16],
+                     'itemsize': slot_size(bins)})
+
+
+class SpectrumRingWriter:
+    """Publishes spectrum frames into a ring file (Python side of the native writer)"""
+
+    def __init__(self, path, bins, capacity=DEFAULT_CAPACITY, rate=30.0):
+        self.path = path
+        self.bins = bins
+        self.capacity = capacity
+        self.sequence = 0
+        size = HEADER_SIZE + capacity * slot_size(bins)
+
+        # Reuse the file in place so readers that already mapped it see the reset
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self._map[:size] = bytes(size)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, bins, capacity, slot_size(bins), rate, 0)
+        self._slots = np.frombuffer(self._map, dtype=slot_dtype(bins), count=capacity,
+                                    offset=HEADER_SIZE)
+
+    def write(self, frame, timestamp=None):
+        """Append one frame (truncated or zero-padded to bins)"""
+        slots = self._slots
+        if slots is None:
+            return
+        sequence = self.sequence + 1
+        slot = slots[sequence % self.capacity]
+        slot['sequence'] = 0
+        count = min(len(frame), self.bins)
+        slot['data'][:count] = frame[:count]
+        slot['data'][count:] = 0.0
+        slot['time'] = time.time() if timestamp is None else timestamp
+        slot['sequence'] = sequence
+        struct.pack_into('<Q', self._map, SEQUENCE_OFFSET, sequence)
+        self.sequence = sequence
+
+    def close(self):
+        # Dropping the references unmaps once an in-flight write() finishes
+        self._slots = None
+        self._map = None
+
+
+class SpectrumRingReader:
+    """Tails a spectrum ring through np.memmap without copying more than new frames"""
+
+    def __init__(self, path):
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, version, bins, capacity, size, rate, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a spectrum ring")
+        if version != VERSION:
+            raise ValueError(f"unsupported spectrum ring version {version}")
+        if size != slot_size(bins):
+            raise ValueError(f"unexpected slot size {size} for {bins} bins")
+        self.bins = bins
+        self.capacity = capacity
+        self.rate = rate
+        self._header_sequence = self._map[SEQUENCE_OFFSET:SEQUENCE_OFFSET + 8].view('<u8')
+        self._slots = self._map[HEADER_SIZE:HEADER_SIZE + capacity * size].view(slot_dtype(bins))
+        self.last_sequence = 0
+        self.dropped = 0
+
+    @property
+    def sequence(self):
+        """Newest committed frame number"""
+        return int(self._header_sequence[0])
+
+    def read_new(self, limit=None):
+        """Frames committed since the last call: (sequences, times, frames x bins)
+
+        Frames skipped because they were overwritten (or beyond ``limit``)
+        count towards ``dropped``.
+        """
+        newest = self.sequence
+        if newest < self.last_sequence:
+            # Writer restarted
+            self.last_sequence = 0
+        first = max(self.last_sequence + 1, newest - self.capacity + 1, 1)
+        if limit is not None:
+            first = max(first, newest - limit + 1)
+        self.dropped += max(0, first - self.last_sequence - 1) if self.last_sequence else 0
+
+        sequences = np.arange(first, newest + 1, dtype=np.uint64)
+        copied = self._slots[sequences % self.capacity].copy()
+        # Keep only slots that were not rewritten while copying
+        valid = (copied['sequence'] == sequences) & \
+                (self._slots['sequence'][sequences % self.capacity] == sequences)
+        if len(sequences):
+            self.last_sequence = newest
+        copied = copied[valid]
+        return copied['sequence'], copied['time'], copied['data']
+
+    def latest(self):
+        """Newest frame as (sequence, frame copy) without consuming; (0, None) before the first"""
+        newest = self.sequence
+        if newest == 0:
+            return 0, None
+        slot = self._slots[newest % self.capacity].copy()
+        if slot['sequence'] != newest:
+            return 0, None
+        return newest, slot['data']
+
+    def close(self):
+        self._slots = None
+        self._header_sequence = None
+        self._map = None
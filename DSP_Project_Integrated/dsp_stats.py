@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Hot-path statistics for Car DSP
+Always-on counters and latency histograms kept in preallocated arrays, with
+an optional rolling binary log for finding glitches in the field
+
+Rolling log layout (little endian):
+    magic       8 bytes  b'DSPSTAT1'
+    version     u32
+    record_size u32
+    capacity    u32      records in the ring
+    interval    f32      seconds between records
+    sequence    u64      records written so far, newest at (sequence - 1) % capacity
+    (padding to HEADER_SIZE, then capacity records of LOG_RECORD)
+"""
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+# Power-of-two microsecond buckets: bucket b holds [2^(b-1), 2^b) us, bucket 0
+# holds < 1 us and the last one everything from ~4 s up
+BUCKETS = 24
+# Lower edge of each bucket
+BUCKET_EDGES_US = np.array([0] + [1 << b for b in range(BUCKETS - 1)], dtype=np.float64)
+MAX_SERIES = 32
+COUNTERS = ('blocks', 'overruns', 'underruns', 'dropped', 'errors')
+
+MAGIC = b'DSPSTAT1'
+VERSION = 1
+HEADER = struct.Struct('<8sIIIfQ')
+HEADER_SIZE = 64
+SEQUENCE_OFFSET = HEADER.size - 8
+LOG_RECORD = np.dtype([
+    ('time', '<f8'),
+    ('blocks', '<u8'),
+    ('overruns', '<u4'),
+    ('underruns', '<u4'),
+    ('dropped', '<u4'),
+    ('errors', '<u4'),
+    ('queue_depth', '<u4'),
+    ('queue_max', '<u4'),
+    ('block_p99_us', '<f4'),
+    ('block_max_us', '<f4'),
+    ('interarrival_max_us', '<f4'),
+    ('jitter_max_us', '<f4'),
+    ('cpu_percent', '<f4'),
+    ('reserved', '<u4'),
+])
+
+
+def histogram_percentile(counts, fraction):
+    """Upper bucket edge (us) below which ``fraction`` of the samples fall"""
+    total = counts.sum()
+    if total == 0:
+        return 0.0
+    bucket = int(np.searchsorted(np.cumsum(counts), fraction * total))
+    return float(1 << min(bucket, BUCKETS - 1))
+
+
+class DSPStats:
+    """Counters, gauges and per-series latency histograms
+
+    record() and count() only index into arrays allocated here, so they are
+    safe to call per block from the audio thread. Series (stage names,
+    'block', 'interarrival', ...) get a row on first use, up to MAX_SERIES.
+    Readers take snapshot() from any thread; values may be a block apart
+    from each other but are never torn.
+    """
+
+    def __init__(self, max_series=MAX_SERIES):
+        self.max_series = max_series
+        self.rows = {}
+        self.histograms = np.zeros((max_series, BUCKETS), dtype=np.int64)
+        self.totals = np.zeros(max_series)          # seconds
+        self.maxima = np.zeros(max_series)          # seconds, since start
+        self.interval_maxima = np.zeros(max_series) # seconds, since take_interval()
+        self.counters = np.zeros(len(COUNTERS), dtype=np.int64)
+        self._counter_index = {name: i for i, name in enumerate(COUNTERS)}
+        self.queue_depth = 0
+        self.queue_max = 0
+        self.thread_cpu = {}
+        self.expected_interval = 0.0
+        self._last_arrival = None
+        self.start_time = time.time()
+
+    def _row(self, name):
+        row = self.rows.get(name)
+        if row is None:
+            if len(self.rows) >= self.max_series:
+                return None
+            row = self.rows.setdefault(name, len(self.rows))
+        return row
+
+    def record(self, name, seconds):
+        """Add one duration sample to a series"""
+        row = self._row(name)
+        if row is None:
+            return
+        bucket = min(int(seconds * 1e6).bit_length(), BUCKETS - 1)
+        self.histograms[row, bucket] += 1
+        self.totals[row] += seconds
+        if seconds > self.maxima[row]:
+            self.maxima[row] = seconds
+        if seconds > self.interval_maxima[row]:
+            self.interval_maxima[row] = seconds
+
+    def count(self, name, amount=1):
+        self.counters[self._counter_index[name]] += amount
+
+    def counter(self, name):
+        return int(self.counters[self._counter_index[name]])
+
+    def arrival(self, frames, sample_rate, now=None):
+        """Note a block arriving from the audio callback
+
+        Records inter-arrival time and its deviation from the block duration
+        (jitter); a gap of more than twice the block duration counts as an
+        underrun, since the input starved for at least one block.
+        """
+        now = time.perf_counter() if now is None else now
+        expected = frames / float(sample_rate)
+        self.expected_interval = expected
+        last, self._last_arrival = self._last_arrival, now
+        if last is None:
+            return
+        interval = now - last
+        self.record('interarrival', interval)
+        self.record('jitter', abs(interval - expected))
+        if interval > 2 * expected:
+            self.count('underruns')
+
+    def block_done(self, seconds, frames, sample_rate):
+        """Note one processed block; slower than real time counts as an overrun"""
+        self.record('block', seconds)
+        self.count('blocks')
+        if seconds > frames / float(sample_rate):
+            self.count('overruns')
+
+    def set_queue_depth(self, depth):
+        self.queue_depth = depth
+        if depth > self.queue_max:
+            self.queue_max = depth
+
+    def mark_thread(self, name):
+        """Sample CPU time of the calling thread under name"""
+        self.thread_cpu[name] = time.thread_time()
+
+    def reset(self):
+        self.histograms[:] = 0
+        self.totals[:] = 0.0
+        self.maxima[:] = 0.0
+        self.interval_maxima[:] = 0.0
+        self.counters[:] = 0
+        self.queue_max = self.queue_depth
+        self._last_arrival = None
+        self.start_time = time.time()
+
+    def series(self, name):
+        """Summary of one series in milliseconds"""
+        row = self.rows.get(name)
+        if row is None:
+            return None
+        counts = self.histograms[row]
+        n = int(counts.sum())
+        return {
+            'count': n,
+            'mean_ms': float(1000.0 * self.totals[row] / n) if n else 0.0,
+            'p50_ms': histogram_percentile(counts, 0.5) / 1000.0,
+            'p99_ms': histogram_percentile(counts, 0.99) / 1000.0,
+            'max_ms': float(1000.0 * self.maxima[row]),
+            'histogram': counts.tolist(),
+        }
+
+    def snapshot(self):
+        """Everything, as plain JSON-serialisable values"""
+        stats = {name: self.counter(name) for name in COUNTERS}
+        stats.update({
+            'uptime': time.time() - self.start_time,
+            'queue_depth': self.queue_depth,
+            'queue_max': self.queue_max,
+            'thread_cpu': dict(self.thread_cpu),
+            'process_cpu': time.process_time(),
+            'bucket_edges_us': BUCKET_EDGES_US.tolist(),
+            'series': {name: self.series(name) for name in list(self.rows)},
+        })
+        return stats
+
+    def take_interval(self):
+        """Per-series maxima since the previous call, then start a new interval"""
+        maxima = self.interval_maxima.copy()
+        self.interval_maxima[:] = 0.0
+        return maxima
+
+
+class StatsLog:
+    """Rolling binary log of DSPStats, one record per interval in a fixed-size ring file
+
+    A background thread appends a record every ``interval`` seconds; once
+    ``capacity`` records are written the oldest are overwritten, so the
+    file never grows. read_stats_log() returns the records oldest first.
+    """
+
+    def __init__(self, path, stats, interval=1.0, capacity=3600):
+        self.path = path
+        self.stats = stats
+        self.interval = interval
+        self.capacity = capacity
+        self.sequence = 0
+        size = HEADER_SIZE + capacity * LOG_RECORD.itemsize
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, LOG_RECORD.itemsize, capacity, interval, 0)
+        self._records = np.frombuffer(self._map, dtype=LOG_RECORD, count=capacity,
+                                      offset=HEADER_SIZE)
+        self._previous_block = np.zeros(BUCKETS, dtype=np.int64)
+        self._previous_cpu = time.process_time()
+        self._previous_time = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='dsp-stats-log', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.append()
+
+    def append(self):
+        """Write one record covering the time since the previous one"""
+        records = self._records
+        if records is None:
+            return
+        stats = self.stats
+        maxima = stats.take_interval()
+        rows = stats.rows
+
+        # Block percentile over this interval only
+        block_row = rows.get('block')
+        if block_row is not None:
+            counts = stats.histograms[block_row].copy()
+            p99 = histogram_percentile(counts - self._previous_block, 0.99)
+            self._previous_block = counts
+        else:
+            p99 = 0.0
+
+        now = time.perf_counter()
+        cpu = time.process_time()
+        elapsed = now - self._previous_time
+        cpu_percent = 100.0 * (cpu - self._previous_cpu) / elapsed if elapsed > 0 else 0.0
+        self._previous_time, self._previous_cpu = now, cpu
+
+        record = records[self.sequence % self.capacity]
+        record['time'] = time.time()
+        for name in COUNTERS:
+            record[name] = stats.counter(name)
+        record['queue_depth'] = stats.queue_depth
+        record['queue_max'] = stats.queue_max
+        record['block_p99_us'] = p99
+        record['block_max_us'] = 1e6 * maxima[block_row] if block_row is not None else 0.0
+        for field, name in (('interarrival_max_us', 'interarrival'), ('jitter_max_us', 'jitter')):
+            row = rows.get(name)
+            record[field] = 1e6 * maxima[row] if row is not None else 0.0
+        record['cpu_percent'] = cpu_percent
+        self.sequence += 1
+        struct.pack_into('<Q', self._map, SEQUENCE_OFFSET, self.sequence)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._records is not None:
+            self._map.flush()
+        # Dropping the references unmaps once nothing else holds a record view
+        self._records = None
+        self._map = None
+
+
+def read_stats_log(path):
+    """Records of a rolling stats log, oldest first, as a structured array"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, record_size, capacity, interval, sequence = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a stats log")
+    if version != VERSION or record_size != LOG_RECORD.itemsize:
+        raise ValueError(f"unsupported stats log version {version}")
+    records = np.frombuffer(data, dtype=LOG_RECORD, count=capacity, offset=HEADER_SIZE)
+    if sequence <= capacity:
+        return records[:sequence].copy()
+    start = sequence % capacity
+    return np.concatenate([records[start:], records[:start]])
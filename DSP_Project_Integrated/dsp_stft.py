@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Streaming short-time Fourier transforms for Car DSP
+Cached windows, hop-based framing over every sample, and OLA / OLS
+reconstruction for FFT-domain effects with bounded latency
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+@lru_cache(maxsize=32)
+def get_window(name, size):
+    """Periodic analysis window, built once per (name, size) and read-only"""
+    n = np.arange(size)
+    if name == 'hann':
+        window = 0.5 - 0.5 * np.cos(2 * np.pi * n / size)
+    elif name == 'sqrt_hann':
+        window = np.sqrt(0.5 - 0.5 * np.cos(2 * np.pi * n / size))
+    elif name == 'hamming':
+        window = 0.54 - 0.46 * np.cos(2 * np.pi * n / size)
+    elif name == 'blackman':
+        window = (0.42 - 0.5 * np.cos(2 * np.pi * n / size)
+                  + 0.08 * np.cos(4 * np.pi * n / size))
+    elif name == 'rect':
+        window = np.ones(size)
+    else:
+        raise ValueError(f"unknown window '{name}'")
+    window.setflags(write=False)
+    return window
+
+
+class STFTAnalyzer:
+    """Hop-by-hop magnitude analysis covering every input sample
+
+    Samples that do not yet fill a frame are carried over to the next call,
+    so consecutive blocks are analysed as one continuous stream.
+    """
+
+    def __init__(self, fft_size=512, hop=None, window='hann', max_block=4096):
+        self.fft_size = fft_size
+        self.hop = hop or fft_size // 2
+        self.window = get_window(window, fft_size)
+        self.max_block = max_block
+        self.bins = fft_size // 2 + 1
+        self.spectrum = np.zeros(self.bins)
+        self._input = np.zeros(fft_size + max_block)
+        self._pad = 0
+        self._fill = 0
+
+    def reset(self):
+        self._input[:] = 0.0
+        self._fill = self._pad
+
+    def _frames(self, block):
+        """Append block; return a (frames x fft_size) view of every complete frame"""
+        count = len(block)
+        if count > self.max_block:
+            raise ValueError(f"block of {count} samples exceeds max_block {self.max_block}")
+        self._input[self._fill:self._fill + count] = block
+        self._fill += count
+        if self._fill < self.fft_size:
+            return self._input[:0].reshape(0, self.fft_size)
+        frames = (self._fill - self.fft_size) // self.hop + 1
+        return sliding_window_view(self._input[:self._fill], self.fft_size)[::self.hop][:frames]
+
+    def _consume(self, frames):
+        used = frames * self.hop
+        remaining = self._fill - used
+        self._input[:remaining] = self._input[used:self._fill]
+        self._fill = remaining
+
+    def analyze(self, audio_data, on_frames=None):
+        """Feed any length of audio; returns the RMS-averaged magnitude of the new frames
+
+        ``spectrum`` keeps its previous value when no frame completed.
+        ``on_frames``, if given, is called with the (frames x bins) magnitudes
+        as they complete, one row per hop.
+        """
+        power = np.zeros(self.bins)
+        frames = 0
+        for start in range(0, len(audio_data), self.max_block):
+            view = self._frames(audio_data[start:start + self.max_block])
+            if len(view):
+                magnitude = np.abs(np.fft.rfft(view * self.window, axis=1))
+                power += np.einsum('ij,ij->j', magnitude, magnitude)
+                frames += len(view)
+                if on_frames is not None:
+                    on_frames(magnitude)
+            self._consume(len(view))
+        if frames:
+            self.spectrum = np.sqrt(power / frames)
+        return self.spectrum
+
+
+class _StreamingProcessor(STFTAnalyzer):
+    """Frame-based processor with a fixed latency and same-length output blocks"""
+
+    def __init__(self, fft_size, hop, window, max_block):
+        super().__init__(fft_size, hop, window, max_block)
+        self.output = np.zeros(max_block, dtype=np.float32)
+        self._fifo = np.zeros(max_block + 2 * self.hop)
+        # History (or leading silence) in front of the first frame
+        self._pad = fft_size - self.hop
+        self._fifo_fill = 0
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self._fifo[:] = 0.0
+        # One hop of silence covers a block that ends mid-hop
+        self._fifo_fill = self.hop
+
+    def _render(self, frames, dest):
+        """Write frames x hop finished output samples into dest"""
+        raise NotImplementedError
+
+    def process(self, block):
+        """Process one block; returns a float32 view of the same length"""
+        frames = self._frames(block)
+        done = len(frames) * self.hop
+        if done:
+            self._render(frames, self._fifo[self._fifo_fill:self._fifo_fill + done])
+            self._fifo_fill += done
+        self._consume(len(frames))
+
+        count = len(block)
+        out = self.output[:count]
+        out[:] = self._fifo[:count]
+        self._fifo[:self._fifo_fill - count] = self._fifo[count:self._fifo_fill]
+        self._fifo_fill -= count
+        return out
+
+
+class STFTProcessor(_StreamingProcessor):
+    """Weighted overlap-add STFT with an optional spectral effect
+
+    ``effect(spectra)`` receives the (frames x bins) complex spectra and may
+    modify them in place or return replacements. Output lags input by
+    ``latency`` samples.
+    """
+
+    def __init__(self, fft_size=512, hop=None, window='sqrt_hann', max_block=4096,
+                 effect=None):
+        hop = hop or fft_size // 2
+        if fft_size % hop:
+            raise ValueError("hop must divide fft_size for overlap-add")
+        super().__init__(fft_size, hop, window, max_block)
+        self.effect = effect
+        self.latency = fft_size
+        # Synthesis uses the same window; scale so overlapping frames sum to 1
+        self._synthesis = self.window * (self.hop / np.sum(self.window * self.window))
+        self._accumulator = np.zeros(fft_size + max_block)
+
+    def reset(self):
+        super().reset()
+        if hasattr(self, '_accumulator'):
+            self._accumulator[:] = 0.0
+
+    def _render(self, frames, dest):
+        spectra = np.fft.rfft(frames * self.window, axis=1)
+        if self.effect is not None:
+            result = self.effect(spectra)
+            if result is not None:
+                spectra = result
+        segments = np.fft.irfft(spectra, self.fft_size, axis=1)
+        segments *= self._synthesis
+
+        count, hop = len(frames), self.hop
+        tail = self.fft_size - hop
+        done = count * hop
+        acc = self._accumulator
+        acc[tail:tail + done] = 0.0
+        for r in range(self.fft_size // hop):
+            view = acc[r * hop:r * hop + done].reshape(count, hop)
+            view += segments[:, r * hop:(r + 1) * hop]
+        dest[:] = acc[:done]
+        acc[:tail] = acc[done:done + tail]
+
+
+class OverlapSaveFilter(_StreamingProcessor):
+    """FIR filtering by overlap-save; latency is one hop"""
+
+    def __init__(self, taps, fft_size=None, max_block=4096):
+        taps = np.asarray(taps, dtype=np.float64)
+        if fft_size is None:
+            fft_size = 1 << (2 * len(taps) - 1).bit_length()
+        if fft_size < len(taps):
+            raise ValueError("fft_size must be at least the filter length")
+        super().__init__(fft_size, fft_size - len(taps) + 1, 'rect', max_block)
+        self.taps = taps
+        self.latency = self.hop
+        self.response = np.fft.rfft(taps, fft_size)
+
+    def _render(self, frames, dest):
+        spectra = np.fft.rfft(frames, axis=1)
+        spectra *= self.response
+        valid = np.fft.irfft(spectra, self.fft_size, axis=1)[:, self.fft_size - self.hop:]
+        dest.reshape(len(frames), self.hop)[:] = valid
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Display widgets for Car DSP
+Canvas-drawn spectrum and level meters that redraw all bars from one NumPy
+array in a single instruction group, and only when the values have moved
+
+NumPy is imported by SpectrumWidget on use, so LevelMeter can be on the
+first frame without loading it.
+"""
+
+from kivy.graphics import Color, Mesh, Rectangle
+from kivy.properties import ListProperty, NumericProperty
+from kivy.uix.widget import Widget
+
+
+def _quad_indices(count):
+    """Two triangles per quad for a Mesh in 'triangles' mode"""
+    import numpy as np
+    base = np.arange(count) * 4
+    return np.column_stack([base, base + 1, base + 2, base + 2, base + 3, base]).ravel().tolist()
+
+
+class SpectrumWidget(Widget):
+    """Band levels as vertical bars plus peak-hold ticks
+
+    set_levels() takes display values (0..max_value); the meshes are only
+    rebuilt when some band moved by more than ``threshold`` or the widget was
+    resized, so an idle or steady spectrum costs no canvas work.
+    """
+
+    max_value = NumericProperty(60.0)
+    threshold = NumericProperty(0.5)
+    gap = NumericProperty(0.2)                  # fraction of each band slot left empty
+    bar_color = ListProperty([0.2, 0.7, 1.0, 1.0])
+    peak_color = ListProperty([1.0, 0.6, 0.1, 1.0])
+    background_color = ListProperty([0.08, 0.08, 0.08, 1.0])
+
+    def __init__(self, n_bands=31, **kwargs):
+        import numpy as np
+        super().__init__(**kwargs)
+        self.n_bands = n_bands
+        self._levels = np.zeros(n_bands)
+        self._peaks = np.zeros(n_bands)
+        self._drawn_levels = np.full(n_bands, -np.inf)
+        self._drawn_peaks = np.full(n_bands, -np.inf)
+        self._scratch = np.zeros(n_bands)
+        # x, y, u, v per vertex, four vertices per band
+        self._bar_vertices = np.zeros((n_bands, 4, 4))
+        self._peak_vertices = np.zeros((n_bands, 4, 4))
+        indices = _quad_indices(n_bands)
+
+        with self.canvas:
+            self._background_color = Color(*self.background_color)
+            self._background = Rectangle(pos=self.pos, size=self.size)
+            self._bar_color = Color(*self.bar_color)
+            self._bar_mesh = Mesh(vertices=self._bar_vertices.ravel().tolist(),
+                                  indices=indices, mode='triangles')
+            self._peak_color = Color(*self.peak_color)
+            self._peak_mesh = Mesh(vertices=self._peak_vertices.ravel().tolist(),
+                                   indices=indices, mode='triangles')
+
+        self.bind(pos=self._geometry_changed, size=self._geometry_changed)
+        self.bind(bar_color=self._colors_changed, peak_color=self._colors_changed,
+                  background_color=self._colors_changed)
+
+    def _geometry_changed(self, *args):
+        self._background.pos = self.pos
+        self._background.size = self.size
+        self._redraw()
+
+    def _colors_changed(self, *args):
+        self._background_color.rgba = self.background_color
+        self._bar_color.rgba = self.bar_color
+        self._peak_color.rgba = self.peak_color
+
+    def set_levels(self, levels, peaks=None, offset=0.0):
+        """Update from band arrays; returns True when the canvas was redrawn"""
+        import numpy as np
+        count = min(len(levels), self.n_bands)
+        np.add(levels[:count], offset, out=self._levels[:count])
+        np.clip(self._levels, 0.0, self.max_value, out=self._levels)
+        if peaks is not None:
+            np.add(peaks[:count], offset, out=self._peaks[:count])
+            np.clip(self._peaks, 0.0, self.max_value, out=self._peaks)
+
+        scratch = self._scratch
+        np.subtract(self._levels, self._drawn_levels, out=scratch)
+        moved = np.max(np.abs(scratch)) > self.threshold
+        if peaks is not None and not moved:
+            np.subtract(self._peaks, self._drawn_peaks, out=scratch)
+            moved = np.max(np.abs(scratch)) > self.threshold
+        if not moved:
+            return False
+        self._redraw()
+        return True
+
+    def _redraw(self):
+        import numpy as np
+        x, y = self.pos
+        width, height = self.size
+        slot = width / float(self.n_bands)
+        left = x + np.arange(self.n_bands) * slot + slot * self.gap / 2
+        right = left + slot * (1.0 - self.gap)
+        scale = height / float(self.max_value)
+
+        top = y + self._levels * scale
+        vertices = self._bar_vertices
+        vertices[:, :, 1] = y
+        vertices[:, 0, 0] = left
+        vertices[:, 1, 0] = right
+        vertices[:, 2, 0] = right
+        vertices[:, 2, 1] = top
+        vertices[:, 3, 0] = left
+        vertices[:, 3, 1] = top
+        self._bar_mesh.vertices = vertices.ravel().tolist()
+
+        # Peak ticks: thin quads sitting on the held level
+        tick = max(2.0, height * 0.01)
+        bottom = y + self._peaks * scale
+        vertices = self._peak_vertices
+        vertices[:, 0, 0] = left
+        vertices[:, 0, 1] = bottom
+        vertices[:, 1, 0] = right
+        vertices[:, 1, 1] = bottom
+        vertices[:, 2, 0] = right
+        vertices[:, 2, 1] = bottom + tick
+        vertices[:, 3, 0] = left
+        vertices[:, 3, 1] = bottom + tick
+        self._peak_mesh.vertices = vertices.ravel().tolist()
+
+        self._drawn_levels[:] = self._levels
+        self._drawn_peaks[:] = self._peaks
+
+
+class LevelMeter(Widget):
+    """Horizontal bar meter drawn with one Rectangle
+
+    set_level() takes a 0..1 fraction and only touches the canvas when it
+    moved by more than ``threshold``.
+    """
+
+    threshold = NumericProperty(0.005)
+    bar_color = ListProperty([0.2, 0.8, 0.3, 1.0])
+    background_color = ListProperty([0.08, 0.08, 0.08, 1.0])
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.level = 0.0
+        self._drawn = -1.0
+        with self.canvas:
+            self._background_color = Color(*self.background_color)
+            self._background = Rectangle(pos=self.pos, size=self.size)
+            self._bar_color = Color(*self.bar_color)
+            self._bar = Rectangle(pos=self.pos, size=(0, self.height))
+        self.bind(pos=self._geometry_changed, size=self._geometry_changed)
+        self.bind(bar_color=self._colors_changed, background_color=self._colors_changed)
+
+    def _geometry_changed(self, *args):
+        self._background.pos = self.pos
+        self._background.size = self.size
+        self._redraw()
+
+    def _colors_changed(self, *args):
+        self._background_color.rgba = self.background_color
+        self._bar_color.rgba = self.bar_color
+
+    def set_level(self, level):
+        """Update from a 0..1 fraction; returns True when the canvas was redrawn"""
+        self.level = max(0.0, min(1.0, level))
+        if abs(self.level - self._drawn) <= self.threshold:
+            return False
+        self._redraw()
+        return True
+
+    def _redraw(self):
+        self._bar.pos = self.pos
+        self._bar.size = (self.width * self.level, self.height)
+        self._drawn = self.level
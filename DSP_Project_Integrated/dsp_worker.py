@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Capture/processing hand-off for Car DSP
+Bounded queue of preallocated blocks and a worker thread that drains it, so
+the capture thread never waits on EQ, dynamics or analysis
+"""
+
+import threading
+
+import numpy as np
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest')
+
+
+class BlockQueue:
+    """Bounded single-producer / single-consumer queue of preallocated blocks
+
+    The producer copies each block into a spare slot it owns and then
+    publishes the slot id; the consumer keeps the slot it is working on until
+    its next get(). Slots are only ever handed over by id, so no block data is
+    copied under the lock, and nothing is allocated after construction.
+
+    When ``capacity`` blocks are queued, 'drop_oldest' discards the oldest
+    queued block to make room (bounded latency, freshest data) and
+    'drop_newest' discards the incoming one (no gaps inside what is kept).
+    Either way ``dropped`` counts the lost blocks.
+    """
+
+    def __init__(self, capacity=8, max_block=4096, dtype=np.float32, overflow='drop_oldest'):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy {overflow!r}")
+        self.capacity = int(capacity)
+        self.max_block = int(max_block)
+        self.overflow = overflow
+        self.dropped = 0
+        self.pushed = 0
+
+        # capacity queued + one held by the consumer + the producer's spare
+        slots = self.capacity + 2
+        self._data = np.zeros((slots, self.max_block), dtype=dtype)
+        self._lengths = np.zeros(slots, dtype=np.int64)
+        self._rates = np.zeros(slots, dtype=np.int64)
+        self._queue = np.zeros(self.capacity, dtype=np.int64)
+        self._head = 0
+        self._tail = 0
+        self._spare = 0
+        self._held = -1
+        self._free = list(range(1, slots))
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def put(self, block, sample_rate=0):
+        """Queue a block (producer side); returns False if it was dropped
+
+        Blocks longer than max_block are queued in max_block pieces.
+        """
+        accepted = True
+        for start in range(0, len(block), self.max_block):
+            accepted &= self._put(block[start:start + self.max_block], sample_rate)
+        return accepted
+
+    def _put(self, block, sample_rate):
+        slot = self._spare
+        count = len(block)
+        self._data[slot, :count] = block
+        self._lengths[slot] = count
+        self._rates[slot] = sample_rate
+
+        with self._lock:
+            if self._head - self._tail >= self.capacity:
+                self.dropped += 1
+                if self.overflow == 'drop_newest':
+                    return False
+                self._free.append(int(self._queue[self._tail % self.capacity]))
+                self._tail += 1
+            self._queue[self._head % self.capacity] = slot
+            self._head += 1
+            self._spare = self._free.pop()
+        self.pushed += 1
+        self._ready.set()
+        return True
+
+    def get(self, timeout=None):
+        """Oldest queued block as (view, sample_rate), or (None, 0) on timeout
+
+        The view stays valid until the next get() or release().
+        """
+        while True:
+            self._ready.clear()
+            with self._lock:
+                self._release()
+                if self._head != self._tail:
+                    slot = int(self._queue[self._tail % self.capacity])
+                    self._tail += 1
+                    self._held = slot
+                    return self._data[slot, :self._lengths[slot]], int(self._rates[slot])
+            if not self._ready.wait(timeout):
+                return None, 0
+
+    def _release(self):
+        if self._held >= 0:
+            self._free.append(self._held)
+            self._held = -1
+
+    def release(self):
+        """Give back the block from the last get() (consumer side)"""
+        with self._lock:
+            self._release()
+
+    def wake(self):
+        """Return a blocked get() early, e.g. when stopping"""
+        self._ready.set()
+
+    def clear(self):
+        """Discard everything queued (not counted as dropped)"""
+        with self._lock:
+            while self._tail != self._head:
+                self._free.append(int(self._queue[self._tail % self.capacity]))
+                self._tail += 1
+
+
+class DSPWorker:
+    """Runs ``process(block, sample_rate)`` on its own thread for queued blocks
+
+    submit() is the capture-side call: one copy into the queue and an event
+    set, whatever the processing load. When a DSPStats is given, queue depth,
+    dropped blocks and processing errors are reported to it and the worker
+    thread's CPU time is sampled under the worker's name.
+    """
+
+    def __init__(self, process, capacity=8, max_block=4096, overflow='drop_oldest',
+                 stats=None, name='dsp-worker'):
+        self.process = process
+        self.queue = BlockQueue(capacity, max_block, overflow=overflow)
+        self.stats = stats
+        self.name = name
+        self.errors = 0
+        self.last_error = None
+        self._reported = 0
+        self._running = False
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """Stop the thread; blocks still queued are discarded"""
+        self._running = False
+        self.queue.wake()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.queue.clear()
+        self.queue.release()
+
+    def submit(self, block, sample_rate=0):
+        """Hand a block to the worker (capture thread); False if one was dropped"""
+        accepted = self.queue.put(block, sample_rate)
+        stats = self.stats
+        if stats is not None:
+            dropped = self.queue.dropped - self._reported
+            if dropped:
+                stats.count('dropped', dropped)
+                self._reported += dropped
+            stats.set_queue_depth(len(self.queue))
+        return accepted
+
+    def _run(self):
+        queue = self.queue
+        stats = self.stats
+        while self._running:
+            block, sample_rate = queue.get(timeout=0.1)
+            if block is None:
+                continue
+            try:
+                self.process(block, sample_rate)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = str(e)
+                if stats is not None:
+                    stats.count('errors')
+            if stats is not None:
+                stats.set_queue_depth(len(queue))
+                stats.mark_thread(self.name)
@@ -1,49 +1,254 @@
 
 # frontend_kivy_control.py - Kivy UI with Unix Domain Socket client for DSP control
-import os, json, socket, threading, time
+import os, json, socket, tempfile, threading, time
 from kivy.app import App
+from kivy.clock import Clock
 from kivy.uix.boxlayout import BoxLayout
 from kivy.lang import Builder
 from kivy.metrics import dp
+from kivy.utils import platform
+
+import numpy as np
+
+import dsp_protocol
+from dsp_bands import get_band_map
+from dsp_presets import PresetStore
+from dsp_spectrum_ring import SpectrumRingReader
 
 KV_PATH = os.path.join(os.path.dirname(__file__), 'frontend_kivy.kv')
 Builder.load_file(KV_PATH)
 
 UDS_PATH = "@dsp_service_socket"  # LocalServerSocket name used by Java (same UDS_NAME)
+UDS_FS_PATH = "/data/local/tmp/dsp_service.sock"
+
+SPECTRUM_RING_NAME = "dsp_spectrum.ring"
+SPECTRUM_POLL_INTERVAL = 1/60.0
+SPECTRUM_SAMPLE_RATE = 44100  # the service's capture rate; the ring only carries bins
+SPECTRUM_FLOOR_DB = -60.0     # bottom of the analyzer display
+
+# Commands where only the newest value matters; everything else is sent in order
+COALESCE_KEYS = {"eq": "band", "eq_curve": None, "gain": None, "delay": None}
+
+def spectrum_ring_path():
+    # app-private cache, not /sdcard: the ring is rewritten many times a second
+    if platform == 'android':
+        from jnius import autoclass
+        activity = autoclass('org.kivy.android.PythonActivity').mActivity
+        return os.path.join(activity.getCacheDir().getAbsolutePath(), SPECTRUM_RING_NAME)
+    return os.path.join(tempfile.gettempdir(), SPECTRUM_RING_NAME)
+
+def _socket_address(name):
+    # Java's "@name" is the Linux abstract namespace, spelled "\0name" in Python
+    return "\0" + name[1:] if name.startswith("@") else name
+
+def coalesce_key(obj):
+    cmd = obj.get("cmd")
+    if cmd not in COALESCE_KEYS:
+        return None
+    field = COALESCE_KEYS[cmd]
+    return (cmd, obj.get(field)) if field else (cmd,)
 
 class DSPControlClient:
-    def __init__(self, uds_name=UDS_PATH):
+    """Persistent control connection with a coalescing send queue.
+
+    post() never blocks: updates are merged per key (latest value wins for
+    each eq band, gain and delay) and a background thread flushes them at most
+    once per frame, reconnecting as needed: one message (a batch when there
+    are several updates) with binary framing, one message per command in
+    JSON mode. Call start() before posting; send() remains available for
+    one-shot synchronous commands.
+
+    Messages use the binary framing in dsp_protocol; if the server answers
+    with JSON instead, or never answers the first frame, the client falls
+    back to newline-terminated JSON."""
+
+    def __init__(self, uds_name=UDS_PATH, frame_interval=1/60.0, max_pending=256,
+                 protocol="binary"):
         self.uds_name = uds_name
+        self.protocol = protocol
+        self.paths = [UDS_FS_PATH, uds_name]
+        self.frame_interval = frame_interval
+        self.max_pending = max_pending
+        self._pending = {}
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._sock = None
+        self._reader = None
+        self._running = False
+        self._thread = None
+        self.sent_batches = 0
+        self.dropped = 0
+        self._binary_acked = False
 
-    def send(self, obj, timeout=1.0):
-        """Send JSON obj over Android LocalSocket by connecting to the named server.
-        On Android, using AF_UNIX abstract namespace requires special handling; however,
-        Python's socket module supports AF_UNIX but abstract namespace (name starting with '\\0')
-        is not directly representable. In many Python environments, connect to path '/data/local/tmp/...' works.
-        Here we'll attempt to connect to a filesystem socket fallback path first, then abstract name."""
-        msg = json.dumps(obj)
-        # try filesystem socket path
-        paths = ["/data/local/tmp/dsp_service.sock", self.uds_name]
-        for p in paths:
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="DSP-Control", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(1.0)
+            self._thread = None
+        self._disconnect()
+
+    def post(self, obj):
+        """Queue obj for the next frame's batch; returns immediately"""
+        key = coalesce_key(obj)
+        with self._cond:
+            if key is None:
+                self._seq += 1
+                key = ("seq", self._seq)
+            # Re-insert so a newer value also keeps its place after earlier commands
+            self._pending.pop(key, None)
+            self._pending[key] = obj
+            while len(self._pending) > self.max_pending:
+                self._pending.pop(next(iter(self._pending)))
+                self.dropped += 1
+            self._cond.notify()
+
+    def _take_batch(self, not_before):
+        with self._cond:
+            while self._running and not self._pending:
+                self._cond.wait()
+            if not self._running:
+                return None
+        # At most one message per frame; updates arriving meanwhile merge in
+        wait = not_before - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        with self._cond:
+            batch = list(self._pending.values())
+            self._pending.clear()
+            return batch
+
+    def _requeue(self, batch):
+        with self._cond:
+            merged = {}
+            for obj in batch:
+                key = coalesce_key(obj)
+                if key is None:
+                    self._seq += 1
+                    key = ("seq", self._seq)
+                merged[key] = obj
+            # Anything posted meanwhile is newer and wins
+            for key, obj in self._pending.items():
+                merged.pop(key, None)
+                merged[key] = obj
+            self._pending = merged
+
+    def _run(self):
+        backoff = 0.25
+        last_flush = 0.0
+        while True:
+            batch = self._take_batch(last_flush + self.frame_interval)
+            if batch is None:
+                break
+            if self.protocol == "binary" or len(batch) == 1:
+                messages = [batch[0] if len(batch) == 1 else {"cmd": "batch", "cmds": batch}]
+            else:
+                # Line-based JSON servers take one command per message and
+                # may predate batch, so send the commands one by one
+                messages = batch
+            sent = 0
+            try:
+                for msg in messages:
+                    self._write(msg)
+                    sent += 1
+                self.sent_batches += 1
+                backoff = 0.25
+            except (OSError, dsp_protocol.ProtocolError) as e:
+                print("Control send error:", e)
+                self._disconnect()
+                self._requeue(batch[sent:] if messages is batch else batch)
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 5.0)
+            last_flush = time.monotonic()
+
+    def _connect(self, timeout=1.0):
+        for p in self.paths:
             try:
                 s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
                 s.settimeout(timeout)
-                s.connect(p)
-                s.sendall(msg.encode('utf-8'))
-                # read ack
-                try:
-                    data = s.recv(1024)
-                    if data:
-                        return data.decode('utf-8')
-                except Exception:
-                    pass
+                s.connect(_socket_address(p))
+                return s
+            except OSError:
                 s.close()
-                return None
-            except Exception as e:
-                # try next
                 continue
         raise ConnectionError("Could not connect to UDS at known paths")
 
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+            self._reader = None
+
+    def _encode(self, obj):
+        if self.protocol == "binary":
+            return dsp_protocol.encode(obj)
+        return (json.dumps(obj) + "\n").encode('utf-8')
+
+    def _write(self, obj):
+        if self._sock is None:
+            self._sock = self._connect()
+            self._reader = dsp_protocol.FrameReader()
+        self._sock.sendall(self._encode(obj))
+        # Consume the ack; a server that answers once and hangs up just
+        # means we reconnect for the next batch
+        if self.protocol == "binary":
+            try:
+                data = dsp_protocol.read_frame(self._sock, self._reader)
+            except dsp_protocol.ProtocolError:
+                # Server only speaks JSON: requeue so this batch is resent that way
+                print("Control server has no binary framing, using JSON")
+                self.protocol = "json"
+                raise ConnectionError("protocol fallback")
+            except socket.timeout:
+                if self._binary_acked:
+                    raise
+                # A line-based server never answers: it is still waiting for a newline
+                print("Control server did not answer a binary frame, using JSON")
+                self.protocol = "json"
+                raise ConnectionError("protocol fallback")
+            self._binary_acked = True
+        else:
+            # The legacy JSON server answers one message per connection
+            self._sock.recv(1024)
+            data = None
+        if not data:
+            self._disconnect()
+
+    def send(self, obj, timeout=1.0):
+        """Send JSON obj over Android LocalSocket on a one-shot connection and return the ack.
+        On Android the Java LocalServerSocket lives in the abstract namespace; Python
+        reaches it as '\\0name'. The filesystem socket path is tried first."""
+        s = self._connect(timeout)
+        try:
+            s.sendall(self._encode(obj))
+            # read ack
+            try:
+                if self.protocol == "binary":
+                    ack = dsp_protocol.read_frame(s, dsp_protocol.FrameReader())
+                    if ack:
+                        return json.dumps(dsp_protocol.decode_payload(*ack))
+                else:
+                    data = s.recv(1024)
+                    if data:
+                        return data.decode('utf-8')
+            except Exception:
+                pass
+            return None
+        finally:
+            s.close()
+
 class DSPRoot(BoxLayout):
     pass
 
@@ -51,78 +256,108 @@ class FrontendApp(App):
     title = "DSP Headunit (Kivy)"
     def build(self):
         self.eq = [0.0]*31
+        self.spectrum = None
+        self.spectrum_sequence = 0
+        self.spectrum_reader = None
+        self.spectrum_path = spectrum_ring_path()
+        self.presets = PresetStore()
         self.client = DSPControlClient()
+        self.client.start()
         return DSPRoot()
 
+    def on_stop(self):
+        self.stop_spectrum()
+        self.client.close()
+
     def on_eq_change(self, index, value):
         self.eq[index] = value
         # send to service
         try:
-            self.client.send({"cmd":"eq","band":index,"value":value})
+            self.client.post({"cmd":"eq","band":index,"value":value})
         except Exception as e:
             print("Control send error:", e)
 
     def on_input_mode(self, mode):
         try:
-            self.client.send({"cmd":"input","mode":mode})
+            self.client.post({"cmd":"input","mode":mode})
         except Exception as e:
             print("Control send error:", e)
 
     def on_gain(self, value):
         try:
-            self.client.send({"cmd":"gain","value":value})
+            self.client.post({"cmd":"gain","value":value})
         except Exception as e:
             print("Control send error:", e)
 
     def on_delay(self, value):
         try:
-            self.client.send({"cmd":"delay","value":value})
+            self.client.post({"cmd":"delay","value":value})
         except Exception as e:
             print("Control send error:", e)
 
     def select_channel(self, channel):
         try:
-            self.client.send({"cmd":"select_channel","channel":channel})
+            self.client.post({"cmd":"select_channel","channel":channel})
         except Exception as e:
             print("Control send error:", e)
 
     def open_presets(self):
-        # list presets in /sdcard/dsp_presets
-        pdir = "/sdcard/dsp_presets"
+        # names come from the store's index, not a directory listing
         try:
-            items = os.listdir(pdir)
-            print("Presets:", items)
-        except Exception:
-            print("No presets directory:", pdir)
+            print("Presets:", self.presets.names())
+        except Exception as e:
+            print("Preset store error:", e)
 
     def save_config(self):
         cfg = {"eq": self.eq}
-        # save locally and also write preset file to /sdcard for DSP to load
+        # save into the shared store (source + compiled) and switch the service to it
         try:
-            os.makedirs("/sdcard/dsp_presets", exist_ok=True)
-            fname = "/sdcard/dsp_presets/preset_manual.json"
-            with open(fname, "w") as fh:
-                json.dump(cfg, fh)
-            # notify service
-            self.client.send({"cmd":"load_preset_file","path":fname})
-            print("Saved config to", fname)
+            self.presets.save("preset_manual", cfg)
+            self.client.post({"cmd":"preset","name":"preset_manual"})
+            print("Saved config as preset_manual")
         except Exception as e:
             print("Save error:", e)
 
     def start_spectrum(self):
-        # request service to start spectrum capture
+        # request service to start publishing spectrum frames into the ring
         try:
-            self.client.send({"cmd":"spectrum_start","path":"/sdcard/dsp_spectrum/spectrum_capture.json"})
+            self.client.post({"cmd":"spectrum_start","path":self.spectrum_path})
             print("Requested spectrum start")
         except Exception as e:
             print("Spectrum start error:", e)
+        Clock.unschedule(self.poll_spectrum)
+        Clock.schedule_interval(self.poll_spectrum, SPECTRUM_POLL_INTERVAL)
 
     def stop_spectrum(self):
+        Clock.unschedule(self.poll_spectrum)
+        if self.spectrum_reader is not None:
+            self.spectrum_reader.close()
+            self.spectrum_reader = None
         try:
-            self.client.send({"cmd":"spectrum_stop"})
+            self.client.post({"cmd":"spectrum_stop"})
             print("Requested spectrum stop")
         except Exception as e:
             print("Spectrum stop error:", e)
 
+    def poll_spectrum(self, dt):
+        # tail the ring; only the newest frame is kept for drawing
+        if self.spectrum_reader is None:
+            try:
+                self.spectrum_reader = SpectrumRingReader(self.spectrum_path)
+            except (OSError, ValueError):
+                return  # service has not created the ring yet
+        sequence, frame = self.spectrum_reader.latest()
+        if sequence and sequence != self.spectrum_sequence:
+            self.spectrum_sequence = sequence
+            self.spectrum = frame
+            self.draw_spectrum(frame)
+
+    def draw_spectrum(self, frame):
+        # STFT magnitudes -> 1/3-octave dBFS (a Hann window sums to fft_size / 2)
+        fft_size = 2 * (len(frame) - 1)
+        bands = get_band_map(SPECTRUM_SAMPLE_RATE, fft_size).apply(frame)
+        levels = 20 * np.log10(np.maximum(bands * 4.0 / fft_size, 1e-10))
+        self.root.ids.analyzer.set_levels(levels, offset=-SPECTRUM_FLOOR_DB)
+
 if __name__ == '__main__':
     FrontendApp().run()
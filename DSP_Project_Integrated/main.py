@@ -5,6 +5,15 @@ Main application file for Android APK build
 Handles external 3.5mm mic input for audio analysis and calls
 “””
 
+import time
+
+# Startup timing reference, taken before Kivy loads. NumPy and the DSP
+# modules are imported where they are first used, after the first frame
+STARTUP_TIME = time.perf_counter()
+STARTUP_BUDGET = 1.5  # seconds to the first frame on a low-end head unit
+READ_RETRY_DELAY = 0.005  # seconds between retries after an empty AudioRecord read
+CONFIG_PRESET = 'DSP_Config'  # preset the Save/Load buttons use in the shared store
+
 import kivy
 kivy.require(‘2.1.0’)
 
@@ -14,19 +23,15 @@ from kivy.uix.gridlayout import GridLayout
 from kivy.uix.label import Label
 from kivy.uix.slider import Slider
 from kivy.uix.button import Button
-from kivy.uix.switch import Switch
 from kivy.uix.tabbedpanel import TabbedPanel, TabbedPanelItem
-from kivy.uix.popup import Popup
-from kivy.uix.progressbar import ProgressBar
 from kivy.clock import Clock
+from kivy.core.window import Window
 from kivy.logger import Logger
 from kivy.utils import platform
 
-import numpy as np
 import threading
-import json
-import time
-from collections import deque
+
+from dsp_widgets import LevelMeter, SpectrumWidget
 
 # Android-specific imports
 
@@ -63,11 +68,32 @@ def __init__(self):
     self.sample_rate = 44100
     self.buffer_size = 4096
     self.is_recording = False
-    self.audio_data = deque(maxlen=self.sample_rate * 2)  # 2 seconds of data
-    self.fft_data = np.zeros(512)
+    # Imported here since the processor is only built after the first frame
+    from dsp_ringbuffer import RingBuffer
+    from dsp_rta import RealTimeAnalyzer
+    from dsp_snapshot import SnapshotBuffer
+    from dsp_worker import DSPWorker
+    
+    self.audio_data = RingBuffer(self.sample_rate * 2)  # 2 seconds of data
+    # 1/3-octave RTA, updated on the capture thread
+    self.rta = RealTimeAnalyzer(self.sample_rate, max_block=self.buffer_size)
+    self.snapshots = SnapshotBuffer(len(self.rta.centres))
+    # Metering and the RTA run on this worker so a slow analysis never
+    # delays AudioRecord.read; the freshest blocks win when it falls behind
+    self.worker = DSPWorker(lambda block, rate: self._analyze(block), capacity=4,
+                            max_block=self.buffer_size, overflow='drop_oldest',
+                            name='dsp-analysis')
     self.rms_level = 0.0
     self.peak_level = 0.0
     
+    # Optional long-session recording of the raw capture
+    self.recorder = None
+    
+    # Capture health counters
+    self.reads = 0
+    self.short_reads = 0
+    self.read_errors = 0
+    
     # Android audio objects
     self.audio_record = None
     self.audio_manager = None
@@ -132,6 +158,7 @@ def setup_android_audio(self):
 
 def start_recording(self):
     """Start recording from external mic"""
+    self.worker.start()
     if platform == 'android' and self.audio_record:
         try:
             self.audio_record.startRecording()
@@ -143,6 +170,7 @@ def start_recording(self):
             return True
         except Exception as e:
             Logger.error(f"DSP: Recording start failed: {e}")
+            self.worker.stop()
             return False
     else:
         # Simulate for non-Android platforms
@@ -155,6 +183,7 @@ def start_recording(self):
 def stop_recording(self):
     """Stop recording"""
     self.is_recording = False
+    self.worker.stop()
     if platform == 'android' and self.audio_record:
         try:
             self.audio_record.stop()
@@ -162,85 +191,140 @@ def stop_recording(self):
         except Exception as e:
             Logger.error(f"DSP: Recording stop failed: {e}")
 
+def start_session_recording(self, path):
+    """Start appending raw capture blocks to a memory-mapped session file"""
+    import numpy as np
+    from dsp_recorder import Recorder
+    
+    self.stop_session_recording()
+    self.recorder = Recorder(path, self.sample_rate, 1, np.int16)
+    Logger.info(f"DSP: Recording session to {path}")
+
+def stop_session_recording(self):
+    """Finish the session file; returns its length in seconds"""
+    recorder, self.recorder = self.recorder, None
+    if recorder is None:
+        return 0.0
+    recorder.close()
+    Logger.info(f"DSP: Session recording closed after {recorder.duration:.1f}s")
+    return recorder.duration
+
 def _recording_loop(self):
     """Main recording loop for Android"""
-    buffer = np.zeros(self.buffer_size, dtype=np.int16)
+    import numpy as np
+    
+    # Preallocated once per session: Java copies straight back into
+    # pcm_bytes (pyjnius passes bytearrays by reference), pcm is an int16
+    # view over the same memory and samples holds the normalized floats
+    frames = self.buffer_size
+    pcm_bytes = bytearray(frames * 2)
+    pcm = np.frombuffer(pcm_bytes, dtype=np.int16)
+    samples = np.zeros(frames, dtype=np.float32)
+    
+    self.reads = 0
+    self.short_reads = 0
+    self.read_errors = 0
     
     while self.is_recording:
         try:
-            # Read audio data
-            bytes_read = self.audio_record.read(buffer.tobytes(), 0, self.buffer_size * 2)
+            # Blocking read paces the loop at the hardware rate
+            bytes_read = self.audio_record.read(pcm_bytes, 0, frames * 2)
+            self.reads += 1
             
-            if bytes_read > 0:
-                # Convert to numpy array
-                audio_data = np.frombuffer(buffer.tobytes()[:bytes_read], dtype=np.int16)
-                audio_data = audio_data.astype(np.float32) / 32768.0  # Normalize
-                
-                # Add to circular buffer
-                self.audio_data.extend(audio_data)
-                
-                # Calculate levels
-                self.rms_level = np.sqrt(np.mean(audio_data**2))
-                self.peak_level = np.max(np.abs(audio_data))
-                
-                # Calculate FFT for frequency analysis
-                if len(audio_data) >= 512:
-                    windowed = audio_data[:512] * np.hanning(512)
-                    fft = np.abs(np.fft.fft(windowed))
-                    self.fft_data = fft[:256]  # Take first half
+            if bytes_read <= 0:
+                self.read_errors += 1
+                if bytes_read in (AudioRecord.ERROR_INVALID_OPERATION,
+                                  AudioRecord.ERROR_BAD_VALUE,
+                                  AudioRecord.ERROR_DEAD_OBJECT):
+                    Logger.error(f"DSP: AudioRecord read failed: {bytes_read}")
+                    self._capture_failed()
+                    break
+                # Stalled or paused source: back off instead of spinning
+                time.sleep(READ_RETRY_DELAY)
+                continue
             
-            time.sleep(0.01)  # Small delay to prevent CPU overload
+            count = bytes_read // 2
+            if count < frames:
+                self.short_reads += 1
+            
+            # Raw int16 straight into the session file, if recording
+            recorder = self.recorder
+            if recorder is not None:
+                recorder.write(pcm[:count])
+            
+            # Convert int16 -> float32 in place
+            audio_data = samples[:count]
+            np.multiply(pcm[:count], 1.0 / 32768.0, out=audio_data, casting='unsafe')
+            
+            # Add to circular buffer
+            self.audio_data.write(audio_data)
+            
+            # Levels and bands are computed on the analysis worker
+            self.worker.submit(audio_data, self.sample_rate)
             
         except Exception as e:
             Logger.error(f"DSP: Recording loop error: {e}")
+            self._capture_failed()
             break
+    
+    Logger.info(f"DSP: Capture ended after {self.reads} reads, "
+                f"{self.short_reads} short, {self.read_errors} failed, "
+                f"{self.worker.queue.dropped} dropped by analysis")
+
+def _capture_failed(self):
+    """Capture died under the loop: report it as stopped and drop the AudioRecord"""
+    self.is_recording = False
+    self.worker.stop()
+    audio_record, self.audio_record = self.audio_record, None
+    try:
+        audio_record.stop()
+        audio_record.release()
+    except Exception as e:
+        Logger.error(f"DSP: AudioRecord release failed: {e}")
 
 def _simulate_audio(self):
     """Simulate audio data for testing on non-Android"""
+    import numpy as np
+    
     while self.is_recording:
         # Generate test signal
         t = np.linspace(0, self.buffer_size/self.sample_rate, self.buffer_size)
         test_signal = 0.1 * (np.sin(2*np.pi*440*t) + 0.5*np.sin(2*np.pi*880*t))
         
-        self.audio_data.extend(test_signal)
-        self.rms_level = np.sqrt(np.mean(test_signal**2))
-        self.peak_level = np.max(np.abs(test_signal))
-        
-        # Generate test FFT
-        windowed = test_signal[:512] * np.hanning(512)
-        fft = np.abs(np.fft.fft(windowed))
-        self.fft_data = fft[:256]
+        self.audio_data.write(test_signal)
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.write(test_signal)
+        self.worker.submit(test_signal, self.sample_rate)
         
         time.sleep(0.05)
 
-def get_frequency_bands(self):
-    """Get frequency band levels for display"""
-    if len(self.fft_data) == 0:
-        return np.zeros(31)
+def _analyze(self, audio_data):
+    """Meter and RTA update on the analysis worker; publishes a display snapshot"""
+    import numpy as np
     
-    # 31-band frequency analysis
-    freqs = np.fft.fftfreq(512, 1/self.sample_rate)[:256]
-    
-    # Standard 31-band frequencies
-    band_freqs = [20, 25, 31, 40, 50, 63, 80, 100, 125, 160, 200, 250, 315, 400, 500, 
-                 630, 800, 1000, 1250, 1600, 2000, 2500, 3150, 4000, 5000, 6300, 8000, 
-                 10000, 12500, 16000, 20000]
+    self.rms_level = float(np.sqrt(np.mean(np.square(audio_data))))
+    self.peak_level = float(np.max(np.abs(audio_data)))
     
-    band_levels = np.zeros(31)
+    # Band levels: long FFTs for the lows, short ones for the highs
+    self.rta.process(audio_data)
     
-    for i, freq in enumerate(band_freqs[:-1]):
-        # Find frequency indices
-        start_idx = np.argmin(np.abs(freqs - freq))
-        end_idx = np.argmin(np.abs(freqs - band_freqs[i+1]))
-        
-        if start_idx < end_idx:
-            band_levels[i] = np.mean(self.fft_data[start_idx:end_idx])
-    
-    # Convert to dB
-    band_levels = 20 * np.log10(band_levels + 1e-10)
-    band_levels = np.clip(band_levels + 60, 0, 60)  # Normalize to 0-60 dB range
-    
-    return band_levels
+    snapshot = self.snapshots.begin()
+    snapshot.rms = self.rms_level
+    snapshot.peak = self.peak_level
+    snapshot.rms_db = 20 * np.log10(max(self.rms_level, 1e-10))
+    snapshot.peak_db = 20 * np.log10(max(self.peak_level, 1e-10))
+    np.clip(self.rta.levels_db + 60, 0, 60, out=snapshot.bands)
+    np.clip(self.rta.peaks_db + 60, 0, 60, out=snapshot.peaks)
+    self.snapshots.publish()
+
+def get_frequency_bands(self):
+    """Get frequency band levels for display (0-60 for -60..0 dBFS)"""
+    return (self.rta.levels_db + 60).clip(0, 60)
+
+def get_peak_bands(self):
+    """Peak-hold band levels on the same 0-60 scale"""
+    return (self.rta.peaks_db + 60).clip(0, 60)
 ```
 
 class DSPControlWidget(BoxLayout):
@@ -253,14 +337,45 @@ def __init__(self, **kwargs):
     self.padding = 10
     self.spacing = 10
     
-    self.audio_processor = AudioProcessor()
+    # Created after the first frame; the RTA tables are not needed to draw it
+    self.audio_processor = None
+    self._presets = None  # PresetStore, opened on first save or load
     self.is_analyzing = False
+    self.last_sequence = 0
     
+    self.startup_times = {'imports': time.perf_counter() - STARTUP_TIME}
     self.build_interface()
+    self.startup_times['interface'] = time.perf_counter() - STARTUP_TIME
+    Window.bind(on_flip=self._on_first_frame)
     
     # Start update timer
     Clock.schedule_interval(self.update_display, 1/30)  # 30 FPS updates
 
+def _on_first_frame(self, *args):
+    """Report startup timing once the first frame is on screen, then start audio"""
+    Window.unbind(on_flip=self._on_first_frame)
+    self.startup_times['first_frame'] = time.perf_counter() - STARTUP_TIME
+    Clock.schedule_once(lambda dt: self.ensure_tab('analyzer'), 0)
+    Clock.schedule_once(self._start_audio, 0)
+
+def _start_audio(self, dt=None):
+    if self.audio_processor is not None:
+        return
+    started = time.perf_counter()
+    self.audio_processor = AudioProcessor()
+    self.startup_times['audio'] = time.perf_counter() - started
+    self.log_startup_times()
+
+def log_startup_times(self):
+    """Log time to each startup milestone and warn when the budget is missed"""
+    report = ', '.join(f'{name} {seconds * 1000:.0f}ms' for name, seconds in self.startup_times.items())
+    first_frame = self.startup_times.get('first_frame', 0.0)
+    if first_frame > STARTUP_BUDGET:
+        Logger.warning(f"DSP: First frame after {first_frame:.2f}s, over the "
+                       f"{STARTUP_BUDGET:.2f}s budget ({report})")
+    else:
+        Logger.info(f"DSP: Startup {report}")
+
 def build_interface(self):
     """Build the main interface"""
     
@@ -300,7 +415,7 @@ def build_interface(self):
     # RMS Level
     rms_box = BoxLayout(orientation='vertical')
     rms_box.add_widget(Label(text='RMS Level', size_hint_y=None, height='20dp'))
-    self.rms_bar = ProgressBar(max=1.0, value=0)
+    self.rms_bar = LevelMeter()
     self.rms_label = Label(text='0.0 dB', size_hint_y=None, height='20dp')
     rms_box.add_widget(self.rms_bar)
     rms_box.add_widget(self.rms_label)
@@ -308,7 +423,7 @@ def build_interface(self):
     # Peak Level
     peak_box = BoxLayout(orientation='vertical')
     peak_box.add_widget(Label(text='Peak Level', size_hint_y=None, height='20dp'))
-    self.peak_bar = ProgressBar(max=1.0, value=0)
+    self.peak_bar = LevelMeter()
     self.peak_label = Label(text='0.0 dB', size_hint_y=None, height='20dp')
     peak_box.add_widget(self.peak_bar)
     peak_box.add_widget(self.peak_label)
@@ -317,57 +432,61 @@ def build_interface(self):
     levels.add_widget(peak_box)
     self.add_widget(levels)
     
-    # Tabbed interface
+    # Tabbed interface; each tab's content is built the first time it is selected
     self.tab_panel = TabbedPanel(do_default_tab=False)
+    self.tabs = {}
+    self.tab_builders = {
+        'analyzer': self.build_analyzer_tab,
+        'eq': self.build_eq_tab,
+        'channels': self.build_channel_tab,
+    }
     
-    # Real-time analyzer tab
-    analyzer_tab = TabbedPanelItem(text='Real-Time Analyzer')
-    analyzer_content = self.build_analyzer_tab()
-    analyzer_tab.add_widget(analyzer_content)
-    self.tab_panel.add_widget(analyzer_tab)
-    
-    # EQ tab
-    eq_tab = TabbedPanelItem(text='31-Band EQ')
-    eq_content = self.build_eq_tab()
-    eq_tab.add_widget(eq_content)
-    self.tab_panel.add_widget(eq_tab)
-    
-    # Channel control tab
-    channel_tab = TabbedPanelItem(text='Channel Control')
-    channel_content = self.build_channel_tab()
-    channel_tab.add_widget(channel_content)
-    self.tab_panel.add_widget(channel_tab)
+    for name, title in (('analyzer', 'Real-Time Analyzer'),
+                        ('eq', '31-Band EQ'),
+                        ('channels', 'Channel Control')):
+        tab = TabbedPanelItem(text=title)
+        # Built on press, before the header's release runs switch_to: adding
+        # content from inside switch_to gets cleared again by it
+        tab.bind(on_press=lambda item, name=name: self.ensure_tab(name))
+        self.tabs[name] = tab
+        self.tab_panel.add_widget(tab)
     
     self.add_widget(self.tab_panel)
+    
+    # The analyzer opens empty; its content (and NumPy) follows the first frame
+    self.tab_panel.switch_to(self.tabs['analyzer'])
+
+def ensure_tab(self, name):
+    """Build a tab's content if it has not been built yet
+
+    Adding content to the current tab makes the panel switch to it again,
+    so this must not run from inside switch_to.
+    """
+    builder = self.tab_builders.pop(name, None)
+    if builder is None:
+        return
+    started = time.perf_counter()
+    self.tabs[name].add_widget(builder())
+    self.startup_times[f'tab_{name}'] = time.perf_counter() - started
 
 def build_analyzer_tab(self):
     """Build real-time frequency analyzer"""
     layout = BoxLayout(orientation='vertical', padding=10)
     
-    # Frequency display (simplified bars)
-    freq_layout = GridLayout(cols=31, size_hint_y=None, height='200dp')
-    
-    self.freq_bars = []
+    # Frequency display: all bands drawn by one canvas widget
     band_labels = ['20', '25', '31', '40', '50', '63', '80', '100', '125', '160', 
                   '200', '250', '315', '400', '500', '630', '800', '1k', '1.25k', 
                   '1.6k', '2k', '2.5k', '3.15k', '4k', '5k', '6.3k', '8k', '10k', 
                   '12.5k', '16k', '20k']
     
-    for i, label in enumerate(band_labels):
-        bar_layout = BoxLayout(orientation='vertical')
-        
-        # Frequency bar (using ProgressBar rotated)
-        bar = ProgressBar(max=60, value=0, size_hint_y=0.8)
-        self.freq_bars.append(bar)
-        
-        # Label
-        freq_label = Label(text=label, font_size='8sp', size_hint_y=0.2)
-        
-        bar_layout.add_widget(bar)
-        bar_layout.add_widget(freq_label)
-        freq_layout.add_widget(bar_layout)
+    self.spectrum = SpectrumWidget(n_bands=len(band_labels), size_hint_y=None, height='180dp')
+    layout.add_widget(self.spectrum)
     
-    layout.add_widget(freq_layout)
+    # Static labels; never touched after build
+    label_row = GridLayout(cols=len(band_labels), size_hint_y=None, height='20dp')
+    for label in band_labels:
+        label_row.add_widget(Label(text=label, font_size='8sp'))
+    layout.add_widget(label_row)
     
     # Analysis controls
     controls = BoxLayout(orientation='horizontal', size_hint_y=None, height='50dp')
@@ -443,6 +562,8 @@ def build_eq_tab(self):
 
 def build_channel_tab(self):
     """Build channel control interface"""
+    from kivy.uix.switch import Switch
+    
     layout = BoxLayout(orientation='vertical', padding=10, spacing=10)
     
     channels = ['Front Left', 'Front Right', 'Rear Left', 'Rear Right', 'Subwoofer', 'Center']
@@ -518,6 +639,7 @@ def build_channel_tab(self):
 def toggle_recording(self, instance):
     """Toggle audio recording/analysis"""
     if not self.is_analyzing:
+        self._start_audio()
         if self.audio_processor.start_recording():
             self.is_analyzing = True
             self.record_button.text = 'Stop Analysis'
@@ -531,29 +653,25 @@ def toggle_recording(self, instance):
         self.status_label.text = 'Ready'
 
 def update_display(self, dt):
-    """Update real-time displays"""
+    """Update real-time displays from the latest capture snapshot"""
     if not self.is_analyzing:
         return
     
-    # Update level meters
-    rms_db = 20 * np.log10(max(self.audio_processor.rms_level, 1e-10)) + 60
-    peak_db = 20 * np.log10(max(self.audio_processor.peak_level, 1e-10)) + 60
+    snapshot = self.audio_processor.snapshots.latest()
+    if snapshot.sequence == self.last_sequence:
+        return  # nothing new since the last frame
+    self.last_sequence = snapshot.sequence
     
-    self.rms_bar.value = max(0, min(1, rms_db / 60))
-    self.peak_bar.value = max(0, min(1, peak_db / 60))
-    
-    self.rms_label.text = f'{rms_db - 60:.1f} dB'
-    self.peak_label.text = f'{peak_db - 60:.1f} dB'
+    # Update level meters; labels only change when the bar actually moved
+    if self.rms_bar.set_level((snapshot.rms_db + 60) / 60):
+        self.rms_label.text = f'{snapshot.rms_db:.1f} dB'
+    if self.peak_bar.set_level((snapshot.peak_db + 60) / 60):
+        self.peak_label.text = f'{snapshot.peak_db:.1f} dB'
     
     # Update frequency analyzer
-    if hasattr(self, 'freq_bars'):
-        band_levels = self.audio_processor.get_frequency_bands()
+    if hasattr(self, 'spectrum'):
         gain_offset = self.display_gain_slider.value if hasattr(self, 'display_gain_slider') else 0
-        
-        for i, bar in enumerate(self.freq_bars):
-            if i < len(band_levels):
-                adjusted_level = band_levels[i] + gain_offset
-                bar.value = max(0, min(60, adjusted_level))
+        self.spectrum.set_levels(snapshot.bands, snapshot.peaks, gain_offset)
 
 def reset_eq(self, instance):
     """Reset EQ to flat"""
@@ -574,8 +692,18 @@ def v_shape_eq(self, instance):
         if i < len(v_curve):
             slider.value = v_curve[i]
 
+@property
+def presets(self):
+    """Indexed preset library shared with the service and the Kivy frontend"""
+    if self._presets is None:
+        from dsp_presets import PresetStore
+        self._presets = PresetStore()
+    return self._presets
+
 def save_config(self, instance):
-    """Save current configuration"""
+    """Save current configuration as the CONFIG_PRESET preset"""
+    self.ensure_tab('eq')
+    self.ensure_tab('channels')
     config = {
         'eq': [slider.value for slider in self.eq_sliders],
         'channels': {}
@@ -594,14 +722,11 @@ def save_config(self, instance):
         }
     
     try:
-        if platform == 'android':
-            from android.storage import primary_external_storage_path
-            config_path = primary_external_storage_path() + '/DSP_Config.json'
-        else:
-            config_path = 'DSP_Config.json'
-        
-        with open(config_path, 'w') as f:
-            json.dump(config, f, indent=2)
+        # Same store (and compiled files) the service switches presets from,
+        # so channels use its names and units
+        from dsp_presets import channels_from_ui
+        config['channels'] = channels_from_ui(config['channels'])
+        self.presets.save(CONFIG_PRESET, config)
         
         self.status_label.text = 'Config Saved'
         Clock.schedule_once(lambda dt: setattr(self.status_label, 'text', 'Ready'), 2)
@@ -611,16 +736,12 @@ def save_config(self, instance):
         self.status_label.text = 'Save Failed'
 
 def load_config(self, instance):
-    """Load configuration"""
+    """Load configuration from the CONFIG_PRESET preset"""
+    self.ensure_tab('eq')
+    self.ensure_tab('channels')
     try:
-        if platform == 'android':
-            from android.storage import primary_external_storage_path
-            config_path = primary_external_storage_path() + '/DSP_Config.json'
-        else:
-            config_path = 'DSP_Config.json'
-        
-        with open(config_path, 'r') as f:
-            config = json.load(f)
+        from dsp_presets import channels_to_ui
+        config = self.presets.load(CONFIG_PRESET).settings
         
         # Load EQ
         if 'eq' in config:
@@ -630,14 +751,14 @@ def load_config(self, instance):
         
         # Load channels
         if 'channels' in config:
-            for channel, settings in config['channels'].items():
+            for channel, settings in channels_to_ui(config['channels']).items():
                 if channel in self.channel_controls:
                     controls = self.channel_controls[channel]
                     for param, value in settings.items():
                         if param in controls:
                             if isinstance(controls[param], Slider):
                                 controls[param].value = value
-                            elif isinstance(controls[param], Switch):
+                            else:
                                 controls[param].active = value
         
         self.status_label.text = 'Config Loaded'
@@ -2,9 +2,15 @@
 #include <string>
 #include <thread>
 #include <atomic>
-#include <fstream>
 #include <vector>
 #include <cmath>
+#include <chrono>
+#include <cstddef>
+#include <cstdint>
+#include <cstring>
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <unistd.h>
 #include <android/log.h>
 
 #define LOG_TAG "native_dsp"
@@ -50,20 +56,100 @@ Java_org_dspproject_caraudiodsp_AudioService_nativeSetInputMode(JNIEnv *env, job
     // TODO: switch input routing in native layer if needed
 }
 
-static void write_spectrum_json(const std::string &path, const std::vector<double> &spectrum) {
-    std::ofstream ofs(path);
-    if (!ofs) {
-        ALOGE("Failed to open spectrum output: %s", path.c_str());
-        return;
+// Spectrum ring: fixed-size mmap'd file of float32 frames with sequence
+// numbers. Layout matches dsp_spectrum_ring.py; readers tail it with np.memmap.
+static const char SPECTRUM_MAGIC[8] = {'D', 'S', 'P', 'S', 'P', 'E', 'C', '1'};
+static const uint32_t SPECTRUM_VERSION = 1;
+static const size_t SPECTRUM_HEADER_SIZE = 64;
+static const uint32_t SPECTRUM_BINS = 128;
+static const uint32_t SPECTRUM_CAPACITY = 64;
+static const int SPECTRUM_FRAME_MS = 20;  // 50 frames per second
+
+#pragma pack(push, 1)
+struct SpectrumHeader {
+    char magic[8];
+    uint32_t version;
+    uint32_t bins;
+    uint32_t capacity;
+    uint32_t slot_size;
+    double rate;
+    uint64_t sequence;
+};
+#pragma pack(pop)
+
+class SpectrumRing {
+public:
+    bool open(const std::string &path, uint32_t bins, uint32_t capacity, double rate) {
+        bins_ = bins;
+        capacity_ = capacity;
+        slot_size_ = (16 + 4 * bins + 7) / 8 * 8;
+        size_ = SPECTRUM_HEADER_SIZE + (size_t) capacity * slot_size_;
+
+        // Reuse the file in place so readers that already mapped it see the reset
+        int fd = ::open(path.c_str(), O_RDWR | O_CREAT, 0644);
+        if (fd < 0) {
+            ALOGE("Failed to open spectrum ring: %s", path.c_str());
+            return false;
+        }
+        if (ftruncate(fd, (off_t) size_) != 0) {
+            ALOGE("Failed to size spectrum ring: %s", path.c_str());
+            ::close(fd);
+            return false;
+        }
+        void *base = mmap(nullptr, size_, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+        ::close(fd);
+        if (base == MAP_FAILED) {
+            ALOGE("Failed to map spectrum ring: %s", path.c_str());
+            return false;
+        }
+        base_ = static_cast<uint8_t *>(base);
+        memset(base_, 0, size_);
+
+        SpectrumHeader header;
+        memcpy(header.magic, SPECTRUM_MAGIC, sizeof(header.magic));
+        header.version = SPECTRUM_VERSION;
+        header.bins = bins;
+        header.capacity = capacity;
+        header.slot_size = slot_size_;
+        header.rate = rate;
+        header.sequence = 0;
+        memcpy(base_, &header, sizeof(header));
+        sequence_ = 0;
+        return true;
     }
-    ofs << "{ \"spectrum\": [";
-    for (size_t i = 0; i < spectrum.size(); ++i) {
-        if (i) ofs << ", ";
-        ofs << spectrum[i];
+
+    void write(const float *frame) {
+        uint64_t sequence = sequence_ + 1;
+        uint8_t *slot = base_ + SPECTRUM_HEADER_SIZE + (sequence % capacity_) * slot_size_;
+        uint64_t *slot_sequence = reinterpret_cast<uint64_t *>(slot);
+
+        // Invalidate, fill, then publish: readers drop slots whose sequence changed
+        __atomic_store_n(slot_sequence, (uint64_t) 0, __ATOMIC_RELEASE);
+        double now = std::chrono::duration<double>(
+                std::chrono::system_clock::now().time_since_epoch()).count();
+        memcpy(slot + 8, &now, sizeof(now));
+        memcpy(slot + 16, frame, bins_ * sizeof(float));
+        __atomic_store_n(slot_sequence, sequence, __ATOMIC_RELEASE);
+        __atomic_store_n(reinterpret_cast<uint64_t *>(base_ + offsetof(SpectrumHeader, sequence)),
+                         sequence, __ATOMIC_RELEASE);
+        sequence_ = sequence;
+    }
+
+    void close() {
+        if (base_) {
+            munmap(base_, size_);
+            base_ = nullptr;
+        }
     }
-    ofs << "] }\n";
-    ofs.close();
-}
+
+private:
+    uint8_t *base_ = nullptr;
+    size_t size_ = 0;
+    uint32_t bins_ = 0;
+    uint32_t capacity_ = 0;
+    uint32_t slot_size_ = 0;
+    uint64_t sequence_ = 0;
+};
 
 extern "C" JNIEXPORT void JNICALL
 Java_org_dspproject_caraudiodsp_AudioService_nativeStartSpectrum(JNIEnv *env, jobject thiz, jstring jpath) {
@@ -76,15 +162,25 @@ Java_org_dspproject_caraudiodsp_AudioService_nativeStartSpectrum(JNIEnv *env, jo
     }
     spectrum_running.store(true);
     spectrum_thread = std::thread([path]() {
-        ALOGI("Spectrum thread started, output=%s", path.c_str());
-        // Placeholder: write fake spectrum data every second until stopped.
+        SpectrumRing ring;
+        if (!ring.open(path, SPECTRUM_BINS, SPECTRUM_CAPACITY, 1000.0 / SPECTRUM_FRAME_MS)) {
+            spectrum_running.store(false);
+            return;
+        }
+        ALOGI("Spectrum thread started, ring=%s", path.c_str());
+        // Placeholder: publish a moving test spectrum until stopped.
+        std::vector<float> spec(SPECTRUM_BINS, 0.0f);
+        uint64_t frame = 0;
+        auto next = std::chrono::steady_clock::now();
         while (spectrum_running.load()) {
-            std::vector<double> spec(128, 0.0);
-            // fake data: rising slope
-            for (size_t i = 0; i < spec.size(); ++i) spec[i] = sin(i*0.1) * 0.5 + 0.5;
-            write_spectrum_json(path, spec);
-            std::this_thread::sleep_for(std::chrono::milliseconds(1000));
+            for (size_t i = 0; i < spec.size(); ++i)
+                spec[i] = (float) (sin(i * 0.1 + frame * 0.05) * 0.5 + 0.5);
+            ring.write(spec.data());
+            ++frame;
+            next += std::chrono::milliseconds(SPECTRUM_FRAME_MS);
+            std::this_thread::sleep_until(next);
         }
+        ring.close();
         ALOGI("Spectrum thread exiting");
     });
 }
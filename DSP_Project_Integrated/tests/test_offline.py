@@ -0,0 +1,20 @@
+import numpy as np
+
+from dsp_offline import render
+
+
+def test_int16_array_renders_like_float(tmp_path):
+    t = np.arange(44100) / 44100.0
+    signal = 0.25 * np.sin(2 * np.pi * 440 * t)
+    pcm = np.round(signal * 32767).astype(np.int16)
+
+    def rendered(source, path):
+        stats = render(source, str(path), settings={'eq': [3.0] * 31}, sample_rate=44100,
+                       block_size=1024)
+        assert stats['frames'] == len(source)
+        return np.load(str(path))
+
+    reference = rendered((pcm / 32768.0).astype(np.float32), tmp_path / 'float.npy')
+    result = rendered(pcm, tmp_path / 'int16.npy')
+    np.testing.assert_allclose(result, reference, atol=1e-5)
+    assert np.max(np.abs(result)) < 0.95
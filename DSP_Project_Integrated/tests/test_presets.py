@@ -0,0 +1,30 @@
+import pytest
+
+from dsp_crossover import CHANNELS, CrossoverEngine
+from dsp_presets import channels_from_ui, channels_to_ui, compile_preset
+
+
+def test_ui_config_reaches_the_crossover():
+    # Values as main.py's channel panel holds them: labels, volume 0..100
+    panel = {
+        'Front Left': {'gain': -3.0, 'volume': 50, 'highpass': 80.0, 'lowpass': 20000.0,
+                       'delay': 1.5, 'phase': False, 'mute': False, 'bypass': False},
+        'Subwoofer': {'gain': 6.0, 'volume': 80, 'highpass': 20.0, 'lowpass': 1000.0,
+                      'delay': 4.0, 'phase': True, 'mute': False, 'bypass': False},
+    }
+    preset = compile_preset('DSP_Config', {'eq': [0.0] * 31, 'channels': channels_from_ui(panel)},
+                            44100)
+
+    engine = CrossoverEngine(44100, 1024)
+    engine.set_program(preset.channels, preset.crossover_program(), 1024)
+
+    assert engine.settings['front_left']['volume'] == pytest.approx(0.5)
+    assert engine.settings['front_left']['highpass'] == 80.0
+    assert engine.settings['front_left']['delay'] == 1.5
+    assert engine.settings['subwoofer']['gain'] == 6.0
+    assert engine.settings['subwoofer']['phase'] is True
+    # Signed linear level: dB gain times volume, inverted for phase
+    level = preset.crossover_gains[CHANNELS.index('subwoofer')]
+    assert level == pytest.approx(-10 ** (6.0 / 20.0) * 0.8)
+
+    assert channels_to_ui(preset.settings['channels']) == panel